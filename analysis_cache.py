@@ -0,0 +1,58 @@
+import numpy as np
+from gradients import GradientCache
+from patch_index import PatchIndex
+
+#===ANALIZA OBRAZU WSPÓLNA DLA KOLEJNYCH USUNIĘĆ NA TYM SAMYM ZDJĘCIU===#
+
+
+class ImageAnalysis:
+    """Tablica pikseli, pole gradientów (z luminancją) i indeksy patchy jednego obrazu.
+
+    Budowana raz dla otwartego dokumentu; po każdym wypełnieniu update()
+    odświeża wszystko tylko w prostokącie zmian, więc kolejne usunięcia nie
+    płacą za analizę całej klatki. matches() mówi, czy analiza opisuje dany
+    obraz PIL (po cofnięciu albo wypełnieniu przez SD trzeba zbudować nową).
+    """
+
+    def __init__(self, img):
+        self.source = img
+        self.array = np.array(img.convert("RGB") if img.mode != "RGB" else img)
+        self.shape = self.array.shape[:2]
+        self.gradients = GradientCache(self.array)
+        self.indexes = {}
+
+    def matches(self, img):
+        return img is self.source
+
+    def patch_index(self, r, known):
+        """PatchIndex dla promienia r, budowany przy pierwszym użyciu. known -
+        mapa środków z w pełni znanym patchem bez ograniczeń obszaru źródłowego
+        (indeks służy kolejnym usunięciom z innymi ograniczeniami; zapytania
+        filtrują kandydatów mapą valid bieżącego wypełnienia)."""
+        if r not in self.indexes:
+            self.indexes[r] = PatchIndex(self.array, known, r)
+        return self.indexes[r]
+
+    def revert(self, bounds):
+        """Po przerwanym wypełnieniu (anulowanie, błąd): gradienty i indeksy mogły
+        być już odświeżone częściowo wypełnionym obrazem - przelicza je w
+        bounds=(y0, y1, x0, x1) z self.array, które nadal opisuje obraz źródłowy."""
+        if bounds is None:
+            return
+        self.gradients.update(self.array, bounds)
+        for index in self.indexes.values():
+            index.refresh(self.array, bounds)
+
+    def update(self, img, bounds):
+        """Przyjmuje wynik wypełnienia img, zmieniony tylko w bounds=(y0, y1, x0, x1)."""
+        self.source = img
+        if bounds is None:
+            return
+        y0, y1, x0, x1 = bounds
+        if y0 >= y1 or x0 >= x1:
+            return
+        crop = img.crop((x0, y0, x1, y1))
+        self.array[y0:y1, x0:x1] = np.asarray(crop.convert("RGB") if crop.mode != "RGB" else crop)
+        self.gradients.update(self.array, bounds)
+        for index in self.indexes.values():
+            index.refresh(self.array, bounds)
@@ -3,7 +3,7 @@ from PIL import Image
 import cv2 as cv
 from scipy import ndimage
 
-def analyze_mask_complexity(mask):
+def analyze_mask_complexity(mask, gradients=None):
 
     mask_np = np.array(mask)
     total_pixels = mask_np.size
@@ -42,6 +42,9 @@ def analyze_mask_complexity(mask):
         mask_np[:, -1]
     ])
     is_edge_touching = np.any(edges > 0)
+
+    #Tekstura tła wokół maski (tylko gdy jest gotowy cache gradientów)
+    border_energy = gradients.border_energy(mask_np) if gradients is not None else None
     
     return {
         'area_ratio': area_ratio,
@@ -50,12 +53,13 @@ def analyze_mask_complexity(mask):
         'avg_hole_size': avg_hole_size,
         'max_hole_size': max_hole_size,
         'is_edge_touching': is_edge_touching,
-        'total_mask_pixels': mask_pixels
+        'total_mask_pixels': mask_pixels,
+        'border_energy': border_energy
     }
 
 
-def select_best_inpainting_method(mask):
-    metrics = analyze_mask_complexity(mask)
+def select_best_inpainting_method(mask, gradients=None):
+    metrics = analyze_mask_complexity(mask, gradients)
     
     if metrics is None:
         return 'neighbor'
@@ -96,9 +100,13 @@ def select_best_inpainting_method(mask):
     return 'telea'
 
 
-def auto_inpaint(img, mask, neighbor_func=None, telea_func=None, criminisi_func=None):
+def auto_inpaint(img, mask, neighbor_func=None, telea_func=None, criminisi_func=None, gradients=None,
+                 source_region=None, exclude_region=None, analysis=None, progress=None, cancel=None):
 
-    method = select_best_inpainting_method(mask)
+    #Analiza obrazu z poprzednich usunięć (tablica pikseli + gradienty)
+    if analysis is not None and gradients is None:
+        gradients = analysis.gradients
+    method = select_best_inpainting_method(mask, gradients)
     ###DEBUGGING####
     print(f"Auto-wybór metody: {method.upper()}")
     
@@ -111,20 +119,22 @@ def auto_inpaint(img, mask, neighbor_func=None, telea_func=None, criminisi_func=
         if telea_func:
             return telea_func(img.copy(), mask)
         from helpers import telea_inpaint
-        return telea_inpaint(img.copy(), mask)
+        return telea_inpaint(img.copy(), mask, gradients=gradients, analysis=analysis)
     elif method == 'criminisi':
         if criminisi_func:
             return criminisi_func(img.copy(), mask)
-        from criminisi import criminisi_inpaint
-        return criminisi_inpaint(img.copy(), mask)
+        from parallel_inpaint import parallel_criminisi_inpaint
+        return parallel_criminisi_inpaint(img.copy(), mask, gradients=gradients,
+                                          source_region=source_region, exclude_region=exclude_region,
+                                          analysis=analysis, progress=progress, cancel=cancel)
     
     return img.copy()
 
 
-def auto_inpaint_with_info(img, mask):
-    metrics = analyze_mask_complexity(mask)
-    method = select_best_inpainting_method(mask)
+def auto_inpaint_with_info(img, mask, gradients=None):
+    metrics = analyze_mask_complexity(mask, gradients)
+    method = select_best_inpainting_method(mask, gradients)
     
     
-    result = auto_inpaint(img, mask)
+    result = auto_inpaint(img, mask, gradients=gradients)
     return result, method, metrics
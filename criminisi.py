@@ -1,163 +1,823 @@
 from PIL import Image
+import heapq
+import time
 import numpy as np
 import cv2 as cv
 import scipy.ndimage as ndimage
+from gradients import GradientCache, expand_bounds
+from patchmatch import PatchMatchSearch
+from patch_index import PatchIndex
+from tracer import stage
 
 #=== ===#
 #===SPRAWDŹCIE CZY JEST POPRAWNIE PO MAM DOSYĆ TEGO KODU===#
 
-def criminisi_inpaint(img, mask):
-    img_np = np.array(img)
-    target = (np.array(mask) > 0).astype(np.uint8)
-    confidence = (1 - target).astype(np.float32)
+#===SILNIK WYSZUKIWANIA PATCHY===#
+
+def valid_centre_map(target, r, bounds=None, out=None):
+    """Mapa (h, w) bool: True tam, gdzie patch (2r+1)x(2r+1) o danym środku
+    mieści się w obrazie i nie zawiera ani jednego piksela maski.
+
+    Liczona jednym przebiegiem przez obraz całkowy zamiast np.any() per kandydat.
+    Z bounds=(y0, y1, x0, x1) i istniejącą mapą out przelicza tylko środki,
+    których patch nachodzi na zmieniony prostokąt.
+    """
+    h, w = target.shape
+    k = 2 * r + 1
+    if out is None:
+        out = np.zeros((h, w), dtype=bool)
+        bounds = None
+    if h < k or w < k:
+        return out
+    if bounds is None:
+        cy0, cy1, cx0, cx1 = r, h - r, r, w - r
+    else:
+        y0, y1, x0, x1 = bounds
+        cy0, cy1 = max(r, y0 - r), min(h - r, y1 + r)
+        cx0, cx1 = max(r, x0 - r), min(w - r, x1 + r)
+        if cy0 >= cy1 or cx0 >= cx1:
+            return out
+    sub = (target[cy0 - r:cy1 + r, cx0 - r:cx1 + r] > 0).astype(np.uint8)
+    integral = cv.integral(sub)
+    window = integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
+    out[cy0:cy1, cx0:cx1] = window == 0
+    return out
+
+
+def extract_template(work, target, y, x, r, templ=None, known=None):
+    """Wycina patch docelowy o środku (y, x) razem z maską znanych pikseli.
+
+    Piksele poza obrazem traktowane są jak nieznane, dzięki czemu patch ma
+    zawsze rozmiar (2r+1)x(2r+1) również przy krawędzi. templ/known mogą być
+    gotowymi buforami (k, k, C) / (k, k) float32, które zostaną nadpisane.
+    """
+    h, w = target.shape
+    k = 2 * r + 1
+    if templ is None:
+        templ = np.empty((k, k, work.shape[2]), dtype=np.float32)
+    if known is None:
+        known = np.empty((k, k), dtype=np.float32)
+    templ.fill(0)
+    known.fill(0)
+    y0, y1 = max(0, y - r), min(h, y + r + 1)
+    x0, x1 = max(0, x - r), min(w, x + r + 1)
+    ty, tx = y0 - (y - r), x0 - (x - r)
+    templ[ty:ty + y1 - y0, tx:tx + x1 - x0] = work[y0:y1, x0:x1]
+    known[ty:ty + y1 - y0, tx:tx + x1 - x0] = target[y0:y1, x0:x1] == 0
+    return templ, known
+
+
+def masked_ssd_map(region, templ, known, sq=None, weighted=None, scores=None):
+    """SSD z maską dla wszystkich położeń patcha w regionie naraz.
+
+    SSD(q) = sum M*I^2 - 2*sum M*T*I + sum M*T^2; ostatni składnik jest stały,
+    więc jest pomijany. Obie korelacje liczy cv.matchTemplate (TM_CCORR).
+    Wynik ma kształt (H-k+1, W-k+1) - element [i, j] odpowiada środkowi (i+r, j+r).
+    sq - gotowa suma kwadratów kanałów regionu, weighted - bufor na T*M,
+    scores - para płaskich buforów float32 na obie korelacje (co najmniej
+    (H-k+1)*(W-k+1) elementów); wynik jest wtedy widokiem na pierwszy z nich.
+    """
+    if sq is None:
+        sq = np.einsum('ijc,ijc->ij', region, region)
+    if weighted is None:
+        weighted = np.empty_like(templ)
+    np.multiply(templ, known[:, :, np.newaxis], out=weighted)
+    if scores is None:
+        ssd = cv.matchTemplate(region, weighted, cv.TM_CCORR)
+        ssd *= -2.0
+        ssd += cv.matchTemplate(sq, known, cv.TM_CCORR)
+        return ssd
+    k = templ.shape[0]
+    shape = (region.shape[0] - k + 1, region.shape[1] - k + 1)
+    size = shape[0] * shape[1]
+    ssd, corr = (buf[:size].reshape(shape) for buf in scores)
+    cv.matchTemplate(region, weighted, cv.TM_CCORR, result=ssd)
+    ssd *= -2.0
+    ssd += cv.matchTemplate(sq, known, cv.TM_CCORR, result=corr)
+    return ssd
+
+
+def search_bounds(shape, r, y, x, search_radius=None):
+    """Zakres środków kandydatów (cy0, cy1, cx0, cx1), włącznie, w oknie
+    +-search_radius wokół (y, x) (None = cały obraz)."""
+    h, w = shape[:2]
+    if search_radius is None:
+        return r, h - r - 1, r, w - r - 1
+    return (max(r, y - search_radius), min(h - r - 1, y + search_radius),
+            max(r, x - search_radius), min(w - r - 1, x + search_radius))
+
+
+def clip_bounds(bounds, limit):
+    """Część wspólna dwóch zakresów środków (cy0, cy1, cx0, cx1), włącznie
+    (limit None = bez ograniczenia); pusty zakres ma cy0 > cy1 albo cx0 > cx1."""
+    if limit is None:
+        return bounds
+    return (max(bounds[0], limit[0]), min(bounds[1], limit[1]),
+            max(bounds[2], limit[2]), min(bounds[3], limit[3]))
+
+
+def search_window(work, valid, templ, known, cy0, cy1, cx0, cx1, sq=None, weighted=None, scores=None):
+    """Najlepszy poprawny środek w zakresie [cy0, cy1] x [cx0, cx1] (włącznie).
+
+    Zwraca (ssd, (qy, qx)) albo (inf, None). Wartości ssd pomijają składnik
+    stały dla danego szablonu, więc można je porównywać między pasami okna.
+    sq - opcjonalna mapa (h, w) sum kwadratów kanałów work, weighted i scores -
+    bufory jak w masked_ssd_map (scores wystarczające na h*w wyników).
+    """
+    r = templ.shape[0] // 2
+    if cy0 > cy1 or cx0 > cx1:
+        return np.inf, None
+    valid_win = valid[cy0:cy1 + 1, cx0:cx1 + 1]
+    if not valid_win.any():
+        return np.inf, None
+    rows, cols = slice(cy0 - r, cy1 + r + 1), slice(cx0 - r, cx1 + r + 1)
+    ssd = masked_ssd_map(work[rows, cols], templ, known,
+                         None if sq is None else sq[rows, cols], weighted, scores)
+    ssd[~valid_win] = np.inf
+    iy, ix = np.unravel_index(np.argmin(ssd), ssd.shape)
+    return float(ssd[iy, ix]), (int(cy0 + iy), int(cx0 + ix))
+
+
+def exact_search(work, valid, templ, known, y, x, search_radius=None):
+    """Dokładne wyszukiwanie najlepszego źródła dla patcha o środku (y, x).
+
+    Ocenia wszystkie poprawne środki w oknie +-search_radius (None = cały obraz)
+    i zwraca (qy, qx) lub None, gdy w oknie nie ma żadnego poprawnego środka.
+    """
+    r = templ.shape[0] // 2
+    bounds = search_bounds(valid.shape, r, y, x, search_radius)
+    return search_window(work, valid, templ, known, *bounds)[1]
+
+
+def copy_patch(work, target, confidence, y, x, q, r, c_hat, sources=None, extra=()):
+    """Kopiuje nieznane piksele patcha (y, x) ze źródła q i aktualizuje maskę oraz pewność.
+
+    sources - opcjonalna mapa (h, w, 2) współrzędnych pierwotnie znanego piksela,
+    z którego pochodzi każdy wypełniony piksel (-1 dla pikseli nietkniętych).
+    extra - dodatkowe bufory (h, w, ...) kopiowane tak samo jak work.
+    Zwraca prostokąt zmian (y0, y1, x0, x1) i liczbę wypełnionych pikseli.
+    """
+    h, w = target.shape
+    qy, qx = q
+    y0, y1 = max(0, y - r), min(h, y + r + 1)
+    x0, x1 = max(0, x - r), min(w, x + r + 1)
+    dst = target[y0:y1, x0:x1] > 0
+    for buf in (work,) + tuple(extra):
+        src = buf[qy + y0 - y:qy + y1 - y, qx + x0 - x:qx + x1 - x]
+        buf[y0:y1, x0:x1][dst] = src[dst]
+    if sources is not None:
+        sy, sx = np.mgrid[qy + y0 - y:qy + y1 - y, qx + x0 - x:qx + x1 - x]
+        origin = sources[qy + y0 - y:qy + y1 - y, qx + x0 - x:qx + x1 - x]
+        chained = origin[:, :, 0] >= 0
+        sy = np.where(chained, origin[:, :, 0], sy)
+        sx = np.where(chained, origin[:, :, 1], sx)
+        sources[y0:y1, x0:x1][dst] = np.stack([sy, sx], axis=2)[dst]
+    confidence[y0:y1, x0:x1][dst] = c_hat
+    target[y0:y1, x0:x1][dst] = 0
+    return (y0, y1, x0, x1), int(np.count_nonzero(dst))
+
+
+def paste_patch(work, target, confidence, y, x, patch, r, c_hat, extra=()):
+    """Wkleja nieznane piksele patcha (y, x) z gotowej tablicy patch (k, k, C),
+    np. wzorca z biblioteki (exemplar_library.py), i aktualizuje maskę oraz pewność.
+
+    extra - pary (bufor (h, w, ...), patch w przestrzeni tego bufora).
+    Zwraca prostokąt zmian (y0, y1, x0, x1) i liczbę wypełnionych pikseli.
+    """
+    h, w = target.shape
+    y0, y1 = max(0, y - r), min(h, y + r + 1)
+    x0, x1 = max(0, x - r), min(w, x + r + 1)
+    py, px = y0 - (y - r), x0 - (x - r)
+    dst = target[y0:y1, x0:x1] > 0
+    for buf, src in ((work, patch),) + tuple(extra):
+        buf[y0:y1, x0:x1][dst] = src[py:py + y1 - y0, px:px + x1 - x0][dst]
+    confidence[y0:y1, x0:x1][dst] = c_hat
+    target[y0:y1, x0:x1][dst] = 0
+    return (y0, y1, x0, x1), int(np.count_nonzero(dst))
+
+
+#===PRIORYTETY===#
+
+def gather_patches(arr, points, r, fill=0):
+    """Zwraca (N, (2r+1)^2) wartości arr z patchy o środkach points oraz maskę
+    pikseli leżących w obrazie. Piksele spoza obrazu dostają wartość fill."""
+    h, w = arr.shape[:2]
+    offs = np.arange(-r, r + 1)
+    ys = points[:, 0, None, None] + offs[None, :, None]
+    xs = points[:, 1, None, None] + offs[None, None, :]
+    inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+    vals = arr[np.clip(ys, 0, h - 1), np.clip(xs, 0, w - 1)]
+    vals = np.where(inside, vals, fill)
+    n = len(points)
+    return vals.reshape(n, -1), inside.reshape(n, -1)
+
+
+def compute_priorities(front, confidence, target, gx, gy, nx, ny, r, alpha=255.0):
+    """Priorytety P = C * D + 0.001 dla wszystkich punktów frontu naraz.
+
+    C - średnia pewność patcha (filtr pudełkowy liczony tylko w punktach frontu),
+    D - |izofota * normalna| / alpha, gdzie izofota pochodzi z piksela o
+    największym gradiencie wśród znanych pikseli patcha (0.1 gdy brak gradientu).
+    Punkty bez znanych pikseli dostają -inf.
+    """
+    if len(front) == 0:
+        return np.zeros(0, dtype=np.float32)
+    conf, inside = gather_patches(confidence, front, r)
+    c = conf.sum(axis=1) / inside.sum(axis=1)
+    tgt, _ = gather_patches(target, front, r, fill=1)
+    known = tgt == 0
+    px, _ = gather_patches(gx, front, r)
+    py, _ = gather_patches(gy, front, r)
+    mag = np.sqrt(px ** 2 + py ** 2) * known
+    idx = np.argmax(mag, axis=1)
+    rows = np.arange(len(front))
+    max_gx = px[rows, idx]
+    max_gy = py[rows, idx]
+    max_mag = np.sqrt(max_gx ** 2 + max_gy ** 2) + 1e-6
+    isophote_y = -max_gx / max_mag
+    isophote_x = max_gy / max_mag
+    n_p_y = ny[front[:, 0], front[:, 1]]
+    n_p_x = nx[front[:, 0], front[:, 1]]
+    d = np.abs(isophote_x * n_p_y + isophote_y * n_p_x) / alpha
+    d = np.where(mag[rows, idx] > 0, d, 0.1)
+    p = c * d + 0.001 #===0.001, LEPIEJ DZIAŁA===#
+    return np.where(known.any(axis=1), p, -np.inf)
+
+
+#===TRWAŁY FRONT Z KOPCEM PRIORYTETÓW===#
+
+class FillFront:
+    """Front wypełniania utrzymywany między iteracjami.
+
+    Przynależność do frontu, normalne maski i priorytety trzymane są w mapach
+    (h, w), a kolejność wyboru w kopcu z leniwym unieważnianiem: wpis jest
+    aktualny tylko wtedy, gdy piksel nadal leży na froncie i ma ten sam priorytet.
+    Po skopiowaniu patcha update(bounds) przelicza wyłącznie otoczenie zmiany.
+    tracer - opcjonalny StageTracer (etapy 'front', 'priorities', 'heap').
+    """
+
+    def __init__(self, target, confidence, gx, gy, r, alpha=255.0, tracer=None):
+        h, w = target.shape
+        self.target = target
+        self.confidence = confidence
+        self.gx = gx
+        self.gy = gy
+        self.r = r
+        self.alpha = alpha
+        self.tracer = tracer
+        self.nx = np.zeros((h, w), dtype=np.float32)
+        self.ny = np.zeros((h, w), dtype=np.float32)
+        self.front_mask = np.zeros((h, w), dtype=bool)
+        self.priority = np.full((h, w), -np.inf, dtype=np.float32)
+        self.size = 0
+        self.heap = []
+        self.rebuilds = 0
+        self.update()
+
+    def _update_geometry(self, bounds):
+        #===NORMALNE I FRONT W PROSTOKĄCIE (margines 1 na sobel/dilate)===#
+        y0, y1, x0, x1 = bounds
+        sy0, sy1, sx0, sx1 = expand_bounds(bounds, 1, self.target.shape)
+        sub = self.target[sy0:sy1, sx0:sx1]
+        sub_f = sub.astype(np.float32)
+        nx = ndimage.sobel(sub_f, axis=1)
+        ny = ndimage.sobel(sub_f, axis=0)
+        norm = np.sqrt(nx**2 + ny**2 + 1e-6)
+        inner = (slice(y0 - sy0, y1 - sy0), slice(x0 - sx0, x1 - sx0))
+        self.nx[y0:y1, x0:x1] = (nx / norm)[inner]
+        self.ny[y0:y1, x0:x1] = (ny / norm)[inner]
+        dilated = cv.dilate(sub, np.ones((3, 3), np.uint8), iterations=1)
+        new = ((dilated > 0) & (sub == 0))[inner]
+        self.size += int(np.count_nonzero(new)) - int(np.count_nonzero(self.front_mask[y0:y1, x0:x1]))
+        self.front_mask[y0:y1, x0:x1] = new
+
+    def update(self, bounds=None):
+        """Przelicza front i priorytety w otoczeniu zmienionego prostokąta (None = cały obraz)."""
+        shape = self.target.shape
+        with stage(self.tracer, 'front'):
+            self._update_geometry(expand_bounds(bounds, 1, shape))
+            y0, y1, x0, x1 = expand_bounds(bounds, self.r + 1, shape)
+            self.priority[y0:y1, x0:x1] = -np.inf
+            pts = np.argwhere(self.front_mask[y0:y1, x0:x1]) + (y0, x0)
+        with stage(self.tracer, 'priorities'):
+            if len(pts) > 0:
+                p = compute_priorities(pts, self.confidence, self.target, self.gx, self.gy,
+                                       self.nx, self.ny, self.r, self.alpha)
+                self.priority[pts[:, 0], pts[:, 1]] = p
+        with stage(self.tracer, 'heap'):
+            stale = len(self.heap) + len(pts) - self.size
+            if bounds is None or stale > 2 * self.size + 1024:
+                #===PRZEBUDOWA KOPCA (CAŁY OBRAZ) DOPIERO, GDY NIEAKTUALNE WPISY PRZEWAŻAJĄ===#
+                pts = np.argwhere(self.front_mask)
+                p = self.priority[pts[:, 0], pts[:, 1]]
+                self.heap = [(-pv, y, x) for (y, x), pv in zip(pts.tolist(), p.tolist()) if pv > -np.inf]
+                heapq.heapify(self.heap)
+                self.rebuilds += 1
+                return
+            p = self.priority[pts[:, 0], pts[:, 1]]
+            for (y, x), pv in zip(pts.tolist(), p.tolist()):
+                if pv > -np.inf:
+                    heapq.heappush(self.heap, (-pv, y, x))
+
+    def pop(self):
+        """Zwraca (y, x) punktu o najwyższym priorytecie albo None, gdy front jest pusty."""
+        while self.heap:
+            neg_p, y, x = heapq.heappop(self.heap)
+            if self.front_mask[y, x] and self.priority[y, x] == -neg_p:
+                return y, x
+        return None
+
+    def pop_batch(self, k, spacing, scan=8):
+        """Do k punktów o najwyższym priorytecie, których patche się nie nakładają
+        (odległość Czebyszewa środków >= spacing). Przegląda co najwyżej scan*k
+        aktualnych wpisów kopca; pominięte punkty wracają do kopca."""
+        picked, skipped = [], []
+        while len(picked) < k and len(picked) + len(skipped) < scan * k:
+            p = self.pop()
+            if p is None:
+                break
+            y, x = p
+            if all(max(abs(y - py), abs(x - px)) >= spacing for py, px in picked):
+                picked.append(p)
+            else:
+                skipped.append(p)
+        for y, x in skipped:
+            heapq.heappush(self.heap, (-float(self.priority[y, x]), y, x))
+        return picked
+
+
+#===ADAPTACYJNY ROZMIAR PATCHA===#
+
+#===(próg średniego modułu gradientu wokół maski, rozmiar patcha) - od najgładszego tła===#
+PATCH_SIZE_STEPS = ((10.0, 17), (20.0, 13), (60.0, 9))
+#===przy silnej teksturze: spójne krawędzie -> mały patch, reszta -> domyślny===#
+EDGE_COHERENCE = 0.5
+
+
+def texture_stats(img_np, target, width=8, gradients=None):
+    """Średni moduł gradientu i spójność tensora struktury w pasie o szerokości
+    width wokół maski. Liczone tylko w prostokącie otaczającym maskę; z
+    gotowym GradientCache bez ponownego Sobela. None dla pustej maski."""
+    if not target.any():
+        return None
+    h, w = target.shape
+    x, y, bw, bh = cv.boundingRect((target > 0).astype(np.uint8))
+    y0, y1, x0, x1 = expand_bounds((y, y + bh, x, x + bw), width, (h, w))
+    hole = target[y0:y1, x0:x1] > 0
+    ring = ndimage.binary_dilation(hole, iterations=width) & ~hole
+    if not ring.any():
+        return None
+    if gradients is not None:
+        gx = gradients.gx[y0:y1, x0:x1]
+        gy = gradients.gy[y0:y1, x0:x1]
+    else:
+        gray = np.mean(img_np[y0:y1, x0:x1, :3], axis=2, dtype=np.float32)
+        gx = ndimage.sobel(gray, axis=1)
+        gy = ndimage.sobel(gray, axis=0)
+    energy = float(np.mean(np.sqrt(gx[ring] ** 2 + gy[ring] ** 2)))
+    #===TENSOR STRUKTURY (wygładzony), spójność = (l1 - l2) / (l1 + l2)===#
+    jxx = ndimage.gaussian_filter(gx * gx, 2.0)[ring]
+    jyy = ndimage.gaussian_filter(gy * gy, 2.0)[ring]
+    jxy = ndimage.gaussian_filter(gx * gy, 2.0)[ring]
+    trace = jxx + jyy
+    coherence = np.sqrt((jxx - jyy) ** 2 + 4 * jxy ** 2) / (trace + 1e-6)
+    coherence = float(np.average(coherence, weights=trace)) if trace.sum() > 0 else 0.0
+    return energy, coherence
+
+
+def choose_patch_size(img_np, target, gradients=None, forbidden=None):
+    """Rozmiar patcha dla maski na podstawie tekstury wokół niej: duże patche
+    na gładkim tle (niebo, ściana), mniejsze przy teksturze i krawędziach.
+    Zawsze nieparzysty i taki, że w obrazie jest co najmniej jeden w pełni
+    znany patch źródłowy (poza pikselami forbidden)."""
+    stats = texture_stats(img_np, target, gradients=gradients)
+    size = 9
+    if stats is not None:
+        energy, coherence = stats
+        for limit, step_size in PATCH_SIZE_STEPS:
+            if energy < limit:
+                size = step_size
+                break
+        else:
+            size = 7 if coherence > EDGE_COHERENCE else 9
+    #===ZMNIEJSZANIE, DOPÓKI W OBRAZIE NIE MA ŻADNEGO W PEŁNI ZNANEGO PATCHA===#
+    h, w = target.shape
+    size = max(3, min(size, (min(h, w) - 1) // 2 * 2 + 1))
+    blocked = target if forbidden is None else (target > 0) | forbidden
+    while size > 3 and not valid_centre_map(blocked, size // 2).any():
+        size -= 2
+    return size
+
+
+#===PRZERWANIE I SZYBKIE DOKOŃCZENIE===#
+
+class InpaintCancelled(Exception):
+    """Zgłaszany, gdy token anulowania (obiekt z metodą is_set(), np.
+    threading.Event) zostanie ustawiony w trakcie wypełniania."""
+
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set():
+        raise InpaintCancelled("Inpainting przerwany")
+
+
+def revert_analysis(analysis, mask_np):
+    """Przywraca analizę obrazu w ramce maski po przerwanym wypełnieniu (criminisi_inpaint
+    odświeża jej gradienty i indeks w miejscu po każdym kopiowaniu)."""
+    if analysis is None:
+        return
+    x, y, bw, bh = cv.boundingRect((np.asarray(mask_np) > 0).astype(np.uint8))
+    if bw > 0 and bh > 0:
+        analysis.revert((y, y + bh, x, x + bw))
+
+
+def fast_fill(work, target, radius=3, margin=8):
+    """Dopełnia pozostałe piksele maski metodą Telea, tylko w prostokącie
+    otaczającym maskę (z marginesem). Zwraca prostokąt zmian albo None."""
+    if not target.any():
+        return None
+    x, y, bw, bh = cv.boundingRect(target)
+    h, w = target.shape
+    y0, y1 = max(0, y - margin), min(h, y + bh + margin)
+    x0, x1 = max(0, x - margin), min(w, x + bw + margin)
+    roi = np.clip(np.rint(work[y0:y1, x0:x1]), 0, 255).astype(np.uint8)
+    roi_mask = (target[y0:y1, x0:x1] > 0).astype(np.uint8)
+    filled = cv.inpaint(roi, roi_mask, radius, cv.INPAINT_TELEA)
+    work[y0:y1, x0:x1][roi_mask > 0] = filled[roi_mask > 0]
+    target[y0:y1, x0:x1] = 0
+    return (y, y + bh, x, x + bw)
+
+
+#===OGRANICZENIE OBSZARU ŹRÓDŁOWEGO===#
+
+def forbidden_source_map(shape, source_region=None, exclude_region=None):
+    """Mapa (h, w) bool pikseli, z których nie wolno kopiować: poza source_region
+    (> 0 = dozwolone) albo w exclude_region (> 0 = zakazane). None, gdy brak
+    obu ograniczeń. Maski mogą być obrazami PIL albo tablicami."""
+    if source_region is None and exclude_region is None:
+        return None
+    forbidden = np.zeros(shape[:2], dtype=bool)
+    if source_region is not None:
+        forbidden |= np.asarray(source_region) == 0
+    if exclude_region is not None:
+        forbidden |= np.asarray(exclude_region) > 0
+    return forbidden
+
+
+def centre_bounds(valid):
+    """Zakres (cy0, cy1, cx0, cx1), włącznie, obejmujący wszystkie True w valid."""
+    rows = np.flatnonzero(valid.any(axis=1))
+    if len(rows) == 0:
+        return 0, -1, 0, -1
+    cols = np.flatnonzero(valid.any(axis=0))
+    return int(rows[0]), int(rows[-1]), int(cols[0]), int(cols[-1])
+
+
+#===BUFORY ROBOCZE WIELOKROTNEGO UŻYTKU===#
+
+class CriminisiWorkspace:
+    """Bufory jednego wypełniania, alokowane raz i używane ponownie.
+
+    load() kopiuje obraz i maskę do gotowych tablic: image (float32, dokładne
+    wartości pikseli wyniku), features (przestrzeń, w której liczone jest SSD -
+    to samo co image albo Lab przy color='lab'), sq (suma kwadratów kanałów
+    features), target, confidence i valid, oraz przygotowuje bufory szablonu
+    i map SSD (scores - okno wyszukiwania nigdy nie jest większe niż obraz).
+    Przy mapie forbidden (forbidden_source_map) raz liczona jest mapa allowed
+    środków, których patch nie dotyka zakazanych pikseli, i jej zakres
+    source_bounds - valid jest zawsze jej podzbiorem, a wyszukiwanie nie
+    wychodzi poza ten zakres.
+    Tablice są widokami na płaskie bufory, które rosną tylko wtedy, gdy nowy
+    obraz jest większy, więc kolejne wywołania (także na mniejszych ROI)
+    nie alokują pamięci od nowa.
+    """
+
+    def __init__(self, r=4, color='rgb'):
+        self.r = r
+        self.color = color
+        self._storage = {}
+        self.shape = None
+
+    def _buffer(self, name, shape, dtype):
+        size = int(np.prod(shape))
+        buf = self._storage.get(name)
+        if buf is None or buf.size < size or buf.dtype != dtype:
+            buf = np.empty(size, dtype=dtype)
+            self._storage[name] = buf
+        return buf[:size].reshape(shape)
+
+    def load(self, img_np, mask_np, r=None, forbidden=None):
+        """Wypełnia bufory obrazem (h, w, C) i maską (h, w; > 0 = do wypełnienia).
+        r - promień patcha, jeśli ma się zmienić względem poprzedniego wywołania;
+        forbidden - mapa pikseli zakazanych jako źródło (piksele maski są pomijane,
+        po wypełnieniu mogą być źródłem jak zwykle)."""
+        if r is not None:
+            self.r = r
+        h, w, c = img_np.shape
+        k = 2 * self.r + 1
+        self.shape = (h, w)
+        self.image = self._buffer('image', (h, w, c), np.float32)
+        np.copyto(self.image, img_np, casting='unsafe')
+        if self.color == 'lab' and c == 3:
+            self.features = self._buffer('features', (h, w, c), np.float32)
+            np.multiply(self.image, 1.0 / 255.0, out=self.features)
+            cv.cvtColor(self.features, cv.COLOR_RGB2Lab, dst=self.features)
+        else:
+            self.features = self.image
+        self.sq = self._buffer('sq', (h, w), np.float32)
+        np.einsum('ijc,ijc->ij', self.features, self.features, out=self.sq)
+        self.target = self._buffer('target', (h, w), np.uint8)
+        np.not_equal(mask_np, 0, out=self.target.view(bool))
+        self.confidence = self._buffer('confidence', (h, w), np.float32)
+        np.subtract(1, self.target, out=self.confidence)
+        self.valid = self._buffer('valid', (h, w), bool)
+        self.valid.fill(False)
+        valid_centre_map(self.target, self.r, out=self.valid)
+        self.allowed = None
+        self.source_bounds = None
+        if forbidden is not None:
+            blocked = self._buffer('blocked', (h, w), bool)
+            np.greater(forbidden, 0, out=blocked)
+            blocked &= self.target == 0
+            self.allowed = self._buffer('allowed', (h, w), bool)
+            self.allowed.fill(False)
+            valid_centre_map(blocked, self.r, out=self.allowed)
+            self.valid &= self.allowed
+            self.source_bounds = centre_bounds(self.allowed)
+        self.templ = self._buffer('templ', (k, k, c), np.float32)
+        self.known = self._buffer('known', (k, k), np.float32)
+        self.weighted = self._buffer('weighted', (k, k, c), np.float32)
+        self.scores = (self._buffer('scores', (h * w,), np.float32),
+                       self._buffer('scores_sq', (h * w,), np.float32))
+        return self
+
+    def template(self, y, x):
+        """Szablon i maska znanych pikseli patcha (y, x) - w buforach workspace."""
+        return extract_template(self.features, self.target, y, x, self.r, self.templ, self.known)
+
+    def search_window(self, templ, known, cy0, cy1, cx0, cx1):
+        return search_window(self.features, self.valid, templ, known, cy0, cy1, cx0, cx1,
+                             self.sq, self.weighted, self.scores)
+
+    def copy(self, y, x, q, c_hat, sources=None):
+        """copy_patch na image (i features) + lokalna aktualizacja sq i valid."""
+        extra = () if self.features is self.image else (self.features,)
+        changed, filled = copy_patch(self.image, self.target, self.confidence, y, x, q,
+                                     self.r, c_hat, sources, extra)
+        self._refresh(changed)
+        return changed, filled
+
+    def paste(self, y, x, patch, c_hat):
+        """paste_patch pikseli RGB spoza obrazu (np. z biblioteki wzorców) + aktualizacja jak w copy()."""
+        extra = ()
+        if self.color == 'lab' and self.image.shape[2] == 3:
+            lab = cv.cvtColor(patch.astype(np.float32) * (1.0 / 255.0), cv.COLOR_RGB2Lab)
+            extra = ((self.features, lab),)
+        elif self.features is not self.image:
+            #===RGB w osobnym buforze (np. po bind() puli wyszukiwania)===#
+            extra = ((self.features, patch),)
+        changed, filled = paste_patch(self.image, self.target, self.confidence, y, x, patch,
+                                      self.r, c_hat, extra)
+        self._refresh(changed)
+        return changed, filled
+
+    def _refresh(self, changed):
+        y0, y1, x0, x1 = changed
+        feats = self.features[y0:y1, x0:x1]
+        np.einsum('ijc,ijc->ij', feats, feats, out=self.sq[y0:y1, x0:x1])
+        valid_centre_map(self.target, self.r, changed, self.valid)
+        if self.allowed is not None:
+            vy0, vy1, vx0, vx1 = expand_bounds(changed, self.r, self.shape)
+            self.valid[vy0:vy1, vx0:vx1] &= self.allowed[vy0:vy1, vx0:vx1]
+
+
+def criminisi_inpaint(img, mask, gradients=None, search='exact', seed=None,
+                      max_iterations=500, pyramid=None, sources=None,
+                      time_budget=None, deadline=None, progress=None, cancel=None,
+                      search_workers=None, batch=1, workspace=None, patch_size=None,
+                      source_region=None, exclude_region=None, tracer=None, analysis=None,
+                      library=None):
+    """Inpainting metodą Criminisiego.
+
+    gradients - opcjonalny GradientCache tego samego obrazu; jest aktualizowany
+    w miejscu razem z wypełnianymi patchami, więc po powrocie opisuje wynik.
+    search - 'exact' (dokładne SSD w oknie wokół punktu), 'patchmatch'
+    (przybliżone wyszukiwanie po całym obrazie, seed ustala losowanie) albo
+    'index' (indeks PCA + KD-drzewo wszystkich znanych patchy, budowany raz).
+    max_iterations - limit kopiowanych patchy (None = bez limitu).
+    pyramid - True wymusza tryb wieloskalowy (pyramid.py), None włącza go sam,
+    gdy dziura jest za duża, by zmieścić się w max_iterations (ale nie przy
+    podanej library, której wzorce działają tylko w pełnej rozdzielczości).
+    Podany patch_size, batch, search_workers i sources przechodzą do tego trybu.
+    sources - opcjonalna mapa (h, w, 2) int32 (-1 = brak), do której trafiają
+    współrzędne pierwotnie znanych pikseli, z których skopiowano wypełnienie.
+    time_budget / deadline - limit czasu w sekundach / moment time.monotonic();
+    po jego przekroczeniu (albo po max_iterations) reszta maski jest
+    dopełniana metodą Telea, więc wynik nigdy nie ma niewypełnionych pikseli.
+    progress - wywoływane jako progress(pozostało_pikseli, wszystkich_pikseli).
+    cancel - token z metodą is_set(); po ustawieniu zgłaszany jest InpaintCancelled.
+    search_workers - liczba procesów (search_pool.py), między które dzielone są
+    pasy okna wyszukiwania dokładnego; przydatne przy jednej dużej dziurze.
+    batch - maksymalna liczba nienakładających się patchy wypełnianych w jednej
+    iteracji; faktyczna liczba rośnie z długością frontu (ok. jeden patch na
+    dwie szerokości patcha frontu), więc przy małych dziurach zostaje 1.
+    workspace - CriminisiWorkspace do ponownego użycia między wywołaniami
+    (np. z color='lab', żeby porównywać patche w przestrzeni Lab).
+    patch_size - bok patcha (nieparzysty); None wybiera go z tekstury wokół
+    maski (choose_patch_size).
+    source_region / exclude_region - maski (> 0) obszaru, z którego wolno /
+    nie wolno brać patchy źródłowych (np. pas wokół obiektu, logo do usunięcia).
+    tracer - opcjonalny StageTracer (tracer.py): czasy etapów (load, gradients,
+    front, priorities, heap, select, search, fallback_search, library, copy,
+    index, fast_fill) i liczniki każdej iteracji.
+    analysis - ImageAnalysis (analysis_cache.py) tego samego obrazu: zastępuje
+    konwersję img, dostarcza gradients i indeks PCA dla search='index'.
+    library - ExemplarLibrary (exemplar_library.py): dla każdego patcha
+    przeszukiwana jest też biblioteka zewnętrznych zdjęć i wklejany jest jej
+    wzorzec, jeśli ma mniejsze SSD (RGB) niż najlepsze źródło z obrazu; piksele
+    z biblioteki zostają w sources jako -1. Używana tylko dla obrazów RGB i
+    patchy nie większych niż patche biblioteki (nie w trybie wieloskalowym).
+    """
+    if time_budget is not None:
+        budget_end = time.monotonic() + time_budget
+        deadline = budget_end if deadline is None else min(deadline, budget_end)
+    if analysis is not None:
+        img_np = analysis.array
+        if gradients is None:
+            gradients = analysis.gradients
+    else:
+        img_np = np.array(img)
+    mask_np = np.array(mask)
     h, w, _ = img_np.shape
-    patch_size = 9
+    forbidden = forbidden_source_map((h, w), source_region, exclude_region)
+    patch_fixed = patch_size is not None #===podany przez wywołującego trafia też do trybu wieloskalowego===#
+    if patch_size is None:
+        cache = gradients if gradients is not None and gradients.shape == (h, w) else None
+        patch_size = choose_patch_size(img_np, mask_np, cache, forbidden)
     r = patch_size // 2
     alpha = 255.0
+    remaining = int(np.count_nonzero(mask_np))
+    #===DUŻA DZIURA - TRYB WIELOSKALOWY (patch wypełnia średnio ok. r*(2r+1) pikseli)===#
+    if pyramid is None:
+        pyramid = (library is None and max_iterations is not None
+                   and remaining > max_iterations * max(1, batch) * r * patch_size)
+    if pyramid:
+        from pyramid import pyramid_inpaint
+        try:
+            return pyramid_inpaint(img, mask, gradients=gradients, search=search, seed=seed,
+                                   deadline=deadline, progress=progress, cancel=cancel,
+                                   workspace=workspace, exclude_region=forbidden, tracer=tracer,
+                                   patch_size=patch_size if patch_fixed else None, batch=batch,
+                                   search_workers=search_workers, sources=sources)
+        except BaseException:
+            revert_analysis(analysis, mask_np)
+            raise
+    #===BUFORY ROBOCZE float32 - KOPIOWANIE NIE ZMIENIA WARTOŚCI, WIĘC WYNIK JEST DOKŁADNY===#
+    with stage(tracer, 'load'):
+        ws = (workspace if workspace is not None else CriminisiWorkspace()).load(img_np, mask_np, r, forbidden)
+    work, target, confidence = ws.features, ws.target, ws.confidence
     #===Limit iteracji dla bezpieczeństwa===#
-    max_iterations = 500
+    if max_iterations is None:
+        max_iterations = np.inf
     iteration = 0
-    #===Normalne===#
-    target_float = target.astype(np.float32)
-    nx = ndimage.sobel(target_float, axis=1)
-    ny = ndimage.sobel(target_float, axis=0)
-    norm = np.sqrt(nx**2 + ny**2 + 1e-6)
-    nx /= norm
-    ny /= norm
-    #===GRADIENTY===#
-    gray = np.mean(img_np, axis=2).astype(np.float32)
-    gx = ndimage.sobel(gray, axis=1)
-    gy = ndimage.sobel(gray, axis=0)
-    while np.any(target) and iteration < max_iterations:
-        iteration += 1
-        #===SZUKANIE FRONTU===#
-        kernel = np.ones((3, 3), np.uint8)
-        dilated = cv.dilate(target, kernel, iterations=1)
-        front_mask = (dilated - target) > 0
-        front = np.argwhere(front_mask & (target == 0))
-        if len(front) == 0:
-            #===BRAK FRONTU, UZYJ PIKSELI===#
-            front = np.argwhere(target > 0)
-            if len(front) == 0:
+    #===GRADIENTY - ODŚWIEŻANE LOKALNIE PO KAŻDYM KOPIOWANIU===#
+    if gradients is None or gradients.shape != (h, w):
+        with stage(tracer, 'gradients'):
+            gradients = GradientCache(ws.image)
+    #===CENTRA Z W PEŁNI ZNANYM PATCHEM (ws.valid) - AKTUALIZOWANE LOKALNIE PO KAŻDYM KOPIOWANIU===#
+    valid = ws.valid
+    #===FRONT, NORMALNE I PRIORYTETY - TEŻ AKTUALIZOWANE LOKALNIE===#
+    front = FillFront(target, confidence, gradients.gx, gradients.gy, r, alpha, tracer)
+    #===WYSZUKIWARKA PATCHMATCH (NNF trzymany przez całe wypełnianie)===#
+    matcher = PatchMatchSearch((h, w), r, seed=seed) if search == 'patchmatch' else None
+    #===INDEKS DESKRYPTORÓW (uzupełniany o wypełnione obszary)===#
+    index = None
+    if search == 'index':
+        with stage(tracer, 'index'):
+            if analysis is not None and ws.features is ws.image:
+                known_centres = valid if ws.allowed is None else valid_centre_map(target, r)
+                index = analysis.patch_index(r, known_centres)
+            else:
+                index = PatchIndex(work, valid, r)
+    #===BIBLIOTEKA WZORCÓW - TYLKO GDY JEJ PATCHE MIESZCZĄ PATCH WYPEŁNIANIA===#
+    if library is not None and (ws.image.shape[2] != 3 or r > library.r):
+        library = None
+    #===PULA PROCESÓW DO WYSZUKIWANIA DOKŁADNEGO - PRACUJE NA PAMIĘCI WSPÓŁDZIELONEJ===#
+    pool = None
+    if search == 'exact' and search_workers is not None and search_workers > 1:
+        from search_pool import acquire_search_pool
+        pool = acquire_search_pool(search_workers) #===None - pula zajęta, szukamy lokalnie===#
+        if pool is not None:
+            try:
+                work, valid = ws.features, ws.valid = pool.bind(work, valid)
+            except BaseException:
+                pool.lock.release()
+                raise
+
+    def find_source(templ, known, y, x, search_radius):
+        #===zwraca (źródło albo None, liczba ocenionych położeń okna)===#
+        bounds = clip_bounds(search_bounds((h, w), r, y, x, search_radius), ws.source_bounds)
+        scored = max(0, bounds[1] - bounds[0] + 1) * max(0, bounds[3] - bounds[2] + 1)
+        if pool is not None:
+            return pool.search(templ, known, bounds), scored
+        return ws.search_window(templ, known, *bounds)[1], scored
+
+    def library_patch(y, x, q):
+        #===wzorzec z biblioteki, jeśli pasuje lepiej (SSD w RGB) niż źródło q z obrazu===#
+        templ, known = extract_template(ws.image, target, y, x, r)
+        patch, lib_ssd = library.search(templ, known)
+        if patch is None or q is None:
+            return patch
+        qy, qx = q
+        diff = (ws.image[qy - r:qy + r + 1, qx - r:qx + r + 1] - templ) * known[:, :, np.newaxis]
+        return patch if lib_ssd < float(np.einsum('ijc,ijc->', diff, diff)) else None
+
+    try:
+        total = remaining
+        while remaining > 0 and iteration < max_iterations:
+            check_cancel(cancel)
+            if deadline is not None and time.monotonic() >= deadline:
                 break
-            #===MAŁA PRÓBKA===#
-            if len(front) > 100:
-                indices = np.random.choice(len(front), 100, replace=False)
-                front = front[indices]
-        
-        if len(front) > 50:
-            step = len(front) // 50
-            front = front[::max(1, step)]
-        #===PRIORYTETY===#
-        priorities = []
-        valid_front = []
-        for y, x in front:
-            y_slice = slice(max(0, y-r), min(h, y+r+1))
-            x_slice = slice(max(0, x-r), min(w, x+r+1))
-            patch_conf = confidence[y_slice, x_slice]
-            c = np.mean(patch_conf)
-            patch_target = target[y_slice, x_slice]
-            known_mask = 1 - patch_target
-            if np.sum(known_mask) == 0:
-                continue
-            grad_mag = np.sqrt(gx[y_slice, x_slice]**2 + gy[y_slice, x_slice]**2)
-            grad_mag_masked = grad_mag * known_mask
-            if np.max(grad_mag_masked) > 0:
-                max_idx = np.unravel_index(np.argmax(grad_mag_masked), grad_mag_masked.shape)
-                gy_loc = y - r + max_idx[0]
-                gx_loc = x - r + max_idx[1]
-                if 0 <= gy_loc < h and 0 <= gx_loc < w:
-                    max_gy = gy[gy_loc, gx_loc]
-                    max_gx = gx[gy_loc, gx_loc]
-                    max_mag = np.sqrt(max_gx**2 + max_gy**2) + 1e-6
-                    isophote_y = -max_gx / max_mag
-                    isophote_x = max_gy / max_mag
-                    n_p_y, n_p_x = ny[y, x], nx[y, x]
-                    dot = abs(isophote_x * n_p_y + isophote_y * n_p_x)
-                    d = dot / alpha
+            iteration += 1
+            #===WYBÓR PUNKTÓW O NAJWYŻSZYM PRIORYTECIE (patche bez wspólnych pikseli)===#
+            with stage(tracer, 'select'):
+                k = max(1, min(batch, front.size // (2 * patch_size)))
+                points = front.pop_batch(k, patch_size) if k > 1 else [front.pop()]
+            if not points or points[0] is None:
+                break
+            #===WYSZUKIWANIE DLA CAŁEJ PARTII NA STANIE SPRZED KOPIOWANIA===#
+            found = []
+            candidates = 0
+            for y, x in points:
+                templ, known = ws.template(y, x)
+                with stage(tracer, 'search'):
+                    if matcher is not None:
+                        before = matcher.evaluated
+                        best_q = matcher.search(work, valid, templ, known, y, x)
+                        candidates += matcher.evaluated - before
+                    elif index is not None:
+                        before = index.evaluated
+                        best_q = index.search(work, valid, templ, known)
+                        candidates += index.evaluated - before
+                    else:
+                        #===OGRANICZENIE OBSZARU POSZUKIWAŃ===#
+                        search_radius = min(100, max(h, w) // 4)
+                        best_q, scored = find_source(templ, known, y, x, search_radius)
+                        candidates += scored
+                if best_q is None:
+                    #=== TZW. FALLBACK - CAŁY OBRAZ===#
+                    with stage(tracer, 'fallback_search'):
+                        best_q, scored = find_source(templ, known, y, x, None)
+                        candidates += scored
+                patch = None
+                if library is not None:
+                    with stage(tracer, 'library'):
+                        before = library.evaluated
+                        patch = library_patch(y, x, best_q)
+                        candidates += library.evaluated - before
+                if best_q is not None or patch is not None:
+                    found.append((y, x, best_q, patch))
                 else:
-                    d = 0.1
-            else:
-                d = 0.1
-            p_val = c * d + 0.001 #===0.001, LEPIEJ DZIAŁA===#
-            priorities.append(p_val)
-            valid_front.append((y, x))
-        if not valid_front:
-            break
-        #===WYBÓR PUNKTU O NAJWYŻSZYM PRIORYTECIE===#
-        best_idx = np.argmax(priorities)
-        y, x = valid_front[best_idx]
-        c_hat = confidence[y, x]
-        patch_p = img_np[max(0, y-r):min(h, y+r+1), max(0, x-r):min(w, x+r+1)]
-        mask_p = target[max(0, y-r):min(h, y+r+1), max(0, x-r):min(w, x+r+1)]
-        best_ssd = np.inf
-        best_q = None
-        #===OGRANICZENIE OBSZARU POSZUKIWAŃ===#
-        search_radius = min(100, max(h, w) // 4)
-        y_min = max(r, y - search_radius)
-        y_max = min(h - r - 1, y + search_radius)
-        x_min = max(r, x - search_radius)
-        x_max = min(w - r - 1, x + search_radius)
-        step = max(1, search_radius // 50)
-        for qy in range(y_min, y_max, step):
-            for qx in range(x_min, x_max, step):
-                #===CZY ZNAMY PATCH===#
-                patch_target = target[qy-r:qy+r+1, qx-r:qx+r+1]
-                if np.any(patch_target):
-                    continue
-                #===OBLICZENIE SSD===#
-                patch_q = img_np[qy-r:qy+r+1, qx-r:qx+r+1]
-                #===TE SAME ROZMIARY PATCHÓW===#
-                min_h = min(patch_p.shape[0], patch_q.shape[0])
-                min_w = min(patch_p.shape[1], patch_q.shape[1])
-                if min_h < patch_size // 2 or min_w < patch_size // 2:
-                    continue
-                patch_p_crop = patch_p[:min_h, :min_w]
-                patch_q_crop = patch_q[:min_h, :min_w]
-                mask_p_crop = mask_p[:min_h, :min_w]
-                known_mask = 1 - mask_p_crop
-                if np.sum(known_mask) == 0:
-                    continue
-                #===OBLICZENIE SSD===#
-                diff = (patch_p_crop.astype(np.float32) - patch_q_crop.astype(np.float32)) * known_mask[:, :, np.newaxis]
-                ssd = np.sum(diff**2) / (np.sum(known_mask) + 1e-6)
-                if ssd < best_ssd:
-                    best_ssd = ssd
-                    best_q = (qy, qx)
-        if best_q is None:
-            #=== TZW. FALLBACK DLA NAPLIŻESZGO PATCHA===#
-            for radius in [10, 20, 50]:
-                y_min = max(r, y - radius)
-                y_max = min(h - r - 1, y + radius)
-                x_min = max(r, x - radius)
-                x_max = min(w - r - 1, x + radius)
-                for qy in range(y_min, y_max, max(1, radius // 10)):
-                    for qx in range(x_min, x_max, max(1, radius // 10)):
-                        patch_target = target[qy-r:qy+r+1, qx-r:qx+r+1]
-                        if not np.any(patch_target):
-                            best_q = (qy, qx)
-                            break
-                    if best_q:
-                        break
-                if best_q:
-                    break
-            if best_q is None:
+                    heapq.heappush(front.heap, (-float(front.priority[y, x]), y, x))
+            if not found:
                 break
-        #===WYPEŁNIENIE PATCHEM===#
-        qy, qx = best_q
-        for dy in range(-r, r+1):
-            for dx in range(-r, r+1):
-                ny_, nx_ = y + dy, x + dx
-                nqy, nqx = qy + dy, qx + dx
-                if (0 <= ny_ < h and 0 <= nx_ < w and
-                    0 <= nqy < h and 0 <= nqx < w and
-                    target[ny_, nx_]):
-                    img_np[ny_, nx_] = img_np[nqy, nqx]
-                    target[ny_, nx_] = 0
-                    confidence[ny_, nx_] = c_hat
-        #=== AKTUALIZACJA GRADIENTÓW===#
-        if iteration % 10 == 0:
-            gray = np.mean(img_np, axis=2).astype(np.float32)
-            gx = ndimage.sobel(gray, axis=1)
-            gy = ndimage.sobel(gray, axis=0)
-    return Image.fromarray(img_np)
+            filled_now = 0
+            for y, x, best_q, patch in found:
+                #===WYPEŁNIENIE PATCHEM (z obrazu albo z biblioteki)===#
+                with stage(tracer, 'copy'):
+                    c_hat = confidence[y, x]
+                    if patch is not None:
+                        changed, filled = ws.paste(y, x, patch, c_hat)
+                    else:
+                        changed, filled = ws.copy(y, x, best_q, c_hat, sources)
+                        if matcher is not None:
+                            matcher.assign(y, x, best_q)
+                    filled_now += filled
+                if index is not None:
+                    with stage(tracer, 'index'):
+                        index.add_sources(work, valid, changed)
+                #=== AKTUALIZACJA GRADIENTÓW I FRONTU (tylko otoczenie patcha)===#
+                with stage(tracer, 'gradients'):
+                    gradients.update(ws.image, changed)
+                front.update(expand_bounds(changed, 1, (h, w)))
+            remaining -= filled_now
+            if tracer is not None:
+                tracer.iteration(len(found), candidates, filled_now)
+            if progress is not None:
+                progress(remaining, total)
+        #===KONIEC CZASU / LIMIT ITERACJI - SZYBKIE DOKOŃCZENIE===#
+        if remaining > 0:
+            with stage(tracer, 'fast_fill'):
+                changed = fast_fill(ws.image, target)
+            if changed is not None:
+                gradients.update(ws.image, changed)
+            if progress is not None:
+                progress(0, total)
+        return Image.fromarray(ws.image.astype(np.uint8))
+    except BaseException:
+        #===ANULOWANIE / BŁĄD - ANALIZA NIE MOŻE OPISYWAĆ CZĘŚCIOWEGO WYNIKU===#
+        revert_analysis(analysis, mask_np)
+        raise
+    finally:
+        if pool is not None:
+            pool.lock.release()
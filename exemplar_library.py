@@ -0,0 +1,204 @@
+import os
+import json
+import argparse
+import numpy as np
+from PIL import Image
+from scipy.cluster.vq import kmeans2
+from patch_index import gather_centres
+
+#===ZEWNĘTRZNA BIBLIOTEKA WZORCÓW (tła studyjne, podłogi, blaty) NA DYSKU===#
+
+DESCRIPTORS_FILE = 'descriptors.f32'
+PATCHES_FILE = 'patches.u8'
+META_FILE = 'library.json'
+
+
+def _grid_centres(h, w, r, stride):
+    ys = np.arange(r, h - r, stride)
+    xs = np.arange(r, w - r, stride)
+    return np.stack(np.meshgrid(ys, xs, indexing='ij'), axis=-1).reshape(-1, 2)
+
+
+def _load_rgb(path):
+    with Image.open(path) as img:
+        return np.array(img.convert('RGB'))
+
+
+def _image_patches(path, r, stride, limit, rng):
+    img = _load_rgb(path)
+    h, w = img.shape[:2]
+    if h < 2 * r + 1 or w < 2 * r + 1:
+        return np.empty((0, 2 * r + 1, 2 * r + 1, 3), dtype=np.uint8)
+    centres = _grid_centres(h, w, r, stride)
+    if limit is not None and len(centres) > limit:
+        centres = centres[rng.choice(len(centres), limit, replace=False)]
+    k = 2 * r + 1
+    return gather_centres(img, centres, r).reshape(-1, k, k, 3)
+
+
+def build_library(paths, out_dir, r=8, stride=4, n_components=16, n_lists=64,
+                  max_patches_per_image=1000, sample_size=20000, sample_images=200,
+                  chunk=65536, seed=0):
+    """Buduje indeks patchy biblioteki obrazów w katalogu out_dir.
+
+    Obrazy są czytane po jednym. Z próbki patchy liczona jest baza PCA
+    i n_lists centroidów (k-means) przestrzeni deskryptorów; potem patche
+    (2r+1)x(2r+1) z siatki co stride px trafiają na dysk posortowane według
+    najbliższego centroidu: descriptors.f32 (N, n_components) i patches.u8
+    (N, k, k, 3) do otwarcia przez np.memmap, plus library.json z bazą,
+    centroidami i zakresami list. Zwraca liczbę zapisanych patchy.
+    """
+    paths = [str(p) for p in paths]
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    k = 2 * r + 1
+    #===PRÓBKA (z co najwyżej sample_images obrazów) -> BAZA PCA I CENTROIDY===#
+    sample_paths = paths
+    if len(paths) > sample_images:
+        sample_paths = [paths[i] for i in rng.choice(len(paths), sample_images, replace=False)]
+    per_image = max(1, sample_size // max(1, len(sample_paths)))
+    sample = [_image_patches(p, r, stride, per_image, rng) for p in sample_paths]
+    sample = np.concatenate(sample).reshape(-1, k * k * 3).astype(np.float32)
+    if len(sample) == 0:
+        raise ValueError("Biblioteka nie zawiera obrazów większych niż patch")
+    mean = sample.mean(axis=0)
+    _, _, vt = np.linalg.svd(sample - mean, full_matrices=False)
+    basis = vt[:n_components].T.astype(np.float32)
+    n_lists = max(1, min(n_lists, len(sample)))
+    centroids, _ = kmeans2((sample - mean) @ basis, n_lists, minit='++', seed=seed)
+    centroids = centroids.astype(np.float32)
+    #===WSZYSTKIE PATCHE -> PLIKI TYMCZASOWE W KOLEJNOŚCI OBRAZÓW===#
+    tmp_desc = os.path.join(out_dir, DESCRIPTORS_FILE + '.tmp')
+    tmp_patch = os.path.join(out_dir, PATCHES_FILE + '.tmp')
+    lists = []
+    with open(tmp_desc, 'wb') as fd, open(tmp_patch, 'wb') as fp:
+        for path in paths:
+            patches = _image_patches(path, r, stride, max_patches_per_image, rng)
+            if len(patches) == 0:
+                continue
+            desc = (patches.reshape(len(patches), -1).astype(np.float32) - mean) @ basis
+            d2 = (np.einsum('ij,ij->i', desc, desc)[:, None] - 2 * desc @ centroids.T
+                  + np.einsum('ij,ij->i', centroids, centroids)[None, :])
+            lists.append(np.argmin(d2, axis=1).astype(np.int32))
+            desc.astype(np.float32).tofile(fd)
+            patches.tofile(fp)
+    lists = np.concatenate(lists) if lists else np.empty(0, dtype=np.int32)
+    count = len(lists)
+    #===SORTOWANIE WEDŁUG LIST (kopiowanie porcjami między memmapami)===#
+    order = np.argsort(lists, kind='stable')
+    offsets = np.searchsorted(lists[order], np.arange(n_lists + 1)).tolist()
+    src_desc = np.memmap(tmp_desc, dtype=np.float32, mode='r', shape=(count, n_components))
+    src_patch = np.memmap(tmp_patch, dtype=np.uint8, mode='r', shape=(count, k, k, 3))
+    dst_desc = np.memmap(os.path.join(out_dir, DESCRIPTORS_FILE), dtype=np.float32,
+                         mode='w+', shape=(count, n_components))
+    dst_patch = np.memmap(os.path.join(out_dir, PATCHES_FILE), dtype=np.uint8,
+                          mode='w+', shape=(count, k, k, 3))
+    for i in range(0, count, chunk):
+        idx = order[i:i + chunk]
+        dst_desc[i:i + chunk] = src_desc[idx]
+        dst_patch[i:i + chunk] = src_patch[idx]
+    dst_desc.flush()
+    dst_patch.flush()
+    del src_desc, src_patch, dst_desc, dst_patch
+    os.remove(tmp_desc)
+    os.remove(tmp_patch)
+    meta = {'r': r, 'count': count, 'n_components': int(basis.shape[1]),
+            'offsets': offsets, 'images': paths,
+            'mean': mean.tolist(), 'basis': basis.tolist(), 'centroids': centroids.tolist()}
+    with open(os.path.join(out_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return count
+
+
+class ExemplarLibrary:
+    """Indeks zbudowany przez build_library, otwierany przez np.memmap.
+
+    Nic poza małymi metadanymi nie jest wczytywane do RAM; zapytanie rzutuje
+    znaną część szablonu na bazę PCA, przegląda nprobe najbliższych list,
+    wybiera top_k deskryptorów i rozstrzyga dokładnym SSD z maską na
+    pikselach patchy. Patche biblioteki mają promień r; zapytania o mniejszy
+    patch używają ich środkowego wycinka. evaluated - łączna liczba kandydatów
+    ocenionych dokładnym SSD.
+    """
+
+    def __init__(self, path, nprobe=4, top_k=32):
+        self.path = path
+        self.evaluated = 0
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.r = meta['r']
+        self.count = meta['count']
+        self.offsets = meta['offsets']
+        self.mean = np.asarray(meta['mean'], dtype=np.float32)
+        self.basis = np.asarray(meta['basis'], dtype=np.float32)
+        self.centroids = np.asarray(meta['centroids'], dtype=np.float32)
+        self.nprobe = nprobe
+        self.top_k = top_k
+        k = 2 * self.r + 1
+        self.descriptors = np.memmap(os.path.join(path, DESCRIPTORS_FILE), dtype=np.float32,
+                                     mode='r', shape=(self.count, self.basis.shape[1]))
+        self.patches = np.memmap(os.path.join(path, PATCHES_FILE), dtype=np.uint8,
+                                 mode='r', shape=(self.count, k, k, 3))
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        #===do innego procesu przekazywana jest ścieżka, nie zawartość memmapów===#
+        return ExemplarLibrary, (self.path, self.nprobe, self.top_k)
+
+    def search(self, templ, known):
+        """Najlepszy patch biblioteki dla szablonu (k, k, 3) z maską known (k, k).
+
+        Zwraca (patch (k, k, 3) float32, SSD z maską) albo (None, inf)."""
+        k = templ.shape[0]
+        r = k // 2
+        if r > self.r or self.count == 0 or not known.any():
+            return None, np.inf
+        #===SZABLON OSADZONY W ŚRODKU PATCHA BIBLIOTEKI - RESZTA NIEZNANA===#
+        kl = 2 * self.r + 1
+        o = self.r - r
+        full_known = np.zeros((kl, kl), dtype=bool)
+        full_known[o:o + k, o:o + k] = known > 0
+        full_templ = np.zeros((kl, kl, 3), dtype=np.float32)
+        full_templ[o:o + k, o:o + k] = templ[:, :, :3]
+        m = np.repeat(full_known.reshape(-1), 3)
+        coef, *_ = np.linalg.lstsq(self.basis[m], full_templ.reshape(-1)[m] - self.mean[m], rcond=None)
+        q = coef.astype(np.float32)
+        #===NAJBLIŻSZE LISTY I KANDYDACI===#
+        near = np.argsort(np.einsum('ij,ij->i', self.centroids - q, self.centroids - q))[:self.nprobe]
+        cands = []
+        for j in near:
+            a, b = self.offsets[j], self.offsets[j + 1]
+            if a == b:
+                continue
+            desc = np.asarray(self.descriptors[a:b])
+            dist = np.einsum('ij,ij->i', desc - q, desc - q)
+            top = min(self.top_k, len(dist))
+            cands.append(a + np.argpartition(dist, top - 1)[:top])
+        if not cands:
+            return None, np.inf
+        cands = np.sort(np.concatenate(cands))
+        self.evaluated += len(cands)
+        patches = np.asarray(self.patches[cands])[:, o:o + k, o:o + k].astype(np.float32)
+        diff = (patches - templ[np.newaxis, :, :, :3]) * known[np.newaxis, :, :, np.newaxis]
+        ssd = np.einsum('mijc,mijc->m', diff, diff)
+        best = int(np.argmin(ssd))
+        return patches[best], float(ssd[best])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Buduje bibliotekę wzorców dla Criminisiego.")
+    parser.add_argument('out_dir')
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--radius', type=int, default=8)
+    parser.add_argument('--stride', type=int, default=4)
+    parser.add_argument('--per-image', type=int, default=1000)
+    args = parser.parse_args(argv)
+    count = build_library(args.images, args.out_dir, r=args.radius, stride=args.stride,
+                          max_patches_per_image=args.per_image)
+    print(f"Zapisano {count} patchy w {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+import scipy.ndimage as ndimage
+
+#===WSPÓLNE POLE GRADIENTÓW (Criminisi, Telea, auto-wybór)===#
+
+
+def expand_bounds(bounds, margin, shape):
+    """Powiększa prostokąt (y0, y1, x0, x1) o margin z przycięciem do obrazu (None = cały obraz)."""
+    h, w = shape[:2]
+    if bounds is None:
+        return 0, h, 0, w
+    y0, y1, x0, x1 = bounds
+    return max(0, y0 - margin), min(h, y1 + margin), max(0, x0 - margin), min(w, x1 + margin)
+
+
+class GradientCache:
+    """Luminancja i gradienty Sobela obrazu, odświeżane tylko w zmienionych prostokątach.
+
+    Tablice gray/gx/gy są modyfikowane w miejscu, więc obiekty trzymające do
+    nich referencje (np. FillFront) zawsze widzą aktualne wartości.
+    """
+
+    def __init__(self, img):
+        img_np = np.asarray(img)
+        h, w = img_np.shape[:2]
+        self.shape = (h, w)
+        self.gray = np.empty((h, w), dtype=np.float32)
+        self.gx = np.empty((h, w), dtype=np.float32)
+        self.gy = np.empty((h, w), dtype=np.float32)
+        self.update(img_np)
+
+    def update(self, img, bounds=None):
+        """Przelicza luminancję w bounds=(y0, y1, x0, x1) i gradienty w bounds
+        powiększonym o 1 piksel (zasięg jądra Sobela). None = cały obraz."""
+        img_np = np.asarray(img)
+        y0, y1, x0, x1 = expand_bounds(bounds, 0, self.shape)
+        if y0 >= y1 or x0 >= x1:
+            return
+        self.gray[y0:y1, x0:x1] = np.mean(img_np[y0:y1, x0:x1, :3], axis=2)
+        #===SOBEL NA WYCINKU Z MARGINESEM, WYNIK TYLKO DLA WNĘTRZA===#
+        gy0, gy1, gx0, gx1 = expand_bounds(bounds, 1, self.shape)
+        sy0, sy1, sx0, sx1 = expand_bounds(bounds, 2, self.shape)
+        sub = self.gray[sy0:sy1, sx0:sx1]
+        inner = (slice(gy0 - sy0, gy1 - sy0), slice(gx0 - sx0, gx1 - sx0))
+        self.gx[gy0:gy1, gx0:gx1] = ndimage.sobel(sub, axis=1)[inner]
+        self.gy[gy0:gy1, gx0:gx1] = ndimage.sobel(sub, axis=0)[inner]
+
+    def magnitude(self, bounds=None):
+        """Moduł gradientu w prostokącie (None = cały obraz)."""
+        y0, y1, x0, x1 = expand_bounds(bounds, 0, self.shape)
+        return np.sqrt(self.gx[y0:y1, x0:x1] ** 2 + self.gy[y0:y1, x0:x1] ** 2)
+
+    def border_energy(self, mask, width=3):
+        """Średni moduł gradientu w pasie o szerokości width pikseli wokół maski
+        (miara tekstury tła, które trzeba odtworzyć). None dla pustej maski."""
+        mask_np = np.asarray(mask) > 0
+        if not mask_np.any():
+            return None
+        ring = ndimage.binary_dilation(mask_np, iterations=width) & ~mask_np
+        if not ring.any():
+            return None
+        return float(np.mean(np.sqrt(self.gx[ring] ** 2 + self.gy[ring] ** 2)))
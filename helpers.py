@@ -1,13 +1,22 @@
 import io
+import math
 import base64
+from contextlib import nullcontext
 from datetime import datetime
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageChops
 import numpy as np
 import cv2 as cv
-from PyQt5.QtGui import QPixmap, QPen, QColor, QBrush, QImage, QPainter, QCursor
-from PyQt5.QtCore import Qt
-from criminisi import criminisi_inpaint
+from PyQt5.QtGui import QPixmap, QPen, QColor, QBrush, QImage, QPainter, QCursor, QTransform
+from PyQt5.QtCore import Qt, QTimer
+from parallel_inpaint import parallel_criminisi_inpaint, component_rois
+from criminisi import CriminisiWorkspace, InpaintCancelled
+from analysis_cache import ImageAnalysis
+from mask_ops import solid_fill, paste_masked, MaskState, clip_box, union_box, simplify_polygon
 from auto_inpaint import auto_inpaint
+from patchmatch import patchmatch_inpaint
+from inpaint_worker import InpaintJob, start_job
+from mipmap import MipmapPyramid
+from lasso_item import LassoPathItem
 
 #===stałe===#
 COLORS = {
@@ -18,6 +27,16 @@ COLORS = {
     "toolbar_gradient_start": "#000000",
     "toolbar_gradient_end": "#FFD700"
 }
+#===narzędzia rysujące pędzlem: maska, obszar źródłowy, obszar wykluczony===#
+BRUSH_TOOLS = (1, 2, 3)
+#===okres zbierania ruchów myszy pędzla (ms) - jedno rysowanie i odświeżenie na klatkę===#
+BRUSH_FRAME_MS = 16
+#===kolory nakładek RGBA: obszar źródłowy, wykluczony, maska===#
+OVERLAY_COLORS = {
+    "source_mask": [0, 170, 0, 60],
+    "exclude_mask": [0, 90, 255, 70],
+    "mask": [255, 0, 0, 70]
+}
 
 #===Funckje pomocnicze===#
 def pil_to_base64(img_pil, fmt="PNG"):
@@ -66,25 +85,55 @@ def pil_to_qimage(pil_img):
     return qimg
 
 def draw_image(self):
+    #===SCENA W WSPÓŁRZĘDNYCH OBRAZU, ZOOM PRZEZ TRANSFORMACJĘ WIDOKU===#
     if not self.image:
         return
-    size = (int(self.image.width * self.scale_factor), int(self.image.height * self.scale_factor))
-    img = self.image.copy().resize(size, Image.Resampling.LANCZOS)
-    if self.mask:
-        m = self.mask.resize(size, Image.Resampling.NEAREST)
-        overlay = Image.new("RGBA", size, (0, 0, 0, 0))
-        mask_np = np.array(m)
-        overlay_np = np.array(overlay)
-        overlay_np[mask_np > 0] = [255, 0, 0, 70]
-        overlay = Image.fromarray(overlay_np)
-        img = Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
-    qimg = pil_to_qimage(img)
-    pixmap = QPixmap.fromImage(qimg)
-    self.pixmap_item.setPixmap(pixmap)
-    self.scene.setSceneRect(0, 0, pixmap.width(), pixmap.height())
-    for line in self.lasso_lines:
-        self.scene.removeItem(line)
-    self.lasso_lines.clear()
+    if self.mipmaps is None or not self.mipmaps.matches(self.image):
+        self.mipmaps = MipmapPyramid(self.image)
+        self.display_level = None
+    self.scene.setSceneRect(0, 0, self.image.width, self.image.height)
+    self.view.setTransform(QTransform.fromScale(self.scale_factor, self.scale_factor))
+    update_display_level(self)
+    update_brush_display(self, full=True)
+    clear_lasso(self)
+
+
+def extend_lasso(self):
+    """Dokłada do obrysu lasso odcinek do ostatniego punktu self.points -
+    jeden LassoPathItem na cały obrys, ścieżka przedłużana w miejscu."""
+    if self.lasso_item is None:
+        pen = QPen(QColor("red"), 2)
+        pen.setCosmetic(True) #===grubość w pikselach ekranu, niezależnie od zoomu===#
+        self.lasso_item = LassoPathItem(*self.points[0], pen)
+        self.lasso_item.setZValue(2)
+        self.scene.addItem(self.lasso_item)
+    self.lasso_item.extend(*self.points[-1])
+
+
+def clear_lasso(self):
+    if self.lasso_item is not None:
+        self.scene.removeItem(self.lasso_item)
+        self.lasso_item = None
+
+
+def close_lasso(self):
+    """Zamalowuje w masce obrys lasso po uproszczeniu prawie współliniowych punktów."""
+    polygon = simplify_polygon(self.points)
+    if len(polygon) < 3:
+        return
+    xs, ys = zip(*polygon)
+    draw = ImageDraw.Draw(self.mask)
+    with selection_state(self).change((min(xs), min(ys), max(xs), max(ys))):
+        draw.polygon(polygon, fill=255)
+
+
+def brush_layer(self):
+    """Obraz maski, do którego rysuje bieżące narzędzie (tworzony przy pierwszym użyciu)."""
+    tool = self.tool_combo.currentData()
+    name = {2: "source_mask", 3: "exclude_mask"}.get(tool, "mask")
+    if getattr(self, name) is None:
+        setattr(self, name, Image.new("L", self.image.size, 0))
+    return getattr(self, name)
 
 
 def create_brush_cursor(self):
@@ -107,62 +156,111 @@ def create_brush_cursor(self):
     painter.end()
     return QCursor(pixmap, center, center)
 
+def mask_change(self, layer, box):
+    """Kontekst rysowania w layer w prostokącie box=(x0, y0, x1, y1); dla maski
+    zaznaczenia aktualizuje jej MaskState."""
+    if layer is not self.mask:
+        return nullcontext()
+    return selection_state(self).change(box)
+
+
 def update_brush_mask(self, x, y, update_display=False):
-    r = self.brush_slider.value() // 2
-    draw = ImageDraw.Draw(self.mask)
-    if not self.last_brush_pos:
-        draw.ellipse((x-r, y-r, x+r, y+r), fill=255)
-        self.last_brush_pos = (x, y)
-        if update_display:
-            update_brush_display(self)
-        return
-    prev_x, prev_y = self.last_brush_pos
-    dx = x - prev_x
-    dy = y - prev_y
-    distance = (dx**2 + dy**2)**0.5
-    if distance < 1:
-        draw.ellipse((x-r, y-r, x+r, y+r), fill=255)
-    else:
-        steps = max(int(distance), 1)
-        for i in range(steps + 1):
-            t = i / steps
-            ix = prev_x + dx * t
-            iy = prev_y + dy * t
-            draw.ellipse((ix-r, iy-r, ix+r, iy+r), fill=255)
-    self.last_brush_pos = (x, y)
-    if update_display:
-        update_brush_display(self)
+    brush_stroke(self, [(x, y)], update_display)
 
 
-def update_brush_display(self):
-    if not self.image or not self.mask:
+def brush_stroke(self, points, update_display=False):
+    """Dorysowuje pędzlem łamaną od ostatniej pozycji przez points. Odcinki są
+    kapsułami (linia o szerokości pędzla + koła w wierzchołkach) rysowanymi
+    jednym wywołaniem ImageDraw, zamiast koła co piksel drogi; środki są
+    obcinane do pikseli jak przy stemplowaniu kół."""
+    r = self.brush_slider.value() // 2
+    layer = brush_layer(self)
+    if self.last_brush_pos:
+        points = [self.last_brush_pos] + list(points)
+    xs, ys = zip(*points)
+    box = (min(xs)-r, min(ys)-r, max(xs)+r, max(ys)+r)
+    centers = [(math.floor(px), math.floor(py)) for px, py in points]
+    draw = ImageDraw.Draw(layer)
+    with mask_change(self, layer, box):
+        for cx, cy in dict.fromkeys(centers):
+            draw.ellipse((cx-r, cy-r, cx+r, cy+r), fill=255)
+        if len(centers) > 1:
+            draw.line(centers, fill=255, width=2*r+1)
+    self.last_brush_pos = points[-1]
+    if update_display:
+        update_brush_display(self, clip_box(box, layer.size))
+
+
+def queue_brush_point(self, x, y):
+    """Ruch myszy pędzla: punkt czeka do końca klatki (BRUSH_FRAME_MS), wtedy
+    flush_brush rysuje wszystkie zebrane punkty i odświeża widok raz."""
+    self.pending_brush_points.append((x, y))
+    if self.brush_timer is None:
+        self.brush_timer = QTimer(self)
+        self.brush_timer.setSingleShot(True)
+        self.brush_timer.setInterval(BRUSH_FRAME_MS)
+        self.brush_timer.timeout.connect(lambda: flush_brush(self))
+    if not self.brush_timer.isActive():
+        self.brush_timer.start()
+
+
+def flush_brush(self):
+    if self.brush_timer is not None:
+        self.brush_timer.stop()
+    points, self.pending_brush_points = self.pending_brush_points, []
+    if points and self.image:
+        brush_stroke(self, points, update_display=True)
+
+
+def update_display_level(self):
+    """Poziom mipmap dla bieżącego powiększenia; pixmapa jest podmieniana tylko
+    przy zmianie poziomu. Zwraca True, gdy poziom się zmienił."""
+    level = self.mipmaps.level_for(self.scale_factor)
+    if level == self.display_level:
+        return False
+    self.display_level = level
+    self.pixmap_item.setPixmap(self.mipmaps.pixmap(level))
+    self.pixmap_item.setTransform(QTransform.fromScale(*self.mipmaps.level_scale(level)))
+    return True
+
+
+def update_brush_display(self, rect=None, full=False):
+    """Odświeża warstwę masek nad obrazem: cała przy full albo zmianie poziomu
+    mipmap, inaczej tylko prostokąt rect=(y0, y1, x0, x1) razem z prostokątem
+    zmian maski zaznaczenia (MaskState.take_dirty)."""
+    if not self.image or self.mipmaps is None:
         return
-    size = (int(self.image.width * self.scale_factor), int(self.image.height * self.scale_factor))
-    img = self.image.copy().resize(size, Image.Resampling.LANCZOS)
-    m = self.mask.resize(size, Image.Resampling.NEAREST)
-    overlay = Image.new("RGBA", size, (0, 0, 0, 0))
-    mask_np = np.array(m)
-    overlay_np = np.array(overlay)
-    overlay_np[mask_np > 0] = [255, 0, 0, 70]
-    overlay = Image.fromarray(overlay_np)
-    img = Image.alpha_composite(img.convert("RGBA"), overlay).convert("RGB")
-    qimg = pil_to_qimage(img)
-    pixmap = QPixmap.fromImage(qimg)
-    self.pixmap_item.setPixmap(pixmap)
+    h, w = self.mipmaps.array(self.display_level).shape[:2]
+    full = self.overlay_item.reset(self.image.size, (w, h)) or full
+    masks = [getattr(self, name, None) for name in OVERLAY_COLORS]
+    if self.mask is not None:
+        state = selection_state(self)
+        rect = union_box(rect, state.take_dirty())
+        if state.empty:
+            masks[list(OVERLAY_COLORS).index("mask")] = None #===nic do czytania===#
+    if full:
+        self.overlay_item.refresh(masks)
+    elif rect is not None:
+        self.overlay_item.refresh(masks, rect)
 
 def on_brush_size_changed(self, value):
     self.brush_value_label.setText(str(value))
-    if self.tool_combo.currentData() == 1 and self.image:
+    if self.tool_combo.currentData() in BRUSH_TOOLS and self.image:
         self.view.viewport().setCursor(create_brush_cursor(self))
         
 def update_scale(self, val):
+    #===ZOOM BEZ PRZELICZANIA OBRAZU: TRANSFORMACJA WIDOKU + GOTOWY POZIOM MIPMAP===#
     self.scale_factor = val / 100
     self.scale_value_label.setText(str(val))
-    draw_image(self)
+    if not self.image or self.mipmaps is None:
+        return
+    self.view.setTransform(QTransform.fromScale(self.scale_factor, self.scale_factor))
+    if update_display_level(self):
+        update_brush_display(self)
     
 def on_tool_changed(self, index=None):
     if self.image:
-        if self.tool_combo.currentData() == 1:
+        if self.tool_combo.currentData() in BRUSH_TOOLS:
             self.view.viewport().setCursor(create_brush_cursor(self))
         else:
             self.view.viewport().setCursor(Qt.CrossCursor)
@@ -180,6 +278,8 @@ def open_image(self):
                 QMessageBox.warning(self, "Uwaga", f"Obraz bardzo duży: {img.width}x{img.height}")
             self.image = img
             self.mask = Image.new("L", self.image.size, 0)
+            self.source_mask = self.exclude_mask = None
+            self.analysis = None
             self.history.clear()
             draw_image(self)
             # reset status
@@ -188,7 +288,7 @@ def open_image(self):
                 self.status_message.setText("")
             except Exception:
                 pass
-            if self.tool_combo.currentData() == 1:
+            if self.tool_combo.currentData() in BRUSH_TOOLS:
                 self.view.viewport().setCursor(create_brush_cursor(self))
             else:
                 self.view.viewport().setCursor(Qt.CrossCursor)
@@ -210,9 +310,11 @@ def set_image_from_bytes(self, data: bytes):
             pass
         self.image = img
         self.mask = Image.new("L", self.image.size, 0)
+        self.source_mask = self.exclude_mask = None
+        self.analysis = None
         self.history.clear()
         draw_image(self)
-        if self.tool_combo.currentData() == 1:
+        if self.tool_combo.currentData() in BRUSH_TOOLS:
             self.view.viewport().setCursor(create_brush_cursor(self))
         else:
             self.view.viewport().setCursor(Qt.CrossCursor)
@@ -253,91 +355,277 @@ def save_image(self):
         self.image.save(path)
         QMessageBox.information(self, "Zapisano", f"Zapisano: {path}")
         
+def set_status(self, state, text):
+    """Kolorowa kontrolka i komunikat statusu (state: idle / processing / done)."""
+    try:
+        self.status_label.setStyleSheet(f"background: {COLORS['status_' + state]}; border-radius: 10px;")
+        self.status_message.setText(text)
+    except Exception:
+        pass
+
+
 def erase_selection(self):
-    from PyQt5.QtWidgets import QMessageBox, QApplication
+    from PyQt5.QtWidgets import QMessageBox
     if not self.image:
         QMessageBox.warning(self, "Błąd", "Wczytaj obraz najpierw.")
         return
-    if not self.mask or not any(px > 0 for px in self.mask.getdata()):
+    if not self.mask or selection_state(self).empty:
         QMessageBox.warning(self, "Błąd", "Zaznacz obszar do usunięcia.")
         return
-    
-    #===DODANIE DO HISTORII===#
-    self.history.append((self.image.copy(), self.mask.copy()))
-    
-    #===ZMIANA STATUSU PRZETWARZANIA===#
-    self.status_label.setStyleSheet(f"background: {COLORS['status_processing']}; border-radius: 10px;")
-    self.status_message.setText("⏳ Przetwarzanie...")
-    QApplication.processEvents()
+    if self.inpaint_job is not None:
+        QMessageBox.information(self, "Info", "Trwa wypełnianie - poczekaj na wynik albo anuluj (Esc).")
+        return
     
     #===LOGIKA INPAINTNGU===#
     if self.fill_combo.currentData() == 2:  # SD + ControlNet
-        if self.sd_connected:
-            import sd
-            sd.sd_inpaint_with_controlnet(self)
-        else:
+        if not self.sd_connected:
             QMessageBox.warning(self, "Info", "Najpierw połącz się z SD (Ustawienia -> Połącz z SD)")
-            self.status_label.setStyleSheet(f"background: {COLORS['status_idle']}; border-radius: 10px;")
-            self.status_message.setText("Gotowy")
+            set_status(self, "idle", "Gotowy")
             return
+        work = sd_task(self)
     else:
-        _local_inpaint_and_update(self)
-    
-    #===ZMIANA STATUSU===#
-    self.status_label.setStyleSheet(f"background: {COLORS['status_done']}; border-radius: 10px;")
-    self.status_message.setText("✓ Gotowy")
-    
-def _local_inpaint_and_update(self):
-    id_ = self.fill_combo.currentData() 
-    if id_ == 0:
-        filled = neighbor_inpaint(self.image.copy(), self.mask)
-    elif id_ == 1:
-        filled = empty_inpaint(self.image.copy(), self.mask)
-    elif id_ == 3:
-        filled = criminisi_inpaint(self.image.copy(), self.mask)
-    elif id_ == 4:
-        filled = telea_inpaint(self.image.copy(), self.mask)
-    elif id_ == 5:
-        filled = auto_inpaint(self.image.copy(), self.mask)
-    else:
-        filled = self.image.copy() #=== TZW. FALLBACK===#
+        work = inpaint_task(self)
+    start_inpaint_job(self, work)
+
+
+def start_inpaint_job(self, work):
+    """Uruchamia work(cancel, progress) -> (obraz, analiza) w tle; wynik trafia do
+    self.image, self.history i analizy dopiero w finish_inpaint_job (w wątku GUI).
+    job.context - ramka maski, w której zmienia się obraz."""
+    job = InpaintJob(work, image=self.image, mask=self.mask, context=selection_state(self).bbox)
+    job.signals.progress.connect(lambda remaining, total: inpaint_progress(self, remaining, total))
+    job.signals.finished.connect(lambda result: finish_inpaint_job(self, job, result))
+    job.signals.cancelled.connect(lambda: abort_inpaint_job(self, job, "Anulowano"))
+    job.signals.failed.connect(lambda message: abort_inpaint_job(self, job, message, failed=True))
+    self.inpaint_job = job
+    #===NOWA PUSTA MASKA - W TRAKCIE MOŻNA ZAZNACZAĆ KOLEJNY OBIEKT===#
+    self.mask = Image.new("L", self.image.size, 0)
+    set_status(self, "processing", "⏳ Przetwarzanie...")
+    draw_image(self)
+    start_job(job)
+    return job
+
+
+def inpaint_progress(self, remaining, total):
+    if total > 0:
+        set_status(self, "processing", f"⏳ Przetwarzanie... {100 * (total - remaining) // total}%")
+
+
+def finish_inpaint_job(self, job, result):
+    if job is not self.inpaint_job:
+        return
+    self.inpaint_job = None
+    if self.image is not job.image:
+        #===obraz zmieniony w trakcie (cofnięcie, nowy plik) - wynik nieaktualny===#
+        revert_job_analysis(self, job)
+        set_status(self, "idle", "Wynik odrzucony - obraz zmienił się w trakcie")
+        return
+    filled, analysis = result
+    #===DODANIE DO HISTORII I PODMIANA OBRAZU NARAZ===#
+    self.history.append((job.image, job.mask))
     self.image = filled
+    if analysis is not None:
+        #===ANALIZA ODŚWIEŻANA TYLKO W RAMCE MASKI (metody zmieniają wyłącznie piksele maski)===#
+        analysis.update(filled, job.context)
+        self.analysis = analysis
+    draw_image(self)
+    set_status(self, "done", "✓ Gotowy")
+
+
+def abort_inpaint_job(self, job, message, failed=False):
+    from PyQt5.QtWidgets import QMessageBox
+    if job is not self.inpaint_job:
+        return
+    self.inpaint_job = None
+    revert_job_analysis(self, job)
+    #===PRZYWRÓCENIE ZAZNACZENIA (razem z tym, co zaznaczono w trakcie)===#
+    if self.image is job.image and self.mask is not None and self.mask.size == job.mask.size:
+        self.mask = ImageChops.lighter(self.mask, job.mask)
+        draw_image(self)
+    set_status(self, "idle", message)
+    if failed:
+        QMessageBox.critical(self, "Błąd", message)
+
+
+def revert_job_analysis(self, job):
+    """Odrzucony wynik: gradienty i indeksy wspólnej analizy obrazu zadania mogły
+    zostać odświeżone w trakcie wypełniania - przelicza je w ramce maski z tablicy
+    pikseli, która nadal opisuje obraz źródłowy."""
+    if self.analysis is not None and self.analysis.matches(job.image):
+        self.analysis.revert(job.context)
+
+
+def cancel_inpaint(self):
+    """Anuluje bieżące wypełnianie (Criminisi przerywa od razu, pozostałe metody - wynik jest odrzucany)."""
+    if self.inpaint_job is None:
+        return
+    self.inpaint_job.cancel()
+    set_status(self, "processing", "⏳ Anulowanie...")
+
+
+def sd_task(self):
+    """Zadanie SD + ControlNet: w wątku GUI tylko ustawienia i referencje obrazu
+    i maski; kodowanie PNG/base64 i żądanie HTTP w tle."""
+    import sd
+    settings = sd.sd_settings(self)
+    image, mask = self.image, self.mask
+
+    def work(cancel, progress):
+        payload, mimg = sd.build_sd_payload(settings, image, mask)
+        if cancel.is_set():
+            raise InpaintCancelled()
+        filled = sd.run_sd_inpaint(settings["sd_url"], payload, image, mimg)
+        if filled is None:
+            raise RuntimeError("Brak wyniku z SD API.")
+        return filled, None
+    return work
+
+
+def selection_state(self):
+    """MaskState bieżącej maski; budowany od nowa tylko dla innego obrazu maski (nowy plik, cofnięcie, SD)."""
+    if self.mask_state is None or not self.mask_state.matches(self.mask):
+        self.mask_state = MaskState(self.mask)
+    return self.mask_state
+
+
+def image_analysis(self):
+    """Analiza bieżącego obrazu; budowana od nowa tylko dla innego obrazu (nowy plik, cofnięcie, SD)."""
+    if self.analysis is None or not self.analysis.matches(self.image):
+        self.analysis = ImageAnalysis(self.image)
+    return self.analysis
+
+
+def inpaint_task(self):
+    """Zadanie lokalnej metody wypełniania: work(cancel, progress) -> (obraz, analiza).
+
+    Stan okna (metoda, obraz, maska, obszary) jest odczytywany tutaj, w wątku
+    GUI; work korzysta tylko z tych migawek, więc może działać w tle. Analiza
+    obrazu jest budowana w work, jeśli nie ma aktualnej; wynik wprowadza do
+    niej dopiero finish_inpaint_job, gdy wynik zostaje przyjęty.
+    """
+    id_ = self.fill_combo.currentData() 
+    analysis = self.analysis if self.analysis is not None and self.analysis.matches(self.image) else None
+    bbox = selection_state(self).bbox
+    image, mask = self.image, self.mask
+    regions = {name: None if layer is None else layer.copy()
+               for name, layer in (("source_region", self.source_mask), ("exclude_region", self.exclude_mask))}
+    if id_ == 3 and self.criminisi_workspace is None:
+        self.criminisi_workspace = CriminisiWorkspace()
+    workspace = self.criminisi_workspace
+    library = self.exemplar_library
+
+    def work(cancel, progress):
+        nonlocal analysis
+        if analysis is None:
+            analysis = ImageAnalysis(image)
+        if id_ == 0:
+            filled = neighbor_inpaint(image.copy(), mask)
+        elif id_ == 1:
+            filled = empty_inpaint(image.copy(), mask, box=bbox)
+        elif id_ == 3:
+            filled = parallel_criminisi_inpaint(image.copy(), mask, workspace=workspace, analysis=analysis,
+                                                library=library, progress=progress, cancel=cancel, **regions)
+        elif id_ == 4:
+            filled = telea_inpaint(image.copy(), mask, analysis=analysis)
+        elif id_ == 5:
+            filled = auto_inpaint(image.copy(), mask, analysis=analysis,
+                                  progress=progress, cancel=cancel, **regions)
+        elif id_ == 6:
+            filled = patchmatch_inpaint(image.copy(), mask, analysis=analysis,
+                                        progress=progress, cancel=cancel, **regions)
+        else:
+            filled = image.copy() #=== TZW. FALLBACK===#
+        return filled, analysis
+    return work
+
+
+def _local_inpaint_and_update(self):
+    #===WERSJA SYNCHRONICZNA (bez wątku, bez historii) - do użycia programowego===#
+    filled, analysis = inpaint_task(self)(None, None)
+    analysis.update(filled, selection_state(self).bbox)
+    self.image, self.analysis = filled, analysis
     self.mask = Image.new("L", self.image.size, 0)
     draw_image(self)
-    
+
+
+def _peel_fill(arr, hole):
+    #===WYPEŁNIA W MIEJSCU PIKSELE hole TABLICY arr (h, w[, C]) PIERŚCIEŃ PO PIERŚCIENIU===#
+    #===numer pierścienia = odległość L1 do znanego piksela (poza tablicą: nieskończoność)===#
+    dist = cv.distanceTransform(hole.astype(np.uint8), cv.DIST_L1, 3)
+    #===bufory z ramką 1 px, żeby sąsiedzi byli zawsze w tablicy===#
+    h, w = hole.shape
+    pix = arr.reshape(h, w, -1)
+    work = np.zeros((h + 2, w + 2, pix.shape[2]), dtype=np.float32)
+    work[1:-1, 1:-1] = pix
+    level = np.full((h + 2, w + 2), np.inf, dtype=np.float32)
+    level[1:-1, 1:-1] = dist
+    work = work.reshape(-1, pix.shape[2])
+    level = level.reshape(-1)
+    #===piksele maski posortowane pierścieniami===#
+    ys, xs = np.nonzero(hole)
+    idx = (ys + 1) * (w + 2) + xs + 1
+    idx = idx[np.argsort(level[idx], kind='stable')]
+    rings = level[idx]
+    starts = np.flatnonzero(np.r_[True, rings[1:] != rings[:-1], True])
+    offsets = np.array([-1, 1, -(w + 2), w + 2])
+    for a, b in zip(starts[:-1], starts[1:]):
+        ring = idx[a:b]
+        nb = ring[:, None] + offsets[None, :]
+        known = level[nb] < rings[a]
+        total = np.einsum('nk,nkc->nc', known.astype(np.float32), work[nb])
+        work[ring] = np.floor(total / known.sum(axis=1, keepdims=True))
+    paste_masked(pix, work.reshape(h + 2, w + 2, -1)[1:-1, 1:-1], hole)
+
 
 def neighbor_inpaint(img, mask):
-    pixels = img.load()
-    mask_pixels = mask.load()
-    w, h = img.size
-    for _ in range(80):
-        changed = False
-        for y in range(1, h - 1):
-            for x in range(1, w - 1):
-                if mask_pixels[x, y] == 255:
-                    n = [pixels[nx, ny] for nx, ny in [(x-1,y),(x+1,y),(x,y-1),(x,y+1)] if mask_pixels[nx, ny] == 0]
-                    if n:
-                        avg = tuple(sum(p[i] for p in n)//len(n) for i in range(3))
-                        pixels[x, y] = avg
-                        mask_pixels[x, y] = 0
-                        changed = True
-        if not changed: break
+    """Wypełnianie "od brzegu": każdy pierścień dziury dostaje średnią (w dół)
+    już znanych 4-sąsiadów.
+
+    Numer pierścienia to odległość L1 od znanych pikseli (cv.distanceTransform),
+    więc wystarczy jedno przejście po pikselach maski posortowanych według
+    odległości, z całym pierścieniem liczonym naraz w NumPy. Każda spójna
+    składowa maski jest liczona w swojej ramce (component_rois) i wklejana do img,
+    więc praca zależy od pola dziury, nie od rozmiaru zdjęcia. Wypełniane są
+    dziury dowolnej głębokości i piksele przy krawędziach obrazu; mask nie
+    jest zmieniana.
+    """
+    target = (np.array(mask) > 0).astype(np.uint8)
+    for y0, y1, x0, x1 in component_rois(target, 1):
+        hole = target[y0:y1, x0:x1] > 0
+        if hole.all():
+            continue #===brak znanych pikseli - nie ma czego rozprowadzać===#
+        roi = np.array(img.crop((x0, y0, x1, y1)))
+        _peel_fill(roi, hole)
+        img.paste(Image.fromarray(roi), (x0, y0))
     return img
 
-def empty_inpaint(img, mask):
-    px = img.load()
-    mp = mask.load()
-    for y in range(img.height):
-        for x in range(img.width):
-            if mp[x, y] == 255:
-                px[x, y] = (255, 255, 255)
-    return img
 
-def telea_inpaint(img, mask):
-    img_np = np.array(img)
+def empty_inpaint(img, mask, color=(255, 255, 255), box=None):
+    """Piksele maski zamalowane kolorem color (domyślnie biel); box - znana ramka maski."""
+    return solid_fill(img, mask, color, box)
+
+def telea_inpaint(img, mask, gradients=None, analysis=None):
     mask_np = np.array(mask)
-    filled_np = cv.inpaint(img_np, mask_np, 3, cv.INPAINT_TELEA)
-    return Image.fromarray(filled_np)
+    if analysis is None:
+        img_np = np.array(img)
+        filled_np = cv.inpaint(img_np, mask_np, 3, cv.INPAINT_TELEA)
+        #===WSPÓLNY CACHE GRADIENTÓW - ODŚWIEŻ TYLKO OBSZAR MASKI===#
+        if gradients is not None:
+            x, y, bw, bh = cv.boundingRect(mask_np)
+            gradients.update(filled_np, (y, y + bh, x, x + bw))
+        return Image.fromarray(filled_np)
+    #===Z ANALIZĄ OBRAZU - TELEA TYLKO W RAMCE MASKI (margines > promień), WYNIK WKLEJANY;===#
+    #===gradienty odświeża potem analysis.update() w tym samym prostokącie===#
+    x, y, bw, bh = cv.boundingRect(mask_np)
+    if bw == 0 or bh == 0:
+        return img
+    h, w = mask_np.shape
+    y0, y1 = max(0, y - 8), min(h, y + bh + 8)
+    x0, x1 = max(0, x - 8), min(w, x + bw + 8)
+    roi_mask = mask_np[y0:y1, x0:x1]
+    roi = cv.inpaint(np.ascontiguousarray(analysis.array[y0:y1, x0:x1]), roi_mask, 3, cv.INPAINT_TELEA)
+    img.paste(Image.fromarray(roi), (x0, y0), Image.fromarray(((roi_mask > 0) * 255).astype(np.uint8)))
+    return img
 
 def undo(self):
     #Cofanie
@@ -358,6 +646,7 @@ def reset_selection(self):
     from PyQt5.QtWidgets import QMessageBox
     if self.image:
         self.mask = Image.new("L", self.image.size, 0)
+        self.source_mask = self.exclude_mask = None
         draw_image(self)
         # reset status
         try:
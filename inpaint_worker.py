@@ -0,0 +1,69 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from criminisi import InpaintCancelled
+
+#===WYPEŁNIANIE W TLE (QThreadPool) - GUI NIE CZEKA NA WYNIK===#
+
+
+class WorkerSignals(QObject):
+    """Sygnały zadania; odbierane w wątku GUI (połączenia kolejkowane)."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+
+class InpaintJob(QRunnable):
+    """Zadanie work(cancel, progress) -> wynik uruchamiane w puli wątków.
+
+    cancel to threading.Event (metody Criminisiego sprawdzają is_set() i zgłaszają
+    InpaintCancelled); progress(pozostało, wszystkich) emituje sygnał progress.
+    Po zakończeniu emitowany jest dokładnie jeden z sygnałów finished(wynik),
+    cancelled() albo failed(komunikat) - także wtedy, gdy metoda nie umie
+    przerwać pracy, a anulowanie przyszło w trakcie (wynik jest wtedy odrzucany).
+    Pola image / mask / context zostawia wywołujący do zastosowania wyniku.
+    """
+
+    def __init__(self, work, image=None, mask=None, context=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.work = work
+        self.image = image
+        self.mask = mask
+        self.context = context
+        self.cancel_event = threading.Event()
+        self.signals = WorkerSignals()
+        self.done = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def run(self):
+        try:
+            result = self.work(self.cancel_event, self.signals.progress.emit)
+        except InpaintCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            if self.cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.failed.emit(str(e))
+        else:
+            if self.cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+        finally:
+            self.done.set()
+
+
+def start_job(job, pool=None):
+    """Uruchamia zadanie w puli (domyślnie QThreadPool.globalInstance())."""
+    (pool or QThreadPool.globalInstance()).start(job)
+    return job
@@ -0,0 +1,43 @@
+from PyQt5.QtCore import QPointF, QRectF, Qt
+from PyQt5.QtGui import QPainterPath
+from PyQt5.QtWidgets import QGraphicsPathItem
+
+#===OBRYS LASSO PRZEDŁUŻANY W MIEJSCU (jeden element sceny na cały obrys)===#
+
+
+class LassoPathItem(QGraphicsPathItem):
+    """Obrys lasso w trakcie rysowania.
+
+    QPainterPath (lasso) należy do elementu i extend() dokłada do niego odcinek
+    przez lineTo, bez setPath - ten kopiuje ścieżkę i przelicza jej ramkę od
+    zera, więc koszt ruchu myszy rósłby z długością obrysu. Ramka rośnie
+    przyrostowo (prepareGeometryChange tylko, gdy odcinek z niej wychodzi),
+    a odświeżany jest tylko prostokąt nowego odcinka.
+    """
+
+    def __init__(self, x, y, pen):
+        super().__init__()
+        self.setPen(pen)
+        self.lasso = QPainterPath()
+        self.lasso.moveTo(x, y)
+        self.last = QPointF(x, y)
+        self.bounds = QRectF(self.last, self.last)
+
+    def extend(self, x, y):
+        point = QPointF(x, y)
+        segment = QRectF(self.last, point).normalized()
+        if not self.bounds.contains(segment):
+            self.prepareGeometryChange()
+            self.bounds = self.bounds.united(segment)
+        self.lasso.lineTo(point)
+        self.last = point
+        self.update(segment)
+
+    def boundingRect(self):
+        m = self.pen().widthF() / 2
+        return self.bounds.adjusted(-m, -m, m, m)
+
+    def paint(self, painter, option, widget=None):
+        painter.setPen(self.pen())
+        painter.setBrush(Qt.NoBrush)
+        painter.drawPath(self.lasso)
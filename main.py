@@ -6,6 +6,7 @@ from PyQt5.QtCore import pyqtSlot, QEvent
 #===IMPORTY Z INNYCH PLIKÓW===#
 import helpers
 import settings
+import parallel_inpaint
 from shortcuts import SHORTCUTS
 from mouse import mousePressEvent, mouseMoveEvent, mouseReleaseEvent, enterEvent_logic, leaveEvent_logic
 from ui import setup_ui, RoundedButton
@@ -20,15 +21,35 @@ class LassoEraser(QMainWindow):
         self.sd_client = None
         self.image = None
         self.mask = None
+        #===Ramka, liczba pikseli i prostokąt zmian maski (MaskState) - aktualizowane przy rysowaniu===#
+        self.mask_state = None
         self.history = []
         self.scale_factor = 1.0
+        #===Piramida mipmap bieżącego obrazu i wyświetlany poziom (zoom przez transformację widoku)===#
+        self.mipmaps = None
+        self.display_level = None
         self.drawing = False
         self.points = []
-        self.lasso_lines = []
+        #===Obrys lasso w trakcie rysowania (jeden LassoPathItem, ścieżka przedłużana w miejscu)===#
+        self.lasso_item = None
         #===Pędzel===#
         #=== ===#
         self.last_brush_pos = None
-        self.brush_update_counter = 0
+        #===Ruchy myszy pędzla czekające na rysowanie w bieżącej klatce (queue_brush_point)===#
+        self.pending_brush_points = []
+        self.brush_timer = None
+        #===Bufory Criminisiego - wspólne dla kolejnych wypełnień===#
+        self.criminisi_workspace = None
+        #===Wypełnianie w tle (InpaintJob) - najwyżej jedno naraz===#
+        self.inpaint_job = None
+        #===Analiza bieżącego obrazu (gradienty, indeksy) - odświeżana tylko w miejscu wypełnienia===#
+        self.analysis = None
+        #===Obszary źródłowy / wykluczony dla Criminisiego (pędzle "Źródło" i "Wyklucz")===#
+        self.source_mask = None
+        self.exclude_mask = None
+        #===Biblioteka wzorców Criminisiego (katalog z ustawień) - otwierana raz, przy zmianie ścieżki===#
+        self.saved_library_path = ""
+        self.exemplar_library = None
 
         #Miejsce na integracje z SD API->
         #===================================================================
@@ -85,6 +106,10 @@ class LassoEraser(QMainWindow):
     def leaveEvent(self, event):
         leaveEvent_logic(self, event)
         super().leaveEvent(event)
+    def closeEvent(self, event):
+        helpers.cancel_inpaint(self) #===zadanie w tle nie trzyma zamykanej aplikacji===#
+        parallel_inpaint.shutdown_roi_executor() #===wspólna pula procesów ROI===#
+        super().closeEvent(event)
 
 
     @pyqtSlot()
@@ -104,8 +129,10 @@ class LassoEraser(QMainWindow):
         helpers.draw_image(self)
     def update_brush_mask(self, x, y, update_display=False):
         helpers.update_brush_mask(self, x, y, update_display)
-    def update_brush_display(self):
-        helpers.update_brush_display(self)
+    def flush_brush(self):
+        helpers.flush_brush(self)
+    def update_brush_display(self, rect=None, full=False):
+        helpers.update_brush_display(self, rect, full)
 
     def on_brush_size_changed(self, value):
         helpers.on_brush_size_changed(self, value)
@@ -130,6 +157,8 @@ class LassoEraser(QMainWindow):
 
     def erase_selection(self):
         helpers.erase_selection(self)
+    def cancel_inpaint(self):
+        helpers.cancel_inpaint(self)
     def set_image_bytes(self, b: bytes):
         """Programowy interfejs: ustaw obraz z surowych bajtów (zawartość PNG/JPG)."""
         helpers.set_image_from_bytes(self, b)
@@ -0,0 +1,99 @@
+import math
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QImage, QColor, QPainter, QTransform
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+
+#===NAKŁADKA MASEK JAKO OSOBNA WARSTWA SCENY, ODŚWIEŻANA PROSTOKĄTAMI ZMIAN===#
+
+
+class MaskLayerItem(QGraphicsItem):
+    """Półprzezroczysta nakładka masek nad obrazem.
+
+    Bufor (h, w) uint8 w rozdzielczości wyświetlanego poziomu mipmap trzyma
+    flagi warstw (bit na warstwę z layers) i jest pamięcią QImage Indexed8,
+    którego tabela kolorów składa kolory warstw (późniejsza warstwa wygrywa).
+    refresh(rect) przelicza tylko piksele bufora w prostokącie zmian
+    (y0, y1, x0, x1) we współrzędnych obrazu i unieważnia tylko ten fragment
+    sceny; paint() rysuje tylko odsłonięty fragment. Piksel bufora (i, j)
+    pokazuje piksel obrazu (floor((i+0.5)*H/h), floor((j+0.5)*W/w)) - tak
+    samo jak resize NEAREST, więc odświeżanie częściowe daje to samo co pełne.
+    """
+
+    def __init__(self, layers):
+        super().__init__()
+        self.layers = layers
+        self.buffer = None
+        self.qimage = None
+        self.image_size = None
+        self.table = []
+        for flags in range(1 << len(layers)):
+            color = 0
+            for bit, (_, rgba) in enumerate(layers):
+                if flags & (1 << bit):
+                    color = QColor(*rgba).rgba()
+            self.table.append(color)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def reset(self, image_size, level_size):
+        """Nowy bufor dla obrazu image_size=(W, H) pokazywanego w rozdzielczości level_size=(w, h)."""
+        if self.image_size == image_size and self.buffer is not None and self.buffer.shape[::-1] == level_size:
+            return False
+        self.prepareGeometryChange()
+        w, h = level_size
+        stride = (w + 3) // 4 * 4
+        self._storage = np.zeros((h, stride), dtype=np.uint8)
+        self.buffer = self._storage[:, :w]
+        #===zapisywalny wskaźnik - przy buforze tylko do odczytu Qt robi kopię (setColorTable)===#
+        self.qimage = QImage(sip.voidptr(self._storage.ctypes.data), w, h, stride, QImage.Format_Indexed8)
+        self.qimage.setColorTable(self.table)
+        self.image_size = image_size
+        self.setTransform(QTransform.fromScale(image_size[0] / w, image_size[1] / h))
+        return True
+
+    def _level_range(self, a, b, full, level):
+        #===zakres pikseli bufora, których próbki leżą w [a, b) obrazu===#
+        i0 = max(0, int(math.ceil(a * level / full - 0.5)))
+        i1 = min(level, int(math.ceil(b * level / full - 0.5)))
+        src = np.floor((np.arange(i0, i1) + 0.5) * full / level).astype(np.int64)
+        return i0, i1, np.minimum(src, full - 1)
+
+    def refresh(self, masks, rect=None):
+        """Przelicza bufor w prostokącie rect (cały obraz przy None).
+        masks - obrazy PIL "L" (albo None) w kolejności warstw."""
+        if self.buffer is None:
+            return
+        W, H = self.image_size
+        h, w = self.buffer.shape
+        y0, y1, x0, x1 = (0, H, 0, W) if rect is None else rect
+        i0, i1, ys = self._level_range(y0, y1, H, h)
+        j0, j1, xs = self._level_range(x0, x1, W, w)
+        if i0 >= i1 or j0 >= j1:
+            return
+        box = (int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1)
+        flags = np.zeros((i1 - i0, j1 - j0), dtype=np.uint8)
+        for bit, mask in enumerate(masks):
+            if mask is None:
+                continue
+            crop = np.asarray(mask.crop(box))
+            flags |= (crop[np.ix_(ys - box[1], xs - box[0])] > 0).astype(np.uint8) << bit
+        self.buffer[i0:i1, j0:j1] = flags
+        self.update(QRectF(j0, i0, j1 - j0, i1 - i0))
+
+    def boundingRect(self):
+        if self.buffer is None:
+            return QRectF()
+        h, w = self.buffer.shape
+        return QRectF(0, 0, w, h)
+
+    def paint(self, painter, option, widget=None):
+        if self.qimage is None:
+            return
+        exposed = option.exposedRect if isinstance(option, QStyleOptionGraphicsItem) else self.boundingRect()
+        r = exposed.toAlignedRect() & self.qimage.rect()
+        if not r.isEmpty():
+            painter.save()
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, False) #===ostre krawędzie masek===#
+            painter.drawImage(r, self.qimage, r)
+            painter.restore()
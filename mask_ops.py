@@ -0,0 +1,185 @@
+import math
+from contextlib import contextmanager
+import numpy as np
+import cv2 as cv
+from PIL import Image
+
+#===NAKŁADANIE MASKI NA OBRAZ (wspólne dla metod wypełniania i kompozycji wyniku SD)===#
+
+
+def mask_array(mask):
+    """Maska PIL albo tablica -> tablica bool (h, w); True = piksel do wypełnienia."""
+    if isinstance(mask, Image.Image) and mask.mode not in ("L", "1"):
+        mask = mask.convert("L")
+    return np.asarray(mask) > 0
+
+
+def mask_box(hole, margin=0):
+    """Ramka (y0, y1, x0, x1) pikseli maski powiększona o margin (przycięta
+    do obrazu) albo None dla pustej maski."""
+    x, y, bw, bh = cv.boundingRect(hole.view(np.uint8))
+    if bw == 0 or bh == 0:
+        return None
+    h, w = hole.shape
+    return (max(0, y - margin), min(h, y + bh + margin),
+            max(0, x - margin), min(w, x + bw + margin))
+
+
+def paste_masked(dst, src, hole):
+    """dst[hole] = src[hole] jednym przypisaniem (src - tablica albo kolor)."""
+    where = hole if dst.ndim == 2 else hole[:, :, np.newaxis]
+    np.copyto(dst, src, where=where, casting='unsafe')
+
+
+def _fill_values(fill, img, box, channels):
+    #===piksele fill w ramce box: wycinek obrazu albo kolor rozszerzony do liczby kanałów===#
+    y0, y1, x0, x1 = box
+    if isinstance(fill, Image.Image):
+        if fill.mode != img.mode:
+            fill = fill.convert(img.mode)
+        return np.asarray(fill.crop((x0, y0, x1, y1)))
+    color = tuple(np.atleast_1d(fill)) + (255,) * channels
+    return np.array(color[:channels]) if channels > 1 else color[0]
+
+
+def composite(img, fill, mask, feather=0, box=None):
+    """Kopia img, w której piksele maski pochodzą z fill (obraz tego samego
+    rozmiaru albo kolor). box - znana już ramka maski (MaskState.bbox).
+
+    feather > 0 - miękka krawędź: maska rozmyta filtrem Gaussa (sigma=feather)
+    przenika na zewnątrz, a piksele samej maski zawsze są w całości z fill.
+    Liczone tylko w ramce maski (+3*feather) i wklejane do kopii img.
+    """
+    hole = mask_array(mask)
+    out = img.copy()
+    margin = int(math.ceil(3 * feather))
+    if box is None:
+        box = mask_box(hole, margin)
+    elif margin:
+        h, w = hole.shape
+        box = (max(0, box[0] - margin), min(h, box[1] + margin),
+               max(0, box[2] - margin), min(w, box[3] + margin))
+    if box is None:
+        return out
+    y0, y1, x0, x1 = box
+    base = np.array(out.crop((x0, y0, x1, y1)))
+    channels = 1 if base.ndim == 2 else base.shape[2]
+    src = _fill_values(fill, img, box, channels)
+    roi = hole[y0:y1, x0:x1]
+    if feather > 0:
+        alpha = cv.GaussianBlur(roi.astype(np.float32), (0, 0), feather)
+        alpha[roi] = 1.0
+        if base.ndim == 3:
+            alpha = alpha[:, :, np.newaxis]
+        base = np.rint(base * (1.0 - alpha) + src * alpha).astype(base.dtype)
+    else:
+        paste_masked(base, src, roi)
+    out.paste(Image.fromarray(base), (x0, y0))
+    return out
+
+
+def solid_fill(img, mask, color=(255, 255, 255), box=None):
+    """Piksele maski zamalowane jednym kolorem."""
+    return composite(img, color, mask, box=box)
+
+
+def feathered_fill(img, fill, mask, radius=4):
+    """composite() z miękką krawędzią o promieniu radius."""
+    return composite(img, fill, mask, feather=radius)
+
+
+def transparent_fill(img, mask, inside=0, outside=255):
+    """Obraz RGBA z alfą inside w pikselach maski i outside poza nią
+    (inside=255, outside=0 - maska jako kanał alfa, jak oczekuje SD)."""
+    alpha = np.where(mask_array(mask), np.uint8(inside), np.uint8(outside))
+    out = img.convert("RGBA") if img.mode != "RGBA" else img.copy()
+    out.putalpha(Image.fromarray(alpha))
+    return out
+
+
+class MaskState:
+    """Maska zaznaczenia (PIL "L") z przyrostowo utrzymywaną ramką, liczbą
+    pikseli i prostokątem zmian.
+
+    Pełne skanowanie maski (getbbox/histogram w C) jest robione tylko przy
+    utworzeniu; rysowanie w change() przelicza liczniki wyłącznie w
+    prostokącie rysowanej figury. bbox ma postać (y0, y1, x0, x1) albo None,
+    dirty - suma prostokątów zmian od ostatniego take_dirty(). matches() mówi,
+    czy stan opisuje dany obraz maski (po cofnięciu, wczytaniu albo SD maska
+    jest nowym obrazem i trzeba zbudować nowy stan).
+    """
+
+    def __init__(self, image):
+        self.image = image
+        box = image.getbbox()
+        self.bbox = None if box is None else (box[1], box[3], box[0], box[2])
+        self.count = sum(image.histogram()[1:])
+        self.dirty = None
+
+    def matches(self, image):
+        return image is self.image
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    def _clip(self, box):
+        return clip_box(box, self.image.size)
+
+    def _crop(self, rect):
+        y0, y1, x0, x1 = rect
+        return np.asarray(self.image.crop((x0, y0, x1, y1)))
+
+    @contextmanager
+    def change(self, box):
+        """Kontekst rysowania w prostokącie box=(x0, y0, x1, y1) (współrzędne
+        obrazu, mogą wychodzić poza niego). Zmiany mogą tylko dodawać piksele
+        maski - czyszczenie to nowy obraz maski i nowy stan."""
+        rect = self._clip(box)
+        if rect is None:
+            yield
+            return
+        before = int(np.count_nonzero(self._crop(rect)))
+        yield
+        crop = self._crop(rect) > 0
+        self.count += int(np.count_nonzero(crop)) - before
+        y0, y1, x0, x1 = rect
+        self.dirty = union_box(self.dirty, rect)
+        sub = mask_box(crop)
+        if sub is not None:
+            self.bbox = union_box(self.bbox, (sub[0] + y0, sub[1] + y0, sub[2] + x0, sub[3] + x0))
+
+    def take_dirty(self):
+        """Prostokąt zmian od poprzedniego wywołania (albo None); zeruje go."""
+        dirty, self.dirty = self.dirty, None
+        return dirty
+
+
+def simplify_polygon(points, tolerance=0.5):
+    """Usuwa prawie współliniowe wierzchołki obrysu (Douglas-Peucker,
+    cv.approxPolyDP): zostają punkty odległe od uproszczonej łamanej o więcej
+    niż tolerance pikseli, więc rasteryzacja różni się najwyżej na brzegu."""
+    if len(points) < 4:
+        return list(points)
+    curve = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+    return [tuple(p) for p in cv.approxPolyDP(curve, tolerance, True).reshape(-1, 2).tolist()]
+
+
+def clip_box(box, size):
+    """Prostokąt (x0, y0, x1, y1) float (np. rysowanej figury) -> (y0, y1, x0, x1)
+    int w granicach obrazu o rozmiarze size=(w, h), albo None gdy poza obrazem."""
+    w, h = size
+    x0, y0 = max(0, int(math.floor(box[0]))), max(0, int(math.floor(box[1])))
+    x1, y1 = min(w, int(math.ceil(box[2])) + 1), min(h, int(math.ceil(box[3])) + 1)
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return y0, y1, x0, x1
+
+
+def union_box(a, b):
+    """Najmniejszy prostokąt (y0, y1, x0, x1) zawierający a i b (każdy może być None)."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
@@ -0,0 +1,57 @@
+import math
+import numpy as np
+import cv2 as cv
+from PyQt5.QtGui import QImage, QPixmap
+
+#===PIRAMIDA MIPMAP OBRAZU DO WYŚWIETLANIA (zoom przez transformację widoku)===#
+
+
+def array_to_qimage(arr):
+    """Tablica uint8 (h, w, 3) RGB albo (h, w, 4) RGBA -> QImage (kopia danych)."""
+    arr = np.ascontiguousarray(arr)
+    h, w = arr.shape[:2]
+    fmt = QImage.Format_RGBA8888 if arr.shape[2] == 4 else QImage.Format_RGB888
+    return QImage(arr.data, w, h, arr.strides[0], fmt).copy()
+
+
+class MipmapPyramid:
+    """Kolejne poziomy obrazu zmniejszone 2x (cv.INTER_AREA) jako QPixmap.
+
+    Poziom k ma rozdzielczość 1/2^k i w scenie (współrzędne obrazu) jest
+    skalowany przez 2^k; level_for(scale) wybiera najmniejszy poziom, który
+    przy danym powiększeniu widoku ma co najmniej piksel obrazu na piksel
+    ekranu. Poziomy są liczone przy pierwszym użyciu, każdy z poprzedniego,
+    i trzymane do następnej edycji obrazu (matches() jak w ImageAnalysis).
+    """
+
+    def __init__(self, image, min_size=64):
+        self.source = image
+        self.size = image.size
+        self.arrays = [np.asarray(image.convert("RGB") if image.mode != "RGB" else image)]
+        self.pixmaps = {}
+        self.count = 1 + max(0, int(math.floor(math.log2(max(1, min(self.size) / min_size)))))
+
+    def matches(self, image):
+        return image is self.source
+
+    def level_for(self, scale):
+        if scale >= 1:
+            return 0
+        return min(self.count - 1, int(math.floor(math.log2(1 / scale) + 1e-9)))
+
+    def array(self, level):
+        while len(self.arrays) <= level:
+            prev = self.arrays[-1]
+            h, w = prev.shape[:2]
+            self.arrays.append(cv.resize(prev, (max(1, w // 2), max(1, h // 2)), interpolation=cv.INTER_AREA))
+        return self.arrays[level]
+
+    def pixmap(self, level):
+        if level not in self.pixmaps:
+            self.pixmaps[level] = QPixmap.fromImage(array_to_qimage(self.array(level)))
+        return self.pixmaps[level]
+
+    def level_scale(self, level):
+        """Skala (sx, sy) elementu sceny, przy której poziom level pokrywa cały obraz."""
+        h, w = self.array(level).shape[:2]
+        return self.size[0] / w, self.size[1] / h
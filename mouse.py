@@ -1,60 +1,51 @@
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPen, QColor
-from PIL import ImageDraw
 import helpers
 
 def mousePressEvent(self, event):
     if not self.image: return
     pos = self.view.mapToScene(event.pos())
-    x, y = pos.x() / self.scale_factor, pos.y() / self.scale_factor
+    x, y = pos.x(), pos.y() #===scena jest w współrzędnych obrazu===#
     self.drawing = True
     self.points = [(x, y)]
     self.last_brush_pos = None
-    self.brush_update_counter = 0
+    self.pending_brush_points = []
     try:
         self.status_message.setText("")
         self.status_label.setStyleSheet(f"background: {helpers.COLORS['status_idle']}; border-radius: 10px;")
     except Exception:
         pass
-    if self.tool_combo.currentData() == 1:
+    if self.tool_combo.currentData() in helpers.BRUSH_TOOLS:
         helpers.update_brush_mask(self, x, y, update_display=True)
         
 def mouseMoveEvent(self, event):
     pos = self.view.mapToScene(event.pos())
     if not self.drawing or not self.image:
         return
-    x, y = pos.x() / self.scale_factor, pos.y() / self.scale_factor
+    x, y = pos.x(), pos.y()
     if self.tool_combo.currentData() == 0: #Lasso
-        if len(self.points) > 1:
-            prev = self.points[-1]
-            line = self.scene.addLine(
-                prev[0]*self.scale_factor, prev[1]*self.scale_factor,
-                x*self.scale_factor, y*self.scale_factor,
-                QPen(QColor("red"), 2)
-            )
-            self.lasso_lines.append(line)
         self.points.append((x, y))
+        helpers.extend_lasso(self)
     else: #Pędzel
-        self.brush_update_counter += 1
-        helpers.update_brush_mask(self, x, y, update_display=(self.brush_update_counter % 3 == 0))
+        helpers.queue_brush_point(self, x, y) #===rysowane raz na klatkę===#
 
 def mouseReleaseEvent(self, event):
     if not self.image: return
     self.drawing = False
     if self.tool_combo.currentData() == 0 and len(self.points) > 2:
-        draw = ImageDraw.Draw(self.mask)
-        draw.polygon(self.points, fill=255)
-    elif self.tool_combo.currentData() == 1:
+        helpers.close_lasso(self)
+    elif self.tool_combo.currentData() in helpers.BRUSH_TOOLS:
         pos = self.view.mapToScene(event.pos())
-        x, y = pos.x() / self.scale_factor, pos.y() / self.scale_factor
-        helpers.update_brush_mask(self, x, y, update_display=False)
+        x, y = pos.x(), pos.y()
+        self.pending_brush_points.append((x, y))
+        helpers.flush_brush(self)
         self.last_brush_pos = None
-    helpers.draw_image(self)
+    helpers.update_brush_display(self) #===obraz bez zmian - tylko prostokąt zmian maski===#
+    helpers.clear_lasso(self)
     
 #===LOGIGA DLA WEJŚCIA NA OBRAZEK MYSZKĄ===#
     #===POJAWI SIĘ KURSON Z KUŁECZKIEM===#
 def enterEvent_logic(self, event):
-    if self.tool_combo.currentData() == 1 and self.image:
+    if self.tool_combo.currentData() in helpers.BRUSH_TOOLS and self.image:
         self.view.viewport().setCursor(helpers.create_brush_cursor(self))
         
 def leaveEvent_logic(self, event):
@@ -0,0 +1,243 @@
+import os
+import time
+import atexit
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+import cv2 as cv
+from PIL import Image
+from criminisi import criminisi_inpaint, check_cancel, forbidden_source_map
+from mask_ops import paste_masked
+
+#===RÓWNOLEGŁY CRIMINISI: OSOBNE DZIURY W OSOBNYCH PROCESACH===#
+
+#===co ile sekund wątek zbierający wyniki ROI sprawdza anulowanie===#
+CANCEL_POLL = 0.05
+
+
+def _overlap(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+
+def component_rois(target, margin):
+    """Prostokąty (y0, y1, x0, x1) do wypełniania: ramka każdej spójnej
+    składowej maski powiększona o margines źródłowy. Nachodzące na siebie
+    prostokąty są łączone, więc wynikowe ROI są rozłączne i można je
+    wypełniać niezależnie."""
+    h, w = target.shape
+    #===SKŁADOWE LICZONE TYLKO W RAMCE CAŁEJ MASKI===#
+    bx, by, bbw, bbh = cv.boundingRect(target)
+    if bbw == 0 or bbh == 0:
+        return []
+    n, _, stats, _ = cv.connectedComponentsWithStats(
+        np.ascontiguousarray(target[by:by + bbh, bx:bx + bbw]), connectivity=8)
+    stats[:, 0] += bx
+    stats[:, 1] += by
+    rois = []
+    for x, y, bw, bh in stats[1:, :4]:
+        rois.append([max(0, y - margin), min(h, y + bh + margin),
+                     max(0, x - margin), min(w, x + bw + margin)])
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for roi in rois:
+            for other in out:
+                if _overlap(roi, other):
+                    other[0], other[1] = min(other[0], roi[0]), max(other[1], roi[1])
+                    other[2], other[3] = min(other[2], roi[2]), max(other[3], roi[3])
+                    merged = True
+                    break
+            else:
+                out.append(roi)
+        rois = out
+    return [tuple(int(v) for v in roi) for roi in rois]
+
+
+def _roi_kwargs(kwargs, roi):
+    #===MAPA ZAKAZANYCH ŹRÓDEŁ PRZYCIĘTA DO ROI (przed wysłaniem do procesu)===#
+    if kwargs.get('exclude_region') is None:
+        return kwargs
+    y0, y1, x0, x1 = roi
+    return dict(kwargs, exclude_region=kwargs['exclude_region'][y0:y1, x0:x1])
+
+
+def _fill_roi(img, target, roi, kwargs):
+    #===WYPEŁNIA JEDNO ROI W MIEJSCU (tylko piksele maski)===#
+    y0, y1, x0, x1 = roi
+    sub_target = target[y0:y1, x0:x1]
+    filled = np.array(criminisi_inpaint(Image.fromarray(np.ascontiguousarray(img[y0:y1, x0:x1])),
+                                        Image.fromarray(sub_target * 255), **kwargs))
+    hole = sub_target > 0
+    paste_masked(img[y0:y1, x0:x1], filled, hole)
+    return int(np.count_nonzero(hole))
+
+
+class SharedCancel:
+    """Flaga anulowania w jednym bajcie pamięci współdzielonej - w procesach
+    roboczych zastępuje threading.Event (ta sama metoda is_set())."""
+
+    def __init__(self, block):
+        self.block = block
+
+    def set(self):
+        self.block.buf[0] = 1
+
+    def is_set(self):
+        return self.block.buf[0] != 0
+
+
+def _fill_roi_shared(img_name, mask_name, cancel_name, shape, roi, kwargs):
+    #===PROCES ROBOCZY: obraz, maska i flaga anulowania w pamięci współdzielonej, bez kopiowania przez pickle===#
+    img_shm = shared_memory.SharedMemory(name=img_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    cancel_shm = shared_memory.SharedMemory(name=cancel_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=img_shm.buf)
+        target = np.ndarray(shape[:2], dtype=np.uint8, buffer=mask_shm.buf)
+        filled = _fill_roi(img, target, roi, dict(kwargs, cancel=SharedCancel(cancel_shm)))
+        del img, target
+        return roi, filled
+    finally:
+        img_shm.close()
+        mask_shm.close()
+        cancel_shm.close()
+
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def roi_executor(workers):
+    """Wspólny, ciepły ProcessPoolExecutor (spawn) dla ROI - procesy i ich
+    importy (numpy, cv2, scipy) przeżywają kolejne wypełniania. Tworzony przy
+    pierwszym użyciu i ponownie tylko przy zmianie liczby procesów."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+@atexit.register
+def shutdown_roi_executor():
+    """Zamyka wspólną pulę ROI (zamknięcie aplikacji, zepsuta pula)."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = _executor_workers = None
+
+
+def parallel_criminisi_inpaint(img, mask, workers=None, margin=100, gradients=None,
+                               time_budget=None, deadline=None, progress=None, cancel=None,
+                               analysis=None, library=None, **kwargs):
+    """Criminisi dla każdej spójnej składowej maski osobno, w jej ROI.
+
+    ROI (ramka składowej + margin pikseli źródła) są wypełniane równolegle
+    we wspólnej puli roi_executor(workers); obraz i maska leżą w
+    multiprocessing.shared_memory, a procesy zapisują wynik tylko w pikselach
+    swojej dziury. Procesy są uruchamiane metodą 'spawn' (fork procesu
+    z wątkami Qt nie jest bezpieczny).
+    Przy jednym ROI albo workers=1 wszystko dzieje się w bieżącym procesie.
+    progress(pozostało, wszystkich) jest wołane po każdym ROI, a w bieżącym
+    procesie także w trakcie ROI (postęp Criminisiego plus piksele pozostałych
+    ROI). cancel zgłasza InpaintCancelled; w procesach roboczych jest
+    przekazywany przez SharedCancel, więc trwające ROI też się przerywają. Pozostałe kwargs trafiają
+    do criminisi_inpaint (source_region / exclude_region są przycinane do ROI).
+    analysis - ImageAnalysis tego obrazu: gotowa tablica pikseli i gradienty.
+    library - ExemplarLibrary dla criminisi_inpaint każdego ROI; do procesów
+    roboczych trafia tylko jej ścieżka.
+    """
+    if time_budget is not None:
+        budget_end = time.monotonic() + time_budget
+        deadline = budget_end if deadline is None else min(deadline, budget_end)
+    if analysis is not None:
+        img_np = analysis.array.copy()
+        if gradients is None:
+            gradients = analysis.gradients
+    else:
+        img_np = np.array(img)
+    target = (np.array(mask) > 0).astype(np.uint8)
+    rois = component_rois(target, margin)
+    total = int(np.count_nonzero(target))
+    remaining = total
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool_workers = max(1, workers)
+    workers = max(1, min(workers, len(rois)))
+    kwargs = dict(kwargs, deadline=deadline, library=library)
+    kwargs['exclude_region'] = forbidden_source_map(target.shape, kwargs.pop('source_region', None),
+                                                    kwargs.pop('exclude_region', None))
+    if workers == 1:
+        for roi in rois:
+            check_cancel(cancel)
+            roi_kwargs = dict(_roi_kwargs(kwargs, roi), cancel=cancel)
+            if progress is not None:
+                #===postęp wewnątrz ROI + piksele pozostałych ROI===#
+                y0, y1, x0, x1 = roi
+                others = remaining - int(np.count_nonzero(target[y0:y1, x0:x1]))
+                roi_kwargs['progress'] = lambda left, _, others=others: progress(others + left, total)
+            remaining -= _fill_roi(img_np, target, roi, roi_kwargs)
+            if progress is not None:
+                progress(remaining, total)
+    else:
+        #===procesy puli nie uruchamiają własnych procesów wyszukiwania, mają własne bufory i bez śladu===#
+        kwargs.pop('search_workers', None)
+        kwargs.pop('workspace', None)
+        kwargs.pop('tracer', None)
+        img_shm = shared_memory.SharedMemory(create=True, size=img_np.nbytes)
+        mask_shm = shared_memory.SharedMemory(create=True, size=target.nbytes)
+        cancel_shm = shared_memory.SharedMemory(create=True, size=1)
+        shared_img = shared_mask = None
+        try:
+            shared_img = np.ndarray(img_np.shape, dtype=np.uint8, buffer=img_shm.buf)
+            shared_mask = np.ndarray(target.shape, dtype=np.uint8, buffer=mask_shm.buf)
+            shared_img[:] = img_np
+            shared_mask[:] = target
+            shared_cancel = SharedCancel(cancel_shm)
+            shared_cancel.block.buf[0] = 0
+            pool = roi_executor(pool_workers)
+            pending = set()
+            try:
+                for roi in rois:
+                    pending.add(pool.submit(_fill_roi_shared, img_shm.name, mask_shm.name, cancel_shm.name,
+                                            img_np.shape, roi, _roi_kwargs(kwargs, roi)))
+                while pending:
+                    done, pending = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                    if cancel is not None and cancel.is_set():
+                        check_cancel(cancel)
+                    for future in done:
+                        _, filled = future.result()
+                        remaining -= filled
+                        if progress is not None:
+                            progress(remaining, total)
+            except BaseException as e:
+                #===trwające ROI kończą się przy najbliższej iteracji; pamięć zwalniana dopiero po nich===#
+                shared_cancel.set()
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                if isinstance(e, BrokenProcessPool):
+                    shutdown_roi_executor()
+                raise
+            img_np = shared_img.copy()
+        finally:
+            shared_img = shared_mask = None
+            img_shm.close()
+            img_shm.unlink()
+            mask_shm.close()
+            mask_shm.unlink()
+            cancel_shm.close()
+            cancel_shm.unlink()
+    if gradients is not None:
+        for roi in rois:
+            gradients.update(img_np, roi)
+    return Image.fromarray(img_np)
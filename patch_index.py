@@ -0,0 +1,166 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from patchmatch import masked_ssd
+
+#===INDEKS DESKRYPTORÓW PATCHY ŹRÓDŁOWYCH (PCA + KD-drzewo)===#
+
+
+def gather_centres(work, centres, r):
+    """Zwraca (N, (2r+1)^2 * C) spłaszczone patche o środkach centres (N, 2)."""
+    offs = np.arange(-r, r + 1)
+    ys = centres[:, 0, None] + offs[None, :]
+    xs = centres[:, 1, None] + offs[None, :]
+    patches = work[ys[:, :, None], xs[:, None, :]]
+    return patches.reshape(len(centres), -1)
+
+
+class PatchIndex:
+    """Indeks wszystkich w pełni znanych patchy obrazu.
+
+    Patche są rzutowane PCA na n_components wymiarów i trzymane w cKDTree.
+    Zapytanie rzutuje tylko znaną część patcha docelowego (najmniejsze kwadraty
+    na wierszach bazy odpowiadających znanym pikselom), pobiera top_k
+    najbliższych deskryptorów i wybiera zwycięzcę dokładnym SSD z maską.
+    Nowe źródła (wypełnione obszary) trafiają do bufora przeszukiwanego
+    bezpośrednio, a drzewo jest przebudowywane, gdy bufor urośnie.
+    refresh() unieważnia wpisy, których patch zmienił się w podanym prostokącie
+    (alive = False), i dodaje je ponownie z aktualnymi deskryptorami.
+    evaluated - łączna liczba kandydatów ocenionych dokładnym SSD.
+    """
+
+    def __init__(self, work, valid, r, n_components=16, stride=2, top_k=32,
+                 sample_size=4000, chunk=65536, seed=0):
+        h, w = valid.shape
+        self.r = r
+        self.stride = stride
+        self.top_k = top_k
+        self.chunk = chunk
+        self.shape = (h, w)
+        self.evaluated = 0
+        self.indexed = np.zeros((h, w), dtype=bool)
+        rng = np.random.default_rng(seed)
+        grid = np.zeros((h, w), dtype=bool)
+        grid[::stride, ::stride] = True
+        centres = np.argwhere(valid & grid)
+        if len(centres) == 0:
+            centres = np.argwhere(valid)
+        #===BAZA PCA Z LOSOWEJ PRÓBKI PATCHY===#
+        sample = centres
+        if len(sample) > sample_size:
+            sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+        dim = (2 * r + 1) ** 2 * work.shape[2]
+        if len(sample) > 0:
+            data = gather_centres(work, sample, r).astype(np.float32)
+            self.mean = data.mean(axis=0)
+            _, _, vt = np.linalg.svd(data - self.mean, full_matrices=False)
+            self.basis = vt[:n_components].T.astype(np.float32)
+        else:
+            self.mean = np.zeros(dim, dtype=np.float32)
+            self.basis = np.eye(dim, min(n_components, dim), dtype=np.float32)
+        self.centres = np.empty((0, 2), dtype=np.int64)
+        self.alive = np.empty(0, dtype=bool)
+        self.descriptors = np.empty((0, self.basis.shape[1]), dtype=np.float32)
+        self.tree = None
+        self.pending_centres = np.empty((0, 2), dtype=np.int64)
+        self.pending = np.empty((0, self.basis.shape[1]), dtype=np.float32)
+        self._add(work, centres)
+        self._rebuild()
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive)) + len(self.pending_centres)
+
+    def describe(self, work, centres):
+        """Deskryptory PCA (N, n_components) dla środków centres, liczone porcjami."""
+        out = np.empty((len(centres), self.basis.shape[1]), dtype=np.float32)
+        for i in range(0, len(centres), self.chunk):
+            part = gather_centres(work, centres[i:i + self.chunk], self.r)
+            out[i:i + self.chunk] = (part - self.mean) @ self.basis
+        return out
+
+    def _add(self, work, centres):
+        if len(centres) == 0:
+            return
+        self.indexed[centres[:, 0], centres[:, 1]] = True
+        self.pending_centres = np.concatenate([self.pending_centres, centres])
+        self.pending = np.concatenate([self.pending, self.describe(work, centres)])
+
+    def _rebuild(self):
+        self.centres = np.concatenate([self.centres[self.alive], self.pending_centres])
+        self.descriptors = np.concatenate([self.descriptors[self.alive], self.pending])
+        self.alive = np.ones(len(self.centres), dtype=bool)
+        self.pending_centres = self.pending_centres[:0]
+        self.pending = self.pending[:0]
+        self.tree = cKDTree(self.descriptors) if len(self.descriptors) else None
+
+    def add_sources(self, work, valid, bounds):
+        """Dopisuje środki, które w otoczeniu bounds stały się w pełni znane."""
+        h, w = self.shape
+        y0, y1, x0, x1 = bounds
+        y0, y1 = max(0, y0 - self.r), min(h, y1 + self.r)
+        x0, x1 = max(0, x0 - self.r), min(w, x1 + self.r)
+        new = valid[y0:y1, x0:x1] & ~self.indexed[y0:y1, x0:x1]
+        pts = np.argwhere(new) + (y0, x0)
+        pts = pts[(pts[:, 0] % self.stride == 0) & (pts[:, 1] % self.stride == 0)]
+        self._add(work, pts)
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        stale = len(self.pending_centres) + len(self.alive) - int(np.count_nonzero(self.alive))
+        if stale > max(4096, len(self.centres) // 10):
+            self._rebuild()
+
+    def refresh(self, work, bounds):
+        """Przelicza deskryptory patchy nachodzących na zmieniony prostokąt
+        bounds=(y0, y1, x0, x1); dodaje też środki siatki, które wcześniej były
+        w masce (zapytania i tak filtrują kandydatów aktualną mapą valid)."""
+        h, w = self.shape
+        r = self.r
+        y0, y1, x0, x1 = bounds
+        cy0, cy1 = max(r, y0 - r), min(h - r, y1 + r)
+        cx0, cx1 = max(r, x0 - r), min(w - r, x1 + r)
+        if cy0 >= cy1 or cx0 >= cx1:
+            return
+
+        def inside(c):
+            return (c[:, 0] >= cy0) & (c[:, 0] < cy1) & (c[:, 1] >= cx0) & (c[:, 1] < cx1)
+
+        self.alive[inside(self.centres)] = False
+        keep = ~inside(self.pending_centres)
+        self.pending_centres = self.pending_centres[keep]
+        self.pending = self.pending[keep]
+        ys = np.arange(cy0 + (-cy0) % self.stride, cy1, self.stride)
+        xs = np.arange(cx0 + (-cx0) % self.stride, cx1, self.stride)
+        pts = np.stack(np.meshgrid(ys, xs, indexing='ij'), axis=-1).reshape(-1, 2)
+        self._add(work, pts)
+        self._maybe_rebuild()
+
+    def query_descriptor(self, templ, known):
+        """Rzut znanej części patcha docelowego na bazę PCA."""
+        m = np.repeat(known.reshape(-1), templ.shape[2]) > 0
+        basis = self.basis[m]
+        rhs = templ.reshape(-1)[m] - self.mean[m]
+        coef, *_ = np.linalg.lstsq(basis, rhs, rcond=None)
+        return coef.astype(np.float32)
+
+    def search(self, work, valid, templ, known):
+        """Zwraca (qy, qx) najlepszego z top_k kandydatów indeksu albo None."""
+        if len(self) == 0:
+            return None
+        q = self.query_descriptor(templ, known)
+        cands = []
+        if self.tree is not None:
+            k = min(self.top_k, len(self.centres))
+            _, idx = self.tree.query(q, k=k)
+            idx = np.atleast_1d(idx)
+            cands.append(self.centres[idx[self.alive[idx]]])
+        if len(self.pending):
+            dist = np.einsum('ij,ij->i', self.pending - q, self.pending - q)
+            k = min(self.top_k, len(dist))
+            cands.append(self.pending_centres[np.argpartition(dist, k - 1)[:k]])
+        cands = np.concatenate(cands)
+        cands = cands[valid[cands[:, 0], cands[:, 1]]]
+        if len(cands) == 0:
+            return None
+        self.evaluated += len(cands)
+        best = cands[int(np.argmin(masked_ssd(work, templ, known, cands)))]
+        return int(best[0]), int(best[1])
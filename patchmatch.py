@@ -0,0 +1,112 @@
+import numpy as np
+
+#===PATCHMATCH - PRZYBLIŻONE WYSZUKIWANIE NAJBLIŻSZEGO PATCHA===#
+
+
+def masked_ssd(work, templ, known, centres):
+    """SSD z maską dla listy środków kandydatów (M, 2) - zwraca (M,)."""
+    k = templ.shape[0]
+    r = k // 2
+    offs = np.arange(-r, r + 1)
+    ys = centres[:, 0, None] + offs[None, :]
+    xs = centres[:, 1, None] + offs[None, :]
+    patches = work[ys[:, :, None], xs[:, None, :]]
+    diff = (patches - templ[np.newaxis]) * known[np.newaxis, :, :, np.newaxis]
+    return np.einsum('mijc,mijc->m', diff, diff)
+
+
+class PatchMatchSearch:
+    """Pole najbliższych sąsiadów (NNF) dla pikseli docelowych + wyszukiwanie PatchMatch.
+
+    nnf[y, x] to środek patcha źródłowego przypisany pikselowi (y, x) albo (-1, -1).
+    Kandydaci dla nowego patcha pochodzą z propagacji (przesunięte wpisy NNF
+    pikseli w jego oknie), losowej inicjalizacji i losowego przeszukiwania
+    wokół najlepszego z wykładniczo malejącym promieniem. Koszt jednego
+    wyszukiwania nie zależy od rozmiaru obrazu ani promienia szukania.
+    evaluated - łączna liczba kandydatów ocenionych SSD.
+    """
+
+    def __init__(self, shape, r, iterations=2, random_samples=8, seed=None):
+        h, w = shape[:2]
+        self.shape = (h, w)
+        self.r = r
+        self.iterations = iterations
+        self.random_samples = random_samples
+        self.rng = np.random.default_rng(seed)
+        self.nnf = np.full((h, w, 2), -1, dtype=np.int32)
+        self.evaluated = 0
+
+    def _filter_valid(self, valid, cands):
+        h, w = self.shape
+        r = self.r
+        ok = (cands[:, 0] >= r) & (cands[:, 0] < h - r) & (cands[:, 1] >= r) & (cands[:, 1] < w - r)
+        cands = cands[ok]
+        return cands[valid[cands[:, 0], cands[:, 1]]]
+
+    def _propagated(self, y, x):
+        #===PROPAGACJA: sąsiad d dopasowany do s sugeruje s - d dla środka===#
+        h, w = self.shape
+        r = self.r
+        y0, y1 = max(0, y - r), min(h, y + r + 1)
+        x0, x1 = max(0, x - r), min(w, x + r + 1)
+        nnf = self.nnf[y0:y1, x0:x1]
+        has = nnf[:, :, 0] >= 0
+        if not has.any():
+            return np.empty((0, 2), dtype=np.int64)
+        dy, dx = np.nonzero(has)
+        return nnf[dy, dx].astype(np.int64) - np.stack([dy + y0 - y, dx + x0 - x], axis=1)
+
+    def _random(self, n, centre=None, radius=None):
+        h, w = self.shape
+        r = self.r
+        if centre is None:
+            ys = self.rng.integers(r, max(r + 1, h - r), n)
+            xs = self.rng.integers(r, max(r + 1, w - r), n)
+        else:
+            ys = centre[0] + self.rng.integers(-radius, radius + 1, n)
+            xs = centre[1] + self.rng.integers(-radius, radius + 1, n)
+        return np.stack([ys, xs], axis=1)
+
+    def search(self, work, valid, templ, known, y, x):
+        """Zwraca (qy, qx) przybliżenie najlepszego źródła albo None, gdy nie
+        trafiono w żaden poprawny środek."""
+        cands = np.concatenate([self._propagated(y, x), self._random(self.random_samples)])
+        cands = self._filter_valid(valid, cands)
+        if len(cands) == 0:
+            return None
+        ssd = masked_ssd(work, templ, known, cands)
+        self.evaluated += len(cands)
+        best = int(np.argmin(ssd))
+        best_q, best_ssd = cands[best], ssd[best]
+        for _ in range(self.iterations):
+            #===LOSOWE PRZESZUKIWANIE Z MALEJĄCYM PROMIENIEM===#
+            radius = max(self.shape)
+            while radius >= 1:
+                rand = self._filter_valid(valid, self._random(2, best_q, radius))
+                if len(rand):
+                    ssd = masked_ssd(work, templ, known, rand)
+                    self.evaluated += len(rand)
+                    i = int(np.argmin(ssd))
+                    if ssd[i] < best_ssd:
+                        best_q, best_ssd = rand[i], ssd[i]
+                radius //= 2
+        return int(best_q[0]), int(best_q[1])
+
+    def assign(self, y, x, q):
+        """Zapisuje w NNF dopasowanie skopiowanego patcha: piksel p+d -> q+d."""
+        h, w = self.shape
+        r = self.r
+        y0, y1 = max(0, y - r), min(h, y + r + 1)
+        x0, x1 = max(0, x - r), min(w, x + r + 1)
+        oy, ox = np.mgrid[y0:y1, x0:x1]
+        self.nnf[y0:y1, x0:x1, 0] = oy + (q[0] - y)
+        self.nnf[y0:y1, x0:x1, 1] = ox + (q[1] - x)
+
+
+def patchmatch_inpaint(img, mask, seed=None, source_region=None, exclude_region=None, analysis=None,
+                       progress=None, cancel=None):
+    """Criminisi z wyszukiwaniem PatchMatch po całym obrazie (bez limitu promienia)."""
+    from criminisi import criminisi_inpaint
+    return criminisi_inpaint(img, mask, search='patchmatch', seed=seed,
+                             source_region=source_region, exclude_region=exclude_region,
+                             analysis=analysis, progress=progress, cancel=cancel)
@@ -0,0 +1,184 @@
+import time
+import numpy as np
+from PIL import Image
+import cv2 as cv
+from criminisi import criminisi_inpaint, valid_centre_map, check_cancel, fast_fill, forbidden_source_map
+from tracer import stage
+
+#===TRYB WIELOSKALOWY: Criminisi na najmniejszym poziomie + doprecyzowanie mapy źródeł===#
+
+
+def downsample_mask(mask):
+    """Zmniejsza maskę 2x: piksel jest ustawiony, gdy ustawiony jest którykolwiek
+    z jego 4 pikseli."""
+    h, w = mask.shape
+    mask = np.pad(mask, ((0, h % 2), (0, w % 2)), mode='edge')
+    return mask.reshape(mask.shape[0] // 2, 2, mask.shape[1] // 2, 2).any(axis=(1, 3))
+
+
+def downsample(img, target):
+    """Zmniejsza obraz 2x średnią z bloków 2x2; piksel maski jest nieznany, gdy
+    nieznany jest którykolwiek z jego 4 pikseli, więc znane piksele nie
+    mieszają się z zawartością dziury."""
+    h, w = target.shape
+    img = np.pad(img, ((0, h % 2), (0, w % 2), (0, 0)), mode='edge')
+    small = img.reshape(img.shape[0] // 2, 2, img.shape[1] // 2, 2, -1).mean(axis=(1, 3))
+    return small.astype(np.float32), downsample_mask(target).astype(np.uint8)
+
+
+def upsample_sources(sources, pts):
+    """Źródła pikseli pts (N, 2) poziomu 2x większego na podstawie mapy
+    sources poziomu mniejszego: src = 2 * src_c(p // 2) + p % 2."""
+    coarse = sources[pts[:, 0] // 2, pts[:, 1] // 2].astype(np.int64)
+    up = 2 * coarse + pts % 2
+    up[coarse[:, 0] < 0] = -1
+    return up
+
+
+def valid_sources(src, valid):
+    """Maska (...) źródeł src (..., 2) będących środkami w pełni znanych patchy."""
+    h, w = valid.shape
+    inside = (src[..., 0] >= 0) & (src[..., 0] < h) & (src[..., 1] >= 0) & (src[..., 1] < w)
+    ok = np.zeros(src.shape[:-1], dtype=bool)
+    ok[inside] = valid[src[..., 0][inside], src[..., 1][inside]]
+    return ok
+
+
+def gather(work, centres, r):
+    """Patche (N, k, k, C) o środkach centres; współrzędne poza obrazem są przycinane."""
+    h, w = work.shape[:2]
+    offs = np.arange(-r, r + 1)
+    ys = np.clip(centres[:, 0, None] + offs[None, :], 0, h - 1)
+    xs = np.clip(centres[:, 1, None] + offs[None, :], 0, w - 1)
+    return work[ys[:, :, None], xs[:, None, :]]
+
+
+def refine_sources(work, pts, src, valid, r=2, iterations=2, rng=None, chunk=4096):
+    """Doprecyzowuje źródła src (N, 2) pikseli dziury pts lokalnymi poszukiwaniami.
+
+    Każdy przebieg ocenia dla każdego piksela: obecne źródło, propagację od
+    4 sąsiadów z dziury i losowe przesunięcie o +-2 px; wybiera kandydata
+    o najmniejszym SSD patchy i kopiuje piksel źródłowy do work.
+    Kandydaci muszą być środkami w pełni znanych patchy (valid).
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    h, w = valid.shape
+    n = len(pts)
+    if n == 0:
+        return src
+    valid_pts = np.argwhere(valid)
+    if len(valid_pts) == 0:
+        return src
+    bad = ~valid_sources(src, valid)
+    src[bad] = valid_pts[rng.integers(len(valid_pts), size=int(bad.sum()))]
+    work[pts[:, 0], pts[:, 1]] = work[src[:, 0], src[:, 1]]
+    lut = np.full((h, w), -1, dtype=np.int64)
+    lut[pts[:, 0], pts[:, 1]] = np.arange(n)
+    for _ in range(iterations):
+        cands = [src]
+        for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            ny = np.clip(pts[:, 0] + dy, 0, h - 1)
+            nx = np.clip(pts[:, 1] + dx, 0, w - 1)
+            j = lut[ny, nx]
+            cands.append(np.where((j >= 0)[:, None], src[np.maximum(j, 0)] - (dy, dx), src))
+        cands.append(src + rng.integers(-2, 3, size=(n, 2)))
+        cands = np.stack(cands, axis=1)
+        cands = np.where(valid_sources(cands, valid)[:, :, None], cands, src[:, None, :])
+        best = np.empty(n, dtype=np.int64)
+        for i in range(0, n, chunk):
+            p = gather(work, pts[i:i + chunk], r)
+            c = cands[i:i + chunk]
+            q = gather(work, c.reshape(-1, 2), r).reshape(c.shape[:2] + p.shape[1:])
+            diff = q - p[:, np.newaxis]
+            best[i:i + chunk] = np.argmin(np.einsum('nmijc,nmijc->nm', diff, diff), axis=1)
+        src = cands[np.arange(n), best]
+        work[pts[:, 0], pts[:, 1]] = work[src[:, 0], src[:, 1]]
+    return src
+
+
+def pyramid_inpaint(img, mask, coarse_size=256, max_levels=6, refine_iterations=2,
+                    gradients=None, search='exact', seed=None,
+                    deadline=None, progress=None, cancel=None, workspace=None,
+                    source_region=None, exclude_region=None, tracer=None,
+                    patch_size=None, batch=1, search_workers=None, sources=None):
+    """Wieloskalowy Criminisi dla dużych dziur.
+
+    Buduje piramidę obrazu i maski aż dłuższy bok spadnie do coarse_size,
+    wypełnia najmniejszy poziom Criminisim bez limitu iteracji, a potem na
+    każdym większym poziomie powiększa mapę źródeł i doprecyzowuje ją
+    refine_sources. Wynik zawiera tylko piksele skopiowane ze znanej części
+    obrazu, a dziura jest zawsze wypełniona do końca.
+    deadline, progress i cancel działają jak w criminisi_inpaint; po terminie
+    doprecyzowanie większych poziomów zostaje pominięte. workspace trafia do
+    Criminisiego najmniejszego poziomu. source_region / exclude_region jak w
+    criminisi_inpaint - ograniczają źródła na każdym poziomie. tracer mierzy
+    etapy 'pyramid', 'refine' i 'fast_fill' oraz Criminisiego najmniejszego poziomu.
+    patch_size, batch i search_workers trafiają do Criminisiego najmniejszego
+    poziomu; sources - opcjonalna mapa (h, w, 2) pełnej rozdzielczości, w którą
+    jak w criminisi_inpaint wpisywane są źródła pikseli dziury (-1 dla pikseli
+    dopełnionych Teleą).
+    """
+    img_np = np.array(img)
+    target = (np.array(mask) > 0).astype(np.uint8)
+    rng = np.random.default_rng(seed)
+    #===PIRAMIDA===#
+    with stage(tracer, 'pyramid'):
+        levels = [(img_np.astype(np.float32), target)]
+        while max(levels[-1][1].shape) > coarse_size and len(levels) < max_levels:
+            levels.append(downsample(*levels[-1]))
+        forbidden = forbidden_source_map(target.shape, source_region, exclude_region)
+        forbidden_levels = [forbidden]
+        while forbidden is not None and len(forbidden_levels) < len(levels):
+            forbidden_levels.append(downsample_mask(forbidden_levels[-1]))
+    #===NAJMNIEJSZY POZIOM - ZWYKŁY CRIMINISI===#
+    coarse_img, coarse_target = levels[-1]
+    level_sources = np.full(coarse_target.shape + (2,), -1, dtype=np.int32)
+    coarse = np.array(criminisi_inpaint(
+        Image.fromarray(np.clip(np.rint(coarse_img), 0, 255).astype(np.uint8)),
+        Image.fromarray(coarse_target * 255), search=search, seed=seed,
+        max_iterations=None, pyramid=False, sources=level_sources,
+        deadline=deadline, progress=progress, cancel=cancel, workspace=workspace,
+        exclude_region=forbidden_levels[-1] if forbidden is not None else None, tracer=tracer,
+        patch_size=patch_size, batch=batch, search_workers=search_workers))
+    if len(levels) == 1:
+        if sources is not None:
+            hole = target > 0
+            sources[hole] = level_sources[hole]
+        if gradients is not None:
+            x, y, bw, bh = cv.boundingRect(target)
+            gradients.update(coarse, (y, y + bh, x, x + bw))
+        return Image.fromarray(coarse)
+    #===WIĘKSZE POZIOMY - POWIĘKSZENIE I DOPRECYZOWANIE MAPY ŹRÓDEŁ===#
+    for i in range(len(levels) - 2, -1, -1):
+        level_img, level_target = levels[i]
+        check_cancel(cancel)
+        pts = np.argwhere(level_target > 0)
+        src = upsample_sources(level_sources, pts)
+        valid = valid_centre_map(level_target, 2)
+        if forbidden is not None:
+            valid &= valid_centre_map(forbidden_levels[i] & (level_target == 0), 2)
+        if deadline is not None and time.monotonic() >= deadline:
+            #===PO TERMINIE - BEZ DOPRECYZOWANIA, PIKSELE BEZ ŹRÓDŁA DOPEŁNI TELEA===#
+            src[~valid_sources(src, valid)] = -1
+        else:
+            with stage(tracer, 'refine', level=i, pixels=len(pts)):
+                src = refine_sources(level_img.copy(), pts, src, valid, r=2,
+                                     iterations=refine_iterations, rng=rng)
+        level_sources = np.full(level_target.shape + (2,), -1, dtype=np.int32)
+        level_sources[pts[:, 0], pts[:, 1]] = src
+    out = np.array(img_np)
+    ok = src[:, 0] >= 0
+    if sources is not None:
+        sources[pts[:, 0], pts[:, 1]] = np.where(ok[:, None], src, -1)
+    out[pts[ok, 0], pts[ok, 1]] = img_np[src[ok, 0], src[ok, 1]]
+    if not ok.all():
+        rest = np.zeros_like(target)
+        rest[pts[~ok, 0], pts[~ok, 1]] = 1
+        work = out.astype(np.float32)
+        with stage(tracer, 'fast_fill'):
+            fast_fill(work, rest)
+        out = work.astype(np.uint8)
+    if gradients is not None:
+        x, y, bw, bh = cv.boundingRect(target)
+        gradients.update(out, (y, y + bh, x, x + bw))
+    return Image.fromarray(out)
@@ -7,6 +7,10 @@ import socket
 import json
 from typing import List, Dict, Any, Optional
 from PyQt5.QtWidgets import QMessageBox
+from mask_ops import transparent_fill, feathered_fill
+
+#Promień miękkiej krawędzi przy wklejaniu wyniku SD w obszar maski
+SD_FEATHER = 4
 
 
 def send_request(base_url: str, method: str, path: str, json_body: Optional[dict] = None,
@@ -51,127 +55,158 @@ def base64_to_pil(b64str):
     data = base64.b64decode(b64str)
     return Image.open(io.BytesIO(data)).convert("RGB")
 
-def sd_inpaint_with_controlnet(window, image_bytes: bytes = None, mask_bytes: bytes = None):
-    try:
-        #Pobranie parametrów z ustawień
-        # Poniższe do refaktoryzacji mając na uwadze atrybuty klasy głównej main
-        prompt = getattr(window, 'saved_prompt', "usuń obiekt i wypełnij tłem naturalnie")
-        negative_prompt = getattr(window, 'saved_negative_prompt', "niska jakość, rozmycie, artefakty")
-        steps = getattr(window, 'saved_steps', 25)
-        denoising = getattr(window, 'saved_denoising', 0.7)
-        cfg_scale = getattr(window, 'saved_cfg_scale', 7.0)
-        model = getattr(window, 'saved_model', None)
-        preprocessor = getattr(window, 'saved_preprocessor', 'inpaint_only')  #Poprawka: domyślny poprawny module dla Forge
-
+def sd_settings(window):
+    """Ustawienia SD zapisane w oknie (adres, prompt, parametry ControlNet, seed).
+
+    Tylko odczyt atrybutów - tanie, wołane w wątku GUI przed pracą w tle."""
+    #Pobranie parametrów z ustawień
+    # Poniższe do refaktoryzacji mając na uwadze atrybuty klasy głównej main
+    use_random_seed = getattr(window, 'saved_use_random_seed', True)
+    return {
+        "sd_url": getattr(window, 'saved_sd_url', 'http://127.0.0.1:7860'),
+        "prompt": getattr(window, 'saved_prompt', "usuń obiekt i wypełnij tłem naturalnie"),
+        "negative_prompt": getattr(window, 'saved_negative_prompt', "niska jakość, rozmycie, artefakty"),
+        "steps": getattr(window, 'saved_steps', 25),
+        "denoising": getattr(window, 'saved_denoising', 0.7),
+        "cfg_scale": getattr(window, 'saved_cfg_scale', 7.0),
+        "model": getattr(window, 'saved_model', None),
+        "preprocessor": getattr(window, 'saved_preprocessor', 'inpaint_only'),  #Poprawka: domyślny poprawny module dla Forge
         #Parametry ControlNet
-        controlnet_model = getattr(window, 'saved_controlnet_model', None)
-        control_weight = getattr(window, 'saved_control_weight', 1.0)
-        guidance_start = getattr(window, 'saved_guidance_start', 0.0)
-        guidance_end = getattr(window, 'saved_guidance_end', 1.0)
-        processor_res = getattr(window, 'saved_processor_res', 512)
-        threshold_a = getattr(window, 'saved_threshold_a', 64)
-        threshold_b = getattr(window, 'saved_threshold_b', 64)
-        control_mode = getattr(window, 'saved_control_mode', 0)
-        resize_mode = getattr(window, 'saved_resize_mode', 1)
-        pixel_perfect = getattr(window, 'saved_pixel_perfect', False)
-        lowvram = getattr(window, 'saved_lowvram', False)
-
+        "controlnet_model": getattr(window, 'saved_controlnet_model', None),
+        "control_weight": getattr(window, 'saved_control_weight', 1.0),
+        "guidance_start": getattr(window, 'saved_guidance_start', 0.0),
+        "guidance_end": getattr(window, 'saved_guidance_end', 1.0),
+        "processor_res": getattr(window, 'saved_processor_res', 512),
+        "threshold_a": getattr(window, 'saved_threshold_a', 64),
+        "threshold_b": getattr(window, 'saved_threshold_b', 64),
+        "control_mode": getattr(window, 'saved_control_mode', 0),
+        "resize_mode": getattr(window, 'saved_resize_mode', 1),
+        "pixel_perfect": getattr(window, 'saved_pixel_perfect', False),
+        "lowvram": getattr(window, 'saved_lowvram', False),
         #Seed
-        use_random_seed = getattr(window, 'saved_use_random_seed', True)
-        seed = -1 if use_random_seed else getattr(window, 'saved_seed', -1)
+        "seed": -1 if use_random_seed else getattr(window, 'saved_seed', -1),
+    }
 
-        #Konwersja obrazów do base64 (możliwość podania surowych bajtów)
-        if image_bytes is not None:
-            init_b64 = base64.b64encode(image_bytes).decode('utf-8')
-        else:
-            init_b64 = pil_to_base64(window.image)
 
-        if mask_bytes is not None:
-            #mask_bytes powinny być surowymi bajtami obrazu (png/jpg) — prześlij jako base64
-            mask_b64 = base64.b64encode(mask_bytes).decode('utf-8')
-        else:
-            mask_b64 = pil_to_base64(window.mask.convert("L"))
+def build_sd_payload(settings, image, mask, image_bytes: bytes = None, mask_bytes: bytes = None):
+    """Ustawienia + obraz i maska -> (payload img2img, maska do kompozycji wyniku).
 
-        #obraz z kanalem alfa utworzonym z maski
-        if image_bytes is not None:
-            try:
-                init_img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-            except Exception:
-                init_img = window.image.copy().convert("RGBA")
-        else:
-            init_img = window.image.copy().convert("RGBA")
-
-        if mask_bytes is not None:
-            try:
-                mimg = Image.open(io.BytesIO(mask_bytes)).convert("L")
-            except Exception:
-                mimg = window.mask
-        else:
-            mimg = window.mask
-
-        masked_image = init_img.copy()
-        masked_image.putalpha(mimg)
-        masked_b64 = base64.b64encode(io.BytesIO().getbuffer()).decode('utf-8')
-        # masked_b64 musi być zakodowane z masked_image
-        buf = io.BytesIO()
-        masked_image.save(buf, format="PNG")
-        masked_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-
-        #Konfiguracja ControlNet unit
-        controlnet_unit = {
-            "enabled": True,
-            "input_image": masked_b64,
-            "mask": "", 
-            "model": controlnet_model or "control_v11p_sd15_inpaint [ebff9138]",
-            "module": preprocessor,  
-            "weight": control_weight,
-            "resize_mode": resize_mode,
-            "low_vram": lowvram,  #'low_vram' zamiast 'lowvram'
-            "processor_res": processor_res,
-            "threshold_a": threshold_a,
-            "threshold_b": threshold_b,
-            "guidance_start": guidance_start,
-            "guidance_end": guidance_end,
-            "control_mode": control_mode,
-            "pixel_perfect": pixel_perfect,
-            "hr_option": "Both"  #obsługa high-res
-        }
+    Koduje pełny obraz, maskę i wejście ControlNet (PNG + base64) - kosztowne dla
+    dużych zdjęć, więc nie czyta okna i może działać w tle."""
+    #Konwersja obrazów do base64 (możliwość podania surowych bajtów)
+    if image_bytes is not None:
+        init_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    else:
+        init_b64 = pil_to_base64(image)
 
+    if mask_bytes is not None:
+        #mask_bytes powinny być surowymi bajtami obrazu (png/jpg) — prześlij jako base64
+        mask_b64 = base64.b64encode(mask_bytes).decode('utf-8')
+    else:
+        mask_b64 = pil_to_base64(mask.convert("L"))
 
-        sd_url = getattr(window, 'saved_sd_url', 'http://127.0.0.1:7860')
+    #obraz z kanalem alfa utworzonym z maski
+    if image_bytes is not None:
+        try:
+            init_img = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+        except Exception:
+            init_img = image.copy().convert("RGBA")
+    else:
+        init_img = image.copy().convert("RGBA")
 
-        payload = {
-            "init_images": [init_b64],
-            "mask": mask_b64,
-            "inpaint_full_res": True,
-            "inpaint_full_res_padding": 32,
-            "inpainting_mask_invert": 0, 
-            "denoising_strength": denoising,
-            "steps": steps,
-            "cfg_scale": cfg_scale,
-            "sampler_name": "DPM++ 2M Karras", #dodać więcej samplerów
-            "prompt": prompt,
-            "negative_prompt": negative_prompt,
-            "seed": seed,
-            "batch_size": 1,
-            "width": window.image.width,
-            "height": window.image.height,
-            "alwayson_scripts": {"ControlNet": {"args": [controlnet_unit]}}
-        }
+    if mask_bytes is not None:
+        try:
+            mimg = Image.open(io.BytesIO(mask_bytes)).convert("L")
+        except Exception:
+            mimg = mask
+    else:
+        mimg = mask
 
-        if model:
-            payload["override_settings"] = {"sd_model_checkpoint": model} 
+    masked_image = transparent_fill(init_img, mimg, inside=255, outside=0)
+    # masked_b64 musi być zakodowane z masked_image
+    buf = io.BytesIO()
+    masked_image.save(buf, format="PNG")
+    masked_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+
+    #Konfiguracja ControlNet unit
+    controlnet_unit = {
+        "enabled": True,
+        "input_image": masked_b64,
+        "mask": "", 
+        "model": settings["controlnet_model"] or "control_v11p_sd15_inpaint [ebff9138]",
+        "module": settings["preprocessor"],  
+        "weight": settings["control_weight"],
+        "resize_mode": settings["resize_mode"],
+        "low_vram": settings["lowvram"],  #'low_vram' zamiast 'lowvram'
+        "processor_res": settings["processor_res"],
+        "threshold_a": settings["threshold_a"],
+        "threshold_b": settings["threshold_b"],
+        "guidance_start": settings["guidance_start"],
+        "guidance_end": settings["guidance_end"],
+        "control_mode": settings["control_mode"],
+        "pixel_perfect": settings["pixel_perfect"],
+        "hr_option": "Both"  #obsługa high-res
+    }
+
+    payload = {
+        "init_images": [init_b64],
+        "mask": mask_b64,
+        "inpaint_full_res": True,
+        "inpaint_full_res_padding": 32,
+        "inpainting_mask_invert": 0, 
+        "denoising_strength": settings["denoising"],
+        "steps": settings["steps"],
+        "cfg_scale": settings["cfg_scale"],
+        "sampler_name": "DPM++ 2M Karras", #dodać więcej samplerów
+        "prompt": settings["prompt"],
+        "negative_prompt": settings["negative_prompt"],
+        "seed": settings["seed"],
+        "batch_size": 1,
+        "width": image.width,
+        "height": image.height,
+        "alwayson_scripts": {"ControlNet": {"args": [controlnet_unit]}}
+    }
+
+    if settings["model"]:
+        payload["override_settings"] = {"sd_model_checkpoint": settings["model"]} 
+
+    ###############BEGGUING USUNĄC!
+    #Wysłanie żądania z loggingiem
+    #print("Payload wysłany do SD Forge:", json.dumps(payload, indent=2))  #debugging
+
+    return payload, mimg
+
+
+def prepare_sd_inpaint(window, image_bytes: bytes = None, mask_bytes: bytes = None):
+    """Parametry z ustawień okna -> (adres SD, payload img2img, maska do kompozycji wyniku).
+
+    Wersja synchroniczna (sd_settings + build_sd_payload); samo żądanie robi run_sd_inpaint."""
+    settings = sd_settings(window)
+    payload, mimg = build_sd_payload(settings, window.image, window.mask, image_bytes, mask_bytes)
+    return settings["sd_url"], payload, mimg
+
+
+def run_sd_inpaint(sd_url, payload, image, mimg):
+    """Wysyła payload do img2img i zwraca wynik wklejony w obszar maski mimg obrazu image
+    (None, gdy SD nie zwróciło obrazu). Nie dotyka GUI - może działać w tle."""
+    result = send_request(sd_url, 'POST', '/sdapi/v1/img2img', json_body=payload, timeout=600)
+    if not ("images" in result and result["images"]):
+        return None
+    out_img = base64_to_pil(result["images"][0])
+    if out_img.size != image.size:
+        out_img = out_img.resize(image.size, Image.Resampling.LANCZOS)
+    #Wynik SD tylko w obszarze maski, z miękką krawędzią - reszta zdjęcia bez zmian
+    if mimg.size != image.size:
+        mimg = mimg.resize(image.size, Image.Resampling.NEAREST)
+    return feathered_fill(image, out_img, mimg, SD_FEATHER)
 
-        ###############BEGGUING USUNĄC!
-        #Wysłanie żądania z loggingiem
-        #print("Payload wysłany do SD Forge:", json.dumps(payload, indent=2))  #debugging
 
-        result = send_request(sd_url, 'POST', '/sdapi/v1/img2img', json_body=payload, timeout=600)
+def sd_inpaint_with_controlnet(window, image_bytes: bytes = None, mask_bytes: bytes = None):
+    try:
+        sd_url, payload, mimg = prepare_sd_inpaint(window, image_bytes, mask_bytes)
+        out_img = run_sd_inpaint(sd_url, payload, window.image, mimg)
 
-        if "images" in result and result["images"]:
-            out_img = base64_to_pil(result["images"][0])
-            if out_img.size != window.image.size:
-                out_img = out_img.resize(window.image.size, Image.Resampling.LANCZOS)
+        if out_img is not None:
             window.image = out_img
             window.mask = Image.new("L", window.image.size, 0)
             #Aktualizacja wyświetlania
@@ -0,0 +1,155 @@
+import atexit
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+#===WIELOPROCESOWE WYSZUKIWANIE PATCHA DLA JEDNEJ DUŻEJ DZIURY===#
+
+
+def _worker(conn):
+    #===PROCES ROBOCZY: trzyma podpięte bloki pamięci współdzielonej między zapytaniami===#
+    from criminisi import search_window
+    blocks = []
+    work = valid = None
+    while True:
+        msg = conn.recv()
+        if msg[0] == 'attach':
+            _, (work_name, work_shape), (valid_name, valid_shape) = msg
+            work = valid = None
+            for block in blocks:
+                block.close()
+            blocks = [shared_memory.SharedMemory(name=work_name),
+                      shared_memory.SharedMemory(name=valid_name)]
+            work = np.ndarray(work_shape, dtype=np.float32, buffer=blocks[0].buf)
+            valid = np.ndarray(valid_shape, dtype=np.bool_, buffer=blocks[1].buf)
+            conn.send(True)
+        elif msg[0] == 'search':
+            _, templ, known, bounds = msg
+            conn.send(search_window(work, valid, templ, known, *bounds))
+        else:
+            break
+    work = valid = None
+    for block in blocks:
+        block.close()
+    conn.close()
+
+
+class StripeSearchPool:
+    """Stałe procesy robocze oceniające pasy okna wyszukiwania.
+
+    bind() kopiuje bufor roboczy obrazu i mapę poprawnych środków do
+    multiprocessing.shared_memory i zwraca tablice na nich oparte - wywołujący
+    dalej modyfikuje je w miejscu, więc procesy widzą każdą zmianę bez
+    przesyłania obrazu. search() dzieli wiersze środków na pasy, rozsyła
+    tylko szablon i zakres, a na końcu wybiera globalne minimum SSD.
+    Procesy żyją między iteracjami i wywołaniami; z puli korzysta naraz
+    jedno wypełnianie (lock). Procesy są uruchamiane przez spawn - fork
+    wielowątkowego procesu Qt kopiowałby zajęte blokady innych wątków.
+    """
+
+    def __init__(self, workers):
+        #===spawn przekazuje procesom resource_tracker rodzica, więc bloki sprząta jeden proces===#
+        ctx = mp.get_context('spawn')
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.conns = []
+        self.procs = []
+        for _ in range(workers):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_worker, args=(child,), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+        self.blocks = []
+        self.shapes = None
+        self.work = None
+        self.valid = None
+
+    def bind(self, work, valid):
+        """Zwraca (work, valid) w pamięci współdzielonej z zawartością argumentów."""
+        shapes = (work.shape, valid.shape)
+        if shapes != self.shapes:
+            old = self.blocks
+            self.work = self.valid = None
+            self.blocks = [shared_memory.SharedMemory(create=True, size=max(1, work.size * 4)),
+                           shared_memory.SharedMemory(create=True, size=max(1, valid.size))]
+            msg = ('attach', (self.blocks[0].name, work.shape), (self.blocks[1].name, valid.shape))
+            for conn in self.conns:
+                conn.send(msg)
+            for conn in self.conns:
+                conn.recv()
+            for block in old:
+                block.close()
+                block.unlink()
+            self.shapes = shapes
+            self.work = np.ndarray(work.shape, dtype=np.float32, buffer=self.blocks[0].buf)
+            self.valid = np.ndarray(valid.shape, dtype=np.bool_, buffer=self.blocks[1].buf)
+        self.work[:] = work
+        self.valid[:] = valid
+        return self.work, self.valid
+
+    def search(self, templ, known, bounds):
+        """Najlepszy środek w zakresie bounds=(cy0, cy1, cx0, cx1) albo None."""
+        cy0, cy1, cx0, cx1 = bounds
+        if cy0 > cy1 or cx0 > cx1:
+            return None
+        edges = np.linspace(cy0, cy1 + 1, len(self.conns) + 1).astype(int)
+        used = []
+        for conn, a, b in zip(self.conns, edges[:-1], edges[1:]):
+            if a < b:
+                conn.send(('search', templ, known, (int(a), int(b) - 1, cx0, cx1)))
+                used.append(conn)
+        results = [conn.recv() for conn in used]
+        best_ssd, best_q = min(results, key=lambda res: res[0])
+        return best_q
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=1)
+        self.work = self.valid = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        self.shapes = None
+
+
+_pool = None
+_retired = []
+_pools_lock = threading.Lock()
+
+
+def acquire_search_pool(workers):
+    """Wspólna, ciepła pula procesów z już zajętym lock albo None, gdy jest zajęta.
+
+    Pula jest tworzona ponownie tylko przy zmianie liczby procesów. Poprzednia
+    jest zamykana dopiero, gdy nie korzysta z niej żadne wypełnianie - zajęta
+    czeka na liście wycofanych, bo close() usuwa jej pamięć współdzieloną.
+    Wywołujący zwalnia pool.lock po zakończeniu wypełniania.
+    """
+    global _pool
+    with _pools_lock:
+        for old in list(_retired):
+            if old.lock.acquire(blocking=False):
+                _retired.remove(old)
+                old.close()
+        if _pool is None or _pool.workers != workers:
+            if _pool is not None:
+                _retired.append(_pool)
+            _pool = StripeSearchPool(workers)
+        return _pool if _pool.lock.acquire(blocking=False) else None
+
+
+@atexit.register
+def _close_pools():
+    with _pools_lock:
+        for pool in _retired + ([_pool] if _pool is not None else []):
+            pool.close()
+        _retired.clear()
@@ -383,6 +383,11 @@ def open_settings(self):
     self.timestamp_cb = QCheckBox("Dodaj timestamp do nazwy pliku")
     self.timestamp_cb.setChecked(getattr(self, 'saved_save_with_timestamp', False))
     other_layout.addWidget(self.timestamp_cb)
+
+    #biblioteka wzorców dla Criminisiego (katalog z exemplar_library.py, puste = bez biblioteki)
+    self.library_edit = QLineEdit(getattr(self, 'saved_library_path', ""))
+    other_layout.addWidget(QLabel("Biblioteka wzorców (katalog):"))
+    other_layout.addWidget(self.library_edit)
     
     other_group.setLayout(other_layout)
     form.addRow(other_group)
@@ -472,6 +477,13 @@ def save_settings(self, dialog):
         #unne
         self.saved_save_with_timestamp = self.timestamp_cb.isChecked()
         self.saved_sd_url = self.sd_url_edit.text().strip()
+
+        #biblioteka wzorców - otwierana tylko przy zmianie ścieżki
+        library_path = self.library_edit.text().strip()
+        if library_path != getattr(self, 'saved_library_path', ""):
+            from exemplar_library import ExemplarLibrary
+            self.exemplar_library = ExemplarLibrary(library_path) if library_path else None
+            self.saved_library_path = library_path
         
         QMessageBox.information(dialog, "OK", "Ustawienia zapisane!")
         dialog.accept()
@@ -1,6 +1,7 @@
 SHORTCUTS = {
     "Ctrl+O": "open_image",
     "Ctrl+E": "erase_selection",
+    "Esc": "cancel_inpaint",
     "Ctrl+S": "save_image",
     "Ctrl+R": "reset_selection",
     "Ctrl+Z": "undo",
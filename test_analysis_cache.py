@@ -0,0 +1,101 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from analysis_cache import ImageAnalysis
+from helpers import telea_inpaint
+from test_criminisi import make_test_image
+
+
+class ImageAnalysisTests(unittest.TestCase):
+    def setUp(self):
+        self.img = Image.fromarray(make_test_image(60, 80))
+        self.mask = np.zeros((60, 80), np.uint8)
+        self.mask[20:35, 30:45] = 255
+
+    def test_update_matches_fresh_analysis(self):
+        analysis = ImageAnalysis(self.img)
+        valid = criminisi.valid_centre_map(self.mask, 3)
+        index = analysis.patch_index(3, valid)
+        filled = telea_inpaint(self.img.copy(), Image.fromarray(self.mask), analysis=analysis)
+        self.assertFalse(analysis.matches(filled))
+        analysis.update(filled, (20, 35, 30, 45))
+        self.assertTrue(analysis.matches(filled))
+        fresh = ImageAnalysis(filled)
+        np.testing.assert_array_equal(analysis.array, fresh.array)
+        np.testing.assert_allclose(analysis.gradients.gx, fresh.gradients.gx, atol=1e-3)
+        #===żywe wpisy indeksu opisują aktualne piksele===#
+        centres = np.concatenate([index.centres[index.alive], index.pending_centres])
+        descriptors = np.concatenate([index.descriptors[index.alive], index.pending])
+        np.testing.assert_allclose(descriptors, index.describe(fresh.array, centres), atol=1e-3)
+        self.assertTrue(index.indexed[26, 36])
+
+    def test_telea_roi_matches_full_frame(self):
+        analysis = ImageAnalysis(self.img)
+        mask = Image.fromarray(self.mask)
+        full = np.array(telea_inpaint(self.img.copy(), mask))
+        roi = np.array(telea_inpaint(self.img.copy(), mask, analysis=analysis))
+        np.testing.assert_array_equal(roi, full)
+
+    def test_criminisi_reuses_analysis(self):
+        analysis = ImageAnalysis(self.img)
+        mask = Image.fromarray(self.mask)
+        expected = np.array(criminisi.criminisi_inpaint(self.img, mask, search='index'))
+        out = np.array(criminisi.criminisi_inpaint(self.img, mask, search='index', analysis=analysis))
+        np.testing.assert_array_equal(out, expected)
+        self.assertEqual(len(analysis.indexes), 1)
+
+    def test_cached_index_ignores_first_fill_restrictions(self):
+        analysis = ImageAnalysis(self.img)
+        mask = Image.fromarray(self.mask)
+        exclude = np.zeros((60, 80), np.uint8)
+        exclude[:, :25] = 255
+        criminisi.criminisi_inpaint(self.img, mask, search='index', analysis=analysis,
+                                    exclude_region=exclude)
+        (index,) = analysis.indexes.values()
+        #===środki w obszarze wykluczonym przy pierwszym usunięciu też są w indeksie===#
+        start = index.r + index.r % 2
+        self.assertTrue(index.indexed[start:60 - index.r:2, start:25 - index.r:2].all())
+        centres = np.concatenate([index.centres[index.alive], index.pending_centres])
+        self.assertTrue((centres[:, 1] < 25).any())
+
+    def test_cancelled_fill_leaves_analysis_of_source_image(self):
+        import threading
+        from criminisi import InpaintCancelled
+        from gradients import GradientCache
+        from patchmatch import patchmatch_inpaint
+        for search in ('patchmatch', 'index'):
+            analysis = ImageAnalysis(self.img)
+            mask = Image.fromarray(self.mask)
+            cancel = threading.Event()
+            calls = []
+
+            def progress(remaining, total):
+                calls.append(remaining)
+                cancel.set()
+            with self.assertRaises(InpaintCancelled):
+                if search == 'patchmatch':
+                    patchmatch_inpaint(self.img, mask, analysis=analysis, progress=progress, cancel=cancel)
+                else:
+                    criminisi.criminisi_inpaint(self.img, mask, search='index', analysis=analysis,
+                                                progress=progress, cancel=cancel)
+            self.assertTrue(calls)
+            self.assertTrue(analysis.matches(self.img))
+            np.testing.assert_array_equal(analysis.array, np.array(self.img))
+            fresh = GradientCache(np.array(self.img))
+            np.testing.assert_allclose(analysis.gradients.gx, fresh.gx, atol=1e-3)
+            np.testing.assert_allclose(analysis.gradients.gy, fresh.gy, atol=1e-3)
+            for index in analysis.indexes.values():
+                centres = np.concatenate([index.centres[index.alive], index.pending_centres])
+                descriptors = np.concatenate([index.descriptors[index.alive], index.pending])
+                np.testing.assert_allclose(descriptors, index.describe(analysis.array, centres), atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
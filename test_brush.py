@@ -0,0 +1,89 @@
+import os
+import math
+import time
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+import cv2 as cv
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from test_criminisi import make_test_image
+
+app = QApplication.instance() or QApplication([])
+
+
+def stamped_stroke(size, points, r):
+    #===dawne rysowanie: koło co piksel drogi między kolejnymi punktami===#
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    (x, y) = points[0]
+    draw.ellipse((x-r, y-r, x+r, y+r), fill=255)
+    for (px, py), (x, y) in zip(points, points[1:]):
+        dx, dy = x - px, y - py
+        steps = max(int(math.hypot(dx, dy)), 1)
+        for i in range(steps + 1):
+            t = i / steps
+            ix, iy = px + dx * t, py + dy * t
+            draw.ellipse((ix-r, iy-r, ix+r, iy+r), fill=255)
+    return np.array(mask) > 0
+
+
+class BrushStrokeTests(unittest.TestCase):
+    def setUp(self):
+        import main
+        self.window = main.LassoEraser()
+        self.window.image = Image.fromarray(make_test_image(300, 400))
+        self.window.mask = Image.new("L", self.window.image.size, 0)
+        self.window.tool_combo.setCurrentIndex(self.window.tool_combo.findData(1))
+
+    def test_capsules_match_stamped_circles(self):
+        import helpers
+        w = self.window
+        rng = np.random.default_rng(0)
+        kernel = np.ones((3, 3), np.uint8)
+        for size in (3, 6, 11, 40):
+            w.brush_slider.setValue(size)
+            points = [tuple(p) for p in rng.uniform(30, 370, (8, 2)) * (1, 0.7)]
+            w.mask = Image.new("L", w.image.size, 0)
+            w.last_brush_pos = None
+            for x, y in points:
+                helpers.update_brush_mask(w, x, y)
+            old = stamped_stroke(w.image.size, points, size // 2)
+            new = np.array(w.mask) > 0
+            #===różnice tylko na brzegu pociągnięcia (najwyżej 1 piksel)===#
+            self.assertFalse((old & ~cv.dilate(new.astype(np.uint8), kernel).astype(bool)).any())
+            self.assertFalse((new & ~cv.dilate(old.astype(np.uint8), kernel).astype(bool)).any())
+            if size >= 6: #===przy 3 px cały ślad jest brzegiem===#
+                self.assertLess((old ^ new).sum(), 0.1 * old.sum())
+            self.assertEqual(helpers.selection_state(w).count, int(new.sum()))
+
+    def test_moves_within_frame_are_drawn_once(self):
+        import helpers
+        w = self.window
+        helpers.draw_image(w)
+        calls = []
+        refresh = w.overlay_item.refresh
+        w.overlay_item.refresh = lambda masks, rect=None: (calls.append(rect), refresh(masks, rect))
+        w.last_brush_pos = (50, 50)
+        for x in range(60, 300, 10):
+            helpers.queue_brush_point(w, x, 50)
+        self.assertEqual(calls, [])
+        self.assertTrue(w.brush_timer.isActive())
+        end = time.monotonic() + 5
+        while not calls and time.monotonic() < end:
+            app.processEvents()
+            time.sleep(0.002)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(w.pending_brush_points, [])
+        self.assertEqual(w.last_brush_pos, (290, 50))
+        self.assertTrue((np.array(w.mask)[50, 50:291] == 255).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,403 @@
+import threading
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from gradients import GradientCache
+
+
+def make_test_image(h=60, w=80, seed=0):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.stack([(xx * 3) % 255, (yy * 2) % 255, (xx + yy) % 255], axis=2)
+    img = img + rng.integers(0, 20, img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def brute_force_search(work, target, templ, known, r):
+    h, w = target.shape
+    best, best_ssd = None, np.inf
+    for qy in range(r, h - r):
+        for qx in range(r, w - r):
+            if target[qy - r:qy + r + 1, qx - r:qx + r + 1].any():
+                continue
+            diff = (work[qy - r:qy + r + 1, qx - r:qx + r + 1] - templ) * known[:, :, np.newaxis]
+            ssd = np.sum(diff ** 2)
+            if ssd < best_ssd:
+                best_ssd, best = ssd, (qy, qx)
+    return best
+
+
+class SearchEngineTests(unittest.TestCase):
+    def test_valid_centre_map_matches_brute_force(self):
+        rng = np.random.default_rng(3)
+        target = (rng.random((30, 40)) < 0.03).astype(np.uint8)
+        valid = criminisi.valid_centre_map(target, 2)
+        for y in range(30):
+            for x in range(40):
+                inside = 2 <= y < 28 and 2 <= x < 38
+                expected = inside and not target[y - 2:y + 3, x - 2:x + 3].any()
+                self.assertEqual(valid[y, x], expected)
+
+    def test_valid_centre_map_local_update(self):
+        target = np.zeros((30, 40), np.uint8)
+        valid = criminisi.valid_centre_map(target, 2)
+        target[10:12, 15:18] = 1
+        criminisi.valid_centre_map(target, 2, (10, 12, 15, 18), valid)
+        np.testing.assert_array_equal(valid, criminisi.valid_centre_map(target, 2))
+
+    def test_exact_search_matches_brute_force(self):
+        work = make_test_image(40, 50).astype(np.float32)
+        target = np.zeros((40, 50), np.uint8)
+        target[15:22, 20:28] = 1
+        r = 3
+        valid = criminisi.valid_centre_map(target, r)
+        for y, x in [(14, 19), (22, 28), (0, 0)]:
+            templ, known = criminisi.extract_template(work, target, y, x, r)
+            q = criminisi.exact_search(work, valid, templ, known, y, x, None)
+            self.assertEqual(q, brute_force_search(work, target, templ, known, r))
+
+
+class PriorityTests(unittest.TestCase):
+    def reference_priority(self, y, x, confidence, target, gx, gy, nx, ny, r, alpha):
+        h, w = target.shape
+        ys = slice(max(0, y - r), min(h, y + r + 1))
+        xs = slice(max(0, x - r), min(w, x + r + 1))
+        c = np.mean(confidence[ys, xs])
+        known = 1 - target[ys, xs]
+        mag = np.sqrt(gx[ys, xs] ** 2 + gy[ys, xs] ** 2) * known
+        if np.max(mag) <= 0:
+            return c * 0.1 + 0.001
+        iy, ix = np.unravel_index(np.argmax(mag), mag.shape)
+        gy_loc, gx_loc = ys.start + iy, xs.start + ix
+        m = np.sqrt(gx[gy_loc, gx_loc] ** 2 + gy[gy_loc, gx_loc] ** 2) + 1e-6
+        iso_y, iso_x = -gx[gy_loc, gx_loc] / m, gy[gy_loc, gx_loc] / m
+        return c * abs(iso_x * ny[y, x] + iso_y * nx[y, x]) / alpha + 0.001
+
+    def test_vectorized_priorities_match_per_point_loop(self):
+        rng = np.random.default_rng(5)
+        target = np.zeros((30, 40), np.uint8)
+        target[8:20, 10:25] = 1
+        confidence = (1 - target).astype(np.float32) * rng.random((30, 40)).astype(np.float32)
+        gx, gy, nx, ny = (rng.standard_normal((30, 40)).astype(np.float32) for _ in range(4))
+        front = np.array([[7, 9], [20, 25], [0, 0], [29, 39], [12, 9]])
+        p = criminisi.compute_priorities(front, confidence, target, gx, gy, nx, ny, 4)
+        for i, (y, x) in enumerate(front):
+            expected = self.reference_priority(y, x, confidence, target, gx, gy, nx, ny, 4, 255.0)
+            self.assertAlmostEqual(p[i], expected, places=5)
+
+
+class FillFrontTests(unittest.TestCase):
+    def test_local_update_matches_full_rebuild(self):
+        work = make_test_image(40, 50).astype(np.float32)
+        target = np.zeros((40, 50), np.uint8)
+        target[12:25, 15:30] = 1
+        confidence = (1 - target).astype(np.float32)
+        gray = np.mean(work, axis=2)
+        gx = criminisi.ndimage.sobel(gray, axis=1)
+        gy = criminisi.ndimage.sobel(gray, axis=0)
+        front = criminisi.FillFront(target, confidence, gx, gy, 3)
+        y, x = front.pop()
+        self.assertEqual(front.priority[y, x], front.priority.max())
+        changed, filled = criminisi.copy_patch(work, target, confidence, y, x, (5, 5), 3, 1.0)
+        self.assertGreater(filled, 0)
+        front.update(changed)
+        fresh = criminisi.FillFront(target.copy(), confidence, gx, gy, 3)
+        np.testing.assert_array_equal(front.front_mask, fresh.front_mask)
+        np.testing.assert_allclose(front.nx, fresh.nx, atol=1e-6)
+        np.testing.assert_allclose(front.priority, fresh.priority, atol=1e-6)
+        y, x = front.pop()
+        self.assertEqual(front.priority[y, x], fresh.priority.max())
+        self.assertEqual(front.size, int(np.count_nonzero(fresh.front_mask)))
+
+    def test_pop_batch_returns_non_overlapping_top_points(self):
+        work = make_test_image(60, 80).astype(np.float32)
+        target = np.zeros((60, 80), np.uint8)
+        target[10:50, 15:65] = 1
+        confidence = (1 - target).astype(np.float32)
+        gray = np.mean(work, axis=2)
+        gx = criminisi.ndimage.sobel(gray, axis=1)
+        gy = criminisi.ndimage.sobel(gray, axis=0)
+        front = criminisi.FillFront(target, confidence, gx, gy, 3)
+        top = front.priority.max()
+        points = front.pop_batch(4, 7)
+        self.assertEqual(len(points), 4)
+        self.assertEqual(front.priority[points[0]], top)
+        for i, (y, x) in enumerate(points):
+            for py, px in points[:i]:
+                self.assertGreaterEqual(max(abs(y - py), abs(x - px)), 7)
+        #===pominięte punkty wróciły do kopca===#
+        self.assertNotIn(front.pop(), points)
+
+    def test_long_front_updates_without_full_rebuilds(self):
+        #===front ~5000 pikseli: lokalne aktualizacje nie przebudowują kopca z całego obrazu===#
+        h, w = 1300, 1300
+        work = np.zeros((h, w, 3), np.float32)
+        target = np.zeros((h, w), np.uint8)
+        target[50:1250, 50:1250] = 1
+        confidence = (1 - target).astype(np.float32)
+        gx = gy = np.zeros((h, w), np.float32)
+        front = criminisi.FillFront(target, confidence, gx, gy, 4)
+        self.assertGreater(front.size, 4000)
+        for _ in range(40):
+            y, x = front.pop()
+            changed, _ = criminisi.copy_patch(work, target, confidence, y, x, (10, 10), 4, 1.0)
+            front.update(changed)
+        self.assertEqual(front.rebuilds, 1)
+        self.assertLess(len(front.heap) - front.size, 2 * front.size + 1024 + 200)
+        self.assertEqual(front.size, int(np.count_nonzero(front.front_mask)))
+
+
+class CriminisiInpaintTests(unittest.TestCase):
+    def test_fills_mask_and_keeps_known_pixels(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        self.assertEqual(out.shape, img.shape)
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+        #===Criminisi tylko kopiuje piksele, więc każdy wypełniony kolor pochodzi ze źródła===#
+        known_colors = {tuple(c) for c in img[mask == 0]}
+        for c in out[mask > 0]:
+            self.assertIn(tuple(c), known_colors)
+
+    def test_shared_gradient_cache_describes_result(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        cache = GradientCache(img)
+        out = criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask), gradients=cache)
+        fresh = GradientCache(np.array(out))
+        np.testing.assert_allclose(cache.gx, fresh.gx, atol=1e-3)
+        np.testing.assert_allclose(cache.gy, fresh.gy, atol=1e-3)
+
+    def test_batched_fill_uses_fewer_iterations(self):
+        img = make_test_image(90, 120)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[25:65, 35:85] = 255
+        calls = {1: 0, 8: 0}
+        for batch in calls:
+            def progress(remaining, total, batch=batch):
+                calls[batch] += 1
+            out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                       max_iterations=None, batch=batch,
+                                                       progress=progress))
+            np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+            known_colors = {tuple(c) for c in img[mask == 0]}
+            self.assertTrue(all(tuple(c) in known_colors for c in out[mask > 0]))
+        self.assertLess(calls[8] * 2, calls[1])
+
+    def test_search_workers_match_local_search(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        local = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        pooled = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                      search_workers=2))
+        np.testing.assert_array_equal(local, pooled)
+
+    def test_busy_search_pool_survives_worker_count_change(self):
+        import search_pool
+        busy = search_pool.acquire_search_pool(2)
+        self.assertEqual(busy.procs[0]._popen.method, 'spawn')
+        try:
+            work, valid = busy.bind(np.ones((8, 8, 3), np.float32), np.ones((8, 8), bool))
+            self.assertIsNone(search_pool.acquire_search_pool(2))
+            other = search_pool.acquire_search_pool(3)
+            self.assertIsNot(other, busy)
+            other.lock.release()
+            #===zajęta pula nie jest zamykana - jej pamięć współdzielona dalej działa===#
+            self.assertTrue(all(proc.is_alive() for proc in busy.procs))
+            self.assertEqual(busy.search(work[:3, :3].copy(), np.ones((3, 3), np.float32), (1, 6, 1, 6)), (1, 1))
+        finally:
+            busy.lock.release()
+        search_pool.acquire_search_pool(2).lock.release()
+        self.assertNotIn(busy, search_pool._retired)
+        self.assertEqual(busy.blocks, [])
+
+
+class PatchSizeTests(unittest.TestCase):
+    def setUp(self):
+        self.mask = np.zeros((60, 80), np.uint8)
+        self.mask[20:40, 30:50] = 255
+
+    def test_flat_background_gets_large_patch(self):
+        rng = np.random.default_rng(0)
+        flat = (np.full((60, 80, 3), 140.0) + rng.normal(0, 1, (60, 80, 3))).astype(np.uint8)
+        self.assertGreater(criminisi.choose_patch_size(flat, self.mask), 9)
+
+    def test_edges_get_small_patch(self):
+        yy, xx = np.mgrid[0:60, 0:80]
+        stripes = np.repeat(((xx // 6) % 2 * 200 + 20)[..., None], 3, axis=2).astype(np.uint8)
+        self.assertLess(criminisi.choose_patch_size(stripes, self.mask), 9)
+
+    def test_patch_fits_known_region(self):
+        mask = np.zeros((30, 30), np.uint8)
+        mask[5:25, 5:25] = 255
+        size = criminisi.choose_patch_size(np.zeros((30, 30, 3), np.uint8), mask)
+        self.assertTrue(criminisi.valid_centre_map(mask, size // 2).any())
+
+    def test_explicit_patch_size_overrides_choice(self):
+        img = make_test_image()
+        counts = {}
+        for size in (5, 13):
+            calls = []
+            criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(self.mask),
+                                        patch_size=size, progress=lambda *a: calls.append(a))
+            counts[size] = len(calls)
+        self.assertGreater(counts[5], counts[13])
+
+
+class SourceRegionTests(unittest.TestCase):
+    def setUp(self):
+        self.img = make_test_image()
+        self.mask = np.zeros(self.img.shape[:2], np.uint8)
+        self.mask[20:35, 30:45] = 255
+
+    def fill_sources(self, **kwargs):
+        sources = np.full(self.img.shape[:2] + (2,), -1, np.int32)
+        criminisi.criminisi_inpaint(Image.fromarray(self.img), Image.fromarray(self.mask),
+                                    max_iterations=None, patch_size=7, sources=sources, **kwargs)
+        src = sources[self.mask > 0]
+        self.assertTrue((src >= 0).all())
+        return src
+
+    def test_sources_stay_inside_source_region(self):
+        band = np.zeros_like(self.mask)
+        band[10:45, 20:55] = 255
+        src = self.fill_sources(source_region=band)
+        self.assertTrue((band[src[:, 0], src[:, 1]] > 0).all())
+
+    def test_excluded_region_is_never_copied(self):
+        logo = np.zeros_like(self.mask)
+        logo[:, 45:] = 255
+        src = self.fill_sources(exclude_region=Image.fromarray(logo))
+        self.assertFalse((logo[src[:, 0], src[:, 1]] > 0).any())
+
+    def test_allowed_centres_bound_the_valid_map(self):
+        band = np.zeros_like(self.mask)
+        band[10:45, 20:55] = 255
+        forbidden = criminisi.forbidden_source_map(self.mask.shape, source_region=band)
+        ws = criminisi.CriminisiWorkspace().load(self.img, self.mask, 3, forbidden)
+        self.assertFalse((ws.valid & ~ws.allowed).any())
+        cy0, cy1, cx0, cx1 = ws.source_bounds
+        self.assertEqual((cy0, cy1, cx0, cx1), (13, 41, 23, 51))
+        ws.copy(20, 30, (15, 25), 1.0)
+        self.assertFalse((ws.valid & ~ws.allowed).any())
+
+
+class WorkspaceTests(unittest.TestCase):
+    def test_reused_workspace_gives_same_result_without_reallocating(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        expected = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        ws = criminisi.CriminisiWorkspace()
+        small = Image.fromarray(img[:40, :50])
+        criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask), workspace=ws)
+        buffers = {name: buf.ctypes.data for name, buf in ws._storage.items()}
+        criminisi.criminisi_inpaint(small, Image.fromarray(mask[:40, :50]), workspace=ws)
+        out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                   workspace=ws))
+        np.testing.assert_array_equal(out, expected)
+        self.assertEqual({name: buf.ctypes.data for name, buf in ws._storage.items()}, buffers)
+
+    def test_search_scores_reuse_workspace_buffers(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        ws = criminisi.CriminisiWorkspace().load(img, mask, r=4)
+        templ, known = ws.template(20, 30)
+        bounds = criminisi.search_bounds(ws.shape, 4, 20, 30, 15)
+        self.assertEqual(ws.search_window(templ, known, *bounds),
+                         criminisi.search_window(ws.features, ws.valid, templ, known, *bounds))
+        ssd = criminisi.masked_ssd_map(ws.features, templ, known, scores=ws.scores)
+        self.assertTrue(np.shares_memory(ssd, ws.scores[0]))
+        np.testing.assert_allclose(ssd, criminisi.masked_ssd_map(ws.features, templ, known), rtol=1e-5)
+
+    def test_local_updates_keep_buffers_consistent(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        ws = criminisi.CriminisiWorkspace(color='lab').load(img, mask)
+        ws.copy(20, 30, (10, 10), 1.0)
+        lab = criminisi.cv.cvtColor(ws.image / 255.0, criminisi.cv.COLOR_RGB2Lab).astype(np.float32)
+        np.testing.assert_allclose(ws.features, lab, atol=1e-3)
+        np.testing.assert_allclose(ws.sq, np.einsum('ijc,ijc->ij', ws.features, ws.features), rtol=1e-5)
+        np.testing.assert_array_equal(ws.valid, criminisi.valid_centre_map(ws.target, ws.r))
+
+    def test_lab_workspace_copies_original_pixels(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                   workspace=criminisi.CriminisiWorkspace(color='lab')))
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+        known_colors = {tuple(c) for c in img[mask == 0]}
+        self.assertTrue(all(tuple(c) in known_colors for c in out[mask > 0]))
+
+    def test_paste_keeps_feature_space_of_separate_buffer(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        patch = make_test_image(7, 7, seed=3).astype(np.float32)
+        for color in ('rgb', 'lab'):
+            ws = criminisi.CriminisiWorkspace(color=color).load(img, mask, 3)
+            #===jak po bind() puli wyszukiwania: cechy w osobnym buforze===#
+            ws.features = ws.features.copy()
+            ws.paste(20, 30, patch, 1.0)
+            feats = ws.features[17:24, 27:34]
+            expected = ws.image[17:24, 27:34]
+            if color == 'lab':
+                expected = criminisi.cv.cvtColor(expected * (1.0 / 255.0), criminisi.cv.COLOR_RGB2Lab)
+            np.testing.assert_allclose(feats, expected, atol=1e-3)
+
+
+class AnytimeTests(unittest.TestCase):
+    def setUp(self):
+        self.img = make_test_image()
+        self.img[..., 1] = np.minimum(self.img[..., 1], 200)
+        self.mask = np.zeros(self.img.shape[:2], np.uint8)
+        self.mask[20:40, 25:50] = 255
+        #===obiekt do usunięcia w kolorze, którego nie ma w tle===#
+        self.img[self.mask > 0] = (0, 255, 0)
+
+    def run_fill(self, **kwargs):
+        return np.array(criminisi.criminisi_inpaint(
+            Image.fromarray(self.img), Image.fromarray(self.mask), pyramid=False, **kwargs))
+
+    def assert_no_object_left(self, out):
+        self.assertFalse(np.all(out == (0, 255, 0), axis=2).any())
+
+    def test_iteration_cap_falls_back_instead_of_leaving_holes(self):
+        self.assert_no_object_left(self.run_fill(max_iterations=3))
+
+    def test_zero_time_budget_uses_fast_fill(self):
+        out = self.run_fill(time_budget=0)
+        self.assert_no_object_left(out)
+        np.testing.assert_array_equal(out[self.mask == 0], self.img[self.mask == 0])
+
+    def test_progress_reports_remaining_pixels(self):
+        calls = []
+        self.run_fill(progress=lambda remaining, total: calls.append((remaining, total)))
+        self.assertTrue(calls)
+        self.assertEqual(calls[-1][0], 0)
+        self.assertTrue(all(t == int((self.mask > 0).sum()) for _, t in calls))
+        remaining = [c[0] for c in calls]
+        self.assertEqual(remaining, sorted(remaining, reverse=True))
+
+    def test_cancel_token_raises(self):
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(criminisi.InpaintCancelled):
+            self.run_fill(cancel=cancel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from parallel_inpaint import parallel_criminisi_inpaint
+from exemplar_library import build_library, ExemplarLibrary, DESCRIPTORS_FILE, PATCHES_FILE
+
+
+def stripes(h, w):
+    img = np.zeros((h, w, 3), np.uint8)
+    red = (np.arange(w) % 4) < 2
+    img[:, red] = (220, 30, 30)
+    img[:, ~red] = (30, 30, 220)
+    return img
+
+
+class ExemplarLibraryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.paths = []
+        for name, arr in (('stripes.png', stripes(40, 40)),
+                          ('noise.png', rng.integers(0, 256, (30, 50, 3), dtype=np.uint8))):
+            path = os.path.join(self.tmp.name, name)
+            Image.fromarray(arr).save(path)
+            self.paths.append(path)
+        self.out = os.path.join(self.tmp.name, 'lib')
+        self.count = build_library(self.paths, self.out, r=4, stride=1, n_components=8,
+                                   n_lists=4, max_patches_per_image=None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_files_and_lists(self):
+        library = ExemplarLibrary(self.out)
+        self.assertEqual(self.count, 32 * 32 + 22 * 42)
+        self.assertEqual(len(library), self.count)
+        self.assertIsInstance(library.patches, np.memmap)
+        self.assertEqual(os.path.getsize(os.path.join(self.out, PATCHES_FILE)), self.count * 9 * 9 * 3)
+        self.assertEqual(os.path.getsize(os.path.join(self.out, DESCRIPTORS_FILE)), self.count * 8 * 4)
+        self.assertEqual(library.offsets[0], 0)
+        self.assertEqual(library.offsets[-1], self.count)
+        self.assertTrue(all(a <= b for a, b in zip(library.offsets, library.offsets[1:])))
+
+    def test_search_finds_exact_patch(self):
+        library = ExemplarLibrary(self.out, nprobe=4)
+        noise = np.array(Image.open(self.paths[1])).astype(np.float32)
+        #===patch 7x7 z obrazu biblioteki, z częściowo nieznanym wnętrzem===#
+        templ = noise[10:17, 20:27].copy()
+        known = np.ones((7, 7), np.float32)
+        known[2:5, 3:7] = 0
+        patch, ssd = library.search(templ, known)
+        self.assertEqual(ssd, 0.0)
+        np.testing.assert_array_equal(patch, templ)
+        self.assertGreater(library.evaluated, 0)
+
+    def test_criminisi_uses_library_texture(self):
+        img = np.full((60, 60, 3), 128, np.uint8)
+        img[21:39, 21:39] = stripes(60, 60)[21:39, 21:39]
+        mask = np.zeros((60, 60), np.uint8)
+        mask[24:36, 24:36] = 255
+        truth = stripes(60, 60)[24:36, 24:36].astype(float)
+        errors = []
+        for library in (None, ExemplarLibrary(self.out)):
+            out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                       patch_size=7, library=library))
+            np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+            errors.append(np.abs(out[24:36, 24:36] - truth).mean())
+        self.assertLess(errors[1], errors[0] / 4)
+
+    def test_library_is_not_dropped_by_automatic_pyramid(self):
+        img = np.full((60, 60, 3), 128, np.uint8)
+        mask = np.zeros((60, 60), np.uint8)
+        mask[24:36, 24:36] = 255
+        library = ExemplarLibrary(self.out)
+        #===dziura za duża na max_iterations - bez biblioteki włącza się tryb wieloskalowy===#
+        criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask), patch_size=7,
+                                    max_iterations=2, library=library)
+        self.assertGreater(library.evaluated, 0)
+
+    def test_parallel_fill_passes_library_to_worker_processes(self):
+        img = np.full((60, 180, 3), 128, np.uint8)
+        img[21:39, 21:39] = img[21:39, 141:159] = stripes(60, 60)[21:39, 21:39]
+        mask = np.zeros((60, 180), np.uint8)
+        mask[24:36, 24:36] = mask[24:36, 144:156] = 255
+        outs = [np.array(parallel_criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask), margin=30,
+                                                    workers=workers, patch_size=7, library=library))
+                for workers, library in ((1, None), (1, ExemplarLibrary(self.out)), (2, ExemplarLibrary(self.out)))]
+        self.assertFalse(np.array_equal(outs[0], outs[1]))
+        np.testing.assert_array_equal(outs[1], outs[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
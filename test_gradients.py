@@ -0,0 +1,45 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+from PIL import Image
+from gradients import GradientCache
+from auto_inpaint import select_best_inpainting_method
+
+
+class GradientCacheTests(unittest.TestCase):
+    def test_local_update_matches_full_recompute(self):
+        rng = np.random.default_rng(0)
+        img = rng.integers(0, 255, (30, 40, 3)).astype(np.float32)
+        cache = GradientCache(img)
+        for bounds in [(5, 10, 6, 12), (0, 4, 0, 5), (26, 30, 35, 40)]:
+            y0, y1, x0, x1 = bounds
+            img[y0:y1, x0:x1] = rng.integers(0, 255, (y1 - y0, x1 - x0, 3))
+            cache.update(img, bounds)
+            fresh = GradientCache(img)
+            np.testing.assert_allclose(cache.gx, fresh.gx, atol=1e-3)
+            np.testing.assert_allclose(cache.gy, fresh.gy, atol=1e-3)
+
+    def test_border_energy(self):
+        img = np.zeros((20, 20, 3), np.uint8)
+        mask = np.zeros((20, 20), np.uint8)
+        self.assertIsNone(GradientCache(img).border_energy(mask))
+        mask[8:12, 8:12] = 255
+        self.assertEqual(GradientCache(img).border_energy(mask), 0.0)
+
+    def test_cached_gradients_keep_auto_method(self):
+        img = np.full((100, 100, 3), 128, np.uint8)
+        mask = np.zeros((100, 100), np.uint8)
+        mask[20:80:4, 20:80] = 255
+        mask[20:80, 20] = 255
+        #===skomplikowany kształt na gładkim tle - cache nie zmienia wyboru===#
+        self.assertEqual(select_best_inpainting_method(Image.fromarray(mask)), 'criminisi')
+        self.assertEqual(select_best_inpainting_method(Image.fromarray(mask), GradientCache(img)), 'criminisi')
+
+
+if __name__ == '__main__':
+    unittest.main()
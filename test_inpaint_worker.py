@@ -0,0 +1,205 @@
+import os
+import time
+import threading
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from criminisi import InpaintCancelled
+from inpaint_worker import InpaintJob, start_job
+from test_criminisi import make_test_image
+
+app = QApplication.instance() or QApplication([])
+
+
+def wait_for(condition, timeout=20):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError("timeout")
+        app.processEvents()
+        time.sleep(0.005)
+
+
+def run_job(work, cancel_after=None):
+    events = []
+    job = InpaintJob(work)
+    job.signals.progress.connect(lambda remaining, total: events.append(('progress', remaining, total)))
+    job.signals.finished.connect(lambda result: events.append(('finished', result, threading.current_thread())))
+    job.signals.cancelled.connect(lambda: events.append(('cancelled',)))
+    job.signals.failed.connect(lambda message: events.append(('failed', message)))
+    start_job(job)
+    if cancel_after is not None:
+        wait_for(cancel_after.is_set)
+        job.cancel()
+    wait_for(lambda: events and events[-1][0] != 'progress')
+    return events
+
+
+class InpaintJobTests(unittest.TestCase):
+    def test_result_and_progress_arrive_on_gui_thread(self):
+        def work(cancel, progress):
+            progress(5, 10)
+            progress(0, 10)
+            return 42
+        events = run_job(work)
+        self.assertEqual(events[:2], [('progress', 5, 10), ('progress', 0, 10)])
+        self.assertEqual(events[2][:2], ('finished', 42))
+        self.assertIs(events[2][2], threading.main_thread())
+
+    def test_cancel_stops_cooperative_work(self):
+        started = threading.Event()
+
+        def work(cancel, progress):
+            started.set()
+            while not cancel.is_set():
+                time.sleep(0.001)
+            raise InpaintCancelled()
+        self.assertEqual(run_job(work, cancel_after=started), [('cancelled',)])
+
+    def test_cancelled_result_is_dropped_and_errors_reported(self):
+        started = threading.Event()
+
+        def slow(cancel, progress):
+            started.set()
+            time.sleep(0.05)
+            return 'late'
+        self.assertEqual(run_job(slow, cancel_after=started), [('cancelled',)])
+
+        def broken(cancel, progress):
+            raise ValueError("zły obraz")
+        self.assertEqual(run_job(broken), [('failed', "zły obraz")])
+
+
+class BackgroundEraseTests(unittest.TestCase):
+    def setUp(self):
+        import main
+        self.window = main.LassoEraser()
+        self.window.image = Image.fromarray(make_test_image(80, 100))
+        self.window.mask = Image.new("L", self.window.image.size, 0)
+        self.window.mask.paste(255, (40, 30, 60, 50))
+        self.window.fill_combo.setCurrentIndex(self.window.fill_combo.findData(3))
+
+    def test_result_applied_with_history(self):
+        import helpers
+        w = self.window
+        original, selection = w.image, w.mask
+        helpers.erase_selection(w)
+        job = w.inpaint_job
+        self.assertIsNotNone(job)
+        #===w trakcie: nowa, pusta maska do zaznaczania kolejnego obiektu===#
+        self.assertIsNot(w.mask, selection)
+        self.assertTrue(helpers.selection_state(w).empty)
+        wait_for(lambda: w.inpaint_job is None)
+        self.assertEqual(w.history, [(original, selection)])
+        self.assertIsNot(w.image, original)
+        changed = np.any(np.array(w.image) != np.array(original), axis=2)
+        self.assertTrue(changed[30:50, 40:60].any())
+        self.assertFalse(changed[np.array(selection) == 0].any())
+        self.assertTrue(w.analysis.matches(w.image))
+
+    def test_cancel_restores_selection(self):
+        import helpers
+        w = self.window
+        original = w.image
+
+        def work(cancel, progress):
+            while not cancel.is_set():
+                time.sleep(0.001)
+            raise InpaintCancelled()
+        helpers.start_inpaint_job(w, work)
+        w.mask.paste(255, (0, 0, 5, 5))
+        helpers.cancel_inpaint(w)
+        wait_for(lambda: w.inpaint_job is None)
+        self.assertIs(w.image, original)
+        self.assertEqual(w.history, [])
+        mask = np.array(w.mask)
+        self.assertTrue((mask[30:50, 40:60] == 255).all())
+        self.assertTrue((mask[0:5, 0:5] == 255).all())
+        self.assertEqual(w.status_message.text(), "Anulowano")
+
+    def test_sd_payload_is_encoded_in_worker(self):
+        import base64
+        import io
+        import helpers
+        import sd
+        w = self.window
+        threads = []
+        encode, send = sd.pil_to_base64, sd.send_request
+
+        def recording_encode(img, fmt="PNG"):
+            threads.append(threading.current_thread())
+            return encode(img, fmt)
+
+        def fake_send(base_url, method, path, json_body=None, headers=None, timeout=5):
+            buf = io.BytesIO()
+            Image.new("RGB", w.image.size, (0, 0, 0)).save(buf, format="PNG")
+            return {"images": [base64.b64encode(buf.getvalue()).decode()]}
+        sd.pil_to_base64, sd.send_request = recording_encode, fake_send
+        try:
+            work = helpers.sd_task(w)
+            self.assertEqual(threads, [])
+            helpers.start_inpaint_job(w, work)
+            wait_for(lambda: w.inpaint_job is None)
+        finally:
+            sd.pil_to_base64, sd.send_request = encode, send
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+        self.assertEqual(np.array(w.image)[40, 50].tolist(), [0, 0, 0])
+        self.assertEqual(len(w.history), 1)
+
+    def test_criminisi_erase_uses_library_from_settings(self):
+        import tempfile
+        import helpers
+        from exemplar_library import build_library, ExemplarLibrary
+        w = self.window
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'tex.png')
+            Image.fromarray(make_test_image(40, 40, seed=1)).save(path)
+            build_library([path], tmp, r=8, stride=2, n_components=8, n_lists=4)
+            w.exemplar_library = ExemplarLibrary(tmp)
+            helpers.erase_selection(w)
+            wait_for(lambda: w.inpaint_job is None)
+            self.assertEqual(len(w.history), 1)
+            self.assertGreater(w.exemplar_library.evaluated, 0)
+            w.exemplar_library = None
+
+    def test_dropped_result_keeps_analysis_of_source_image(self):
+        import helpers
+        from analysis_cache import ImageAnalysis
+        w = self.window
+        original = w.image
+        analysis = helpers.image_analysis(w)
+        helpers.erase_selection(w)
+        w.image = Image.new("RGB", original.size)
+        wait_for(lambda: w.inpaint_job is None)
+        #===ta sama analiza, nadal opisuje obraz źródłowy - kolejne usunięcie jej nie przebudowuje===#
+        self.assertIs(w.analysis, analysis)
+        self.assertTrue(analysis.matches(original))
+        fresh = ImageAnalysis(original)
+        np.testing.assert_array_equal(analysis.array, fresh.array)
+        np.testing.assert_allclose(analysis.gradients.gx, fresh.gradients.gx, atol=1e-3)
+        np.testing.assert_allclose(analysis.gradients.gy, fresh.gradients.gy, atol=1e-3)
+
+    def test_result_dropped_when_image_changes(self):
+        import helpers
+        w = self.window
+        helpers.erase_selection(w)
+        job = w.inpaint_job
+        replacement = Image.new("RGB", w.image.size)
+        w.image = replacement
+        wait_for(lambda: w.inpaint_job is None)
+        self.assertTrue(job.done.is_set())
+        self.assertIs(w.image, replacement)
+        self.assertEqual(w.history, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QApplication, QGraphicsPathItem
+from test_criminisi import make_test_image
+
+app = QApplication.instance() or QApplication([])
+
+
+class LassoTests(unittest.TestCase):
+    def test_lasso_is_one_path_item_and_fills_polygon(self):
+        import main
+        import helpers
+        w = main.LassoEraser()
+        w.image = Image.fromarray(make_test_image(300, 400))
+        w.mask = Image.new("L", w.image.size, 0)
+        helpers.draw_image(w)
+        items = len(w.scene.items())
+        t = np.linspace(0, 2 * np.pi, 2000, endpoint=False)
+        w.points = [(320.0, 150.0)]
+        for a in t[1:]:
+            w.points.append((200 + 120 * np.cos(a), 150 + 90 * np.sin(a)))
+            helpers.extend_lasso(w)
+        self.assertEqual(len(w.scene.items()), items + 1)
+        self.assertIsInstance(w.lasso_item, QGraphicsPathItem)
+        self.assertEqual(w.lasso_item.lasso.elementCount(), 2000)
+        rect = w.lasso_item.boundingRect()
+        self.assertLessEqual(rect.left(), 80 + 1e-6)
+        self.assertGreaterEqual(rect.right(), 320 - 1e-6)
+        #===obrys jest rysowany (czerwony na krawędzi elipsy, nie w środku)===#
+        shot = QImage(400, 300, QImage.Format_ARGB32)
+        shot.fill(0)
+        painter = QPainter(shot)
+        w.scene.render(painter, QRectF(0, 0, 400, 300), QRectF(0, 0, 400, 300))
+        painter.end()
+        self.assertEqual(shot.pixelColor(320, 150).name(), "#ff0000")
+        self.assertNotEqual(shot.pixelColor(200, 150).name(), "#ff0000")
+        points = list(w.points)
+        helpers.close_lasso(w)
+        helpers.clear_lasso(w)
+        self.assertIsNone(w.lasso_item)
+        self.assertEqual(len(w.scene.items()), items)
+        expected = Image.new("L", w.image.size, 0)
+        ImageDraw.Draw(expected).polygon(points, fill=255)
+        diff = (np.array(expected) > 0) ^ (np.array(w.mask) > 0)
+        self.assertLess(diff.sum(), 0.02 * (np.array(expected) > 0).sum())
+        self.assertEqual(helpers.selection_state(w).count, int((np.array(w.mask) > 0).sum()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from mask_layer import MaskLayerItem
+from test_criminisi import make_test_image
+
+app = QApplication.instance() or QApplication([])
+
+LAYERS = [("source_mask", [0, 170, 0, 60]), ("mask", [255, 0, 0, 70])]
+
+
+def random_masks(size, seed):
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(((rng.random(size[::-1]) > 0.7) * 255).astype(np.uint8)) for _ in LAYERS]
+
+
+class MaskLayerItemTests(unittest.TestCase):
+    def test_buffer_is_nearest_resize_and_shared_with_qimage(self):
+        masks = random_masks((517, 300), 0)
+        item = MaskLayerItem(LAYERS)
+        self.assertTrue(item.reset((517, 300), (129, 75)))
+        self.assertFalse(item.reset((517, 300), (129, 75)))
+        item.refresh(masks)
+        expected = np.zeros((75, 129), dtype=np.uint8)
+        for bit, mask in enumerate(masks):
+            expected |= (np.array(mask.resize((129, 75), Image.Resampling.NEAREST)) > 0).astype(np.uint8) << bit
+        np.testing.assert_array_equal(item.buffer, expected)
+        #===QImage czyta bufor bez kopii: kolor z tabeli według flag===#
+        item.buffer[5, 7] = 3
+        self.assertEqual(item.qimage.pixelColor(7, 5).red(), 255)
+        item.buffer[5, 7] = 1
+        self.assertEqual(item.qimage.pixelColor(7, 5).green(), 170)
+        item.buffer[5, 7] = 0
+        self.assertEqual(item.qimage.pixelColor(7, 5).alpha(), 0)
+        rect = item.sceneBoundingRect()
+        self.assertAlmostEqual(rect.width(), 517)
+        self.assertAlmostEqual(rect.height(), 300)
+
+    def test_partial_refresh_matches_full(self):
+        size = (333, 211)
+        for level_size in [size, (166, 105), (83, 52)]:
+            masks = [Image.new("L", size, 0) for _ in LAYERS]
+            partial = MaskLayerItem(LAYERS)
+            partial.reset(size, level_size)
+            partial.refresh(masks)
+            rng = np.random.default_rng(1)
+            for _ in range(30):
+                x, y = rng.integers(-10, size[0] + 10), rng.integers(-10, size[1] + 10)
+                r = int(rng.integers(1, 12))
+                layer = int(rng.integers(len(LAYERS)))
+                ImageDraw.Draw(masks[layer]).ellipse((x - r, y - r, x + r, y + r), fill=255)
+                y0, y1 = max(0, y - r), min(size[1], y + r + 1)
+                x0, x1 = max(0, x - r), min(size[0], x + r + 1)
+                if y0 < y1 and x0 < x1:
+                    partial.refresh(masks, (y0, y1, x0, x1))
+            full = MaskLayerItem(LAYERS)
+            full.reset(size, level_size)
+            full.refresh(masks)
+            np.testing.assert_array_equal(partial.buffer, full.buffer)
+
+
+class WindowMaskLayerTests(unittest.TestCase):
+    def test_brush_stroke_updates_only_its_rectangle(self):
+        import main
+        import helpers
+        w = main.LassoEraser()
+        w.image = Image.fromarray(make_test_image(400, 600))
+        w.mask = Image.new("L", w.image.size, 0)
+        helpers.draw_image(w)
+        buffer = w.overlay_item.buffer
+        w.brush_slider.setValue(10)
+        w.tool_combo.setCurrentIndex(w.tool_combo.findData(1))
+        calls = []
+        refresh = w.overlay_item.refresh
+        w.overlay_item.refresh = lambda masks, rect=None: (calls.append(rect), refresh(masks, rect))
+        w.last_brush_pos = None
+        helpers.update_brush_mask(w, 100, 100, update_display=True)
+        helpers.update_brush_mask(w, 140, 100, update_display=True)
+        self.assertIs(w.overlay_item.buffer, buffer)
+        self.assertTrue(all(rect is not None for rect in calls))
+        y0, y1, x0, x1 = calls[-1]
+        self.assertLessEqual(x1 - x0, 52)
+        self.assertLessEqual(y1 - y0, 12)
+        self.assertTrue(buffer[100, 100:141].all())
+        self.assertFalse(buffer[200:, :].any())
+        #===ten sam wynik co pełne przeliczenie===#
+        shown = buffer.copy()
+        helpers.update_brush_display(w, full=True)
+        np.testing.assert_array_equal(w.overlay_item.buffer, shown)
+
+
+if __name__ == '__main__':
+    unittest.main()
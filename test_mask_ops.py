@@ -0,0 +1,123 @@
+import unittest
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import mask_ops
+from helpers import empty_inpaint, selection_state
+
+
+class MaskOpsTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.arr = rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)
+        self.img = Image.fromarray(self.arr)
+        self.mask = np.zeros((40, 50), np.uint8)
+        self.mask[10:20, 15:30] = 255
+        self.hole = self.mask > 0
+
+    def test_solid_fill(self):
+        out = np.array(mask_ops.solid_fill(self.img, Image.fromarray(self.mask), (10, 20, 30)))
+        self.assertTrue((out[self.hole] == (10, 20, 30)).all())
+        np.testing.assert_array_equal(out[~self.hole], self.arr[~self.hole])
+        np.testing.assert_array_equal(np.array(self.img), self.arr)
+        #===domyślny kolor "Puste" i obraz w skali szarości===#
+        out = np.array(empty_inpaint(self.img, Image.fromarray(self.mask)))
+        self.assertTrue((out[self.hole] == 255).all())
+        gray = np.array(mask_ops.solid_fill(self.img.convert("L"), self.mask, (90, 0, 0)))
+        self.assertTrue((gray[self.hole] == 90).all())
+
+    def test_transparent_fill(self):
+        out = np.array(mask_ops.transparent_fill(self.img, Image.fromarray(self.mask)))
+        self.assertEqual(out.shape, (40, 50, 4))
+        self.assertTrue((out[self.hole, 3] == 0).all())
+        self.assertTrue((out[~self.hole, 3] == 255).all())
+        np.testing.assert_array_equal(out[:, :, :3], self.arr)
+        sd = np.array(mask_ops.transparent_fill(self.img, self.mask, inside=255, outside=0))
+        np.testing.assert_array_equal(sd[:, :, 3], self.mask)
+
+    def test_feathered_fill(self):
+        fill = Image.new("RGB", self.img.size, (0, 0, 0))
+        out = np.array(mask_ops.feathered_fill(self.img, fill, Image.fromarray(self.mask), 2)).astype(int)
+        self.assertTrue((out[self.hole] == 0).all())
+        #===krawędź przejściowa, daleko od maski bez zmian===#
+        self.assertTrue((out[10:20, 30] <= self.arr[10:20, 30]).all())
+        self.assertTrue((out[10:20, 30] < self.arr[10:20, 30]).any())
+        np.testing.assert_array_equal(out[30:, :], self.arr[30:, :])
+        np.testing.assert_array_equal(out[:, 40:], self.arr[:, 40:])
+
+    def test_empty_mask_and_paste_masked(self):
+        out = mask_ops.composite(self.img, (0, 0, 0), np.zeros((40, 50), np.uint8), feather=3)
+        np.testing.assert_array_equal(np.array(out), self.arr)
+        dst = self.arr.copy()
+        mask_ops.paste_masked(dst, np.zeros_like(dst), self.hole)
+        self.assertTrue((dst[self.hole] == 0).all())
+        np.testing.assert_array_equal(dst[~self.hole], self.arr[~self.hole])
+
+    def test_simplify_polygon(self):
+        #===gęsty obrys prostokąta z szumem poniżej tolerancji -> same narożniki===#
+        rng = np.random.default_rng(2)
+        corners = [(10, 10), (40, 10), (40, 30), (10, 30), (10, 10)]
+        points = []
+        for (x0, y0), (x1, y1) in zip(corners, corners[1:]):
+            for t in np.linspace(0, 1, 60, endpoint=False):
+                points.append((x0 + (x1 - x0) * t + rng.uniform(-0.2, 0.2), y0 + (y1 - y0) * t + rng.uniform(-0.2, 0.2)))
+        simple = mask_ops.simplify_polygon(points)
+        self.assertEqual(len(simple), 4)
+        full, reduced = Image.new("L", (50, 40), 0), Image.new("L", (50, 40), 0)
+        ImageDraw.Draw(full).polygon(points, fill=255)
+        ImageDraw.Draw(reduced).polygon(simple, fill=255)
+        diff = (np.array(full) > 0) ^ (np.array(reduced) > 0)
+        self.assertFalse(diff[12:29, 12:39].any())
+        self.assertEqual(mask_ops.simplify_polygon(corners[:3]), corners[:3])
+
+
+class MaskStateTests(unittest.TestCase):
+    def assert_matches_scan(self, state):
+        fresh = mask_ops.MaskState(state.image)
+        self.assertEqual(state.count, fresh.count)
+        self.assertEqual(state.bbox, fresh.bbox)
+
+    def test_incremental_bbox_and_count(self):
+        image = Image.new("L", (80, 60), 0)
+        state = mask_ops.MaskState(image)
+        self.assertTrue(state.empty)
+        self.assertIsNone(state.bbox)
+        draw = ImageDraw.Draw(image)
+        rng = np.random.default_rng(1)
+        for x, y in rng.uniform(-10, 90, (20, 2)):
+            with state.change((x - 6, y - 6, x + 6, y + 6)):
+                draw.ellipse((x - 6, y - 6, x + 6, y + 6), fill=255)
+            self.assert_matches_scan(state)
+        points = [(5.5, 50.2), (30.0, 20.7), (70.3, 58.9)]
+        xs, ys = zip(*points)
+        with state.change((min(xs), min(ys), max(xs), max(ys))):
+            draw.polygon(points, fill=255)
+        self.assert_matches_scan(state)
+        self.assertFalse(state.empty)
+        y0, y1, x0, x1 = state.take_dirty()
+        self.assertTrue(y0 <= state.bbox[0] and y1 >= state.bbox[1])
+        self.assertIsNone(state.take_dirty())
+        with state.change((200, 200, 210, 210)):
+            pass
+        self.assertIsNone(state.dirty)
+
+    def test_selection_state_follows_mask_image(self):
+        window = SimpleNamespace(mask=Image.new("L", (20, 10), 0), mask_state=None)
+        state = selection_state(window)
+        self.assertIs(selection_state(window), state)
+        window.mask = Image.new("L", (20, 10), 255)
+        state = selection_state(window)
+        self.assertEqual(state.count, 200)
+        self.assertEqual(state.bbox, (0, 10, 0, 20))
+        out = np.array(empty_inpaint(Image.new("RGB", (20, 10)), window.mask, (1, 2, 3), box=state.bbox))
+        self.assertTrue((out == (1, 2, 3)).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from mipmap import MipmapPyramid
+from test_criminisi import make_test_image
+
+app = QApplication.instance() or QApplication([])
+
+
+class MipmapPyramidTests(unittest.TestCase):
+    def test_levels(self):
+        image = Image.fromarray(make_test_image(300, 517))
+        pyramid = MipmapPyramid(image, min_size=64)
+        self.assertEqual(pyramid.count, 3)
+        self.assertEqual(pyramid.level_for(2.0), 0)
+        self.assertEqual(pyramid.level_for(1.0), 0)
+        self.assertEqual(pyramid.level_for(0.6), 0)
+        self.assertEqual(pyramid.level_for(0.5), 1)
+        self.assertEqual(pyramid.level_for(0.3), 1)
+        self.assertEqual(pyramid.level_for(0.1), 2)
+        self.assertEqual(pyramid.array(2).shape, (75, 129, 3))
+        sx, sy = pyramid.level_scale(1)
+        self.assertAlmostEqual(sx, 517 / 258)
+        self.assertAlmostEqual(sy, 2.0)
+        #===poziom liczony raz i potem tylko zwracany===#
+        pixmap = pyramid.pixmap(1)
+        self.assertIs(pyramid.pixmap(1), pixmap)
+        self.assertEqual((pixmap.width(), pixmap.height()), (258, 150))
+        self.assertTrue(pyramid.matches(image))
+        self.assertFalse(pyramid.matches(image.copy()))
+
+
+class ViewZoomTests(unittest.TestCase):
+    def test_zoom_uses_view_transform_and_cached_levels(self):
+        import main
+        import helpers
+        w = main.LassoEraser()
+        w.image = Image.fromarray(make_test_image(400, 600))
+        w.mask = Image.new("L", w.image.size, 0)
+        w.mask.paste(255, (10, 10, 50, 50))
+        helpers.draw_image(w)
+        pyramid = w.mipmaps
+        self.assertEqual(w.scene.sceneRect().width(), 600)
+        w.scale_slider.setValue(70)
+        self.assertAlmostEqual(w.view.transform().m11(), 0.7)
+        self.assertEqual(w.display_level, 0)
+        w.scale_slider.setValue(40)
+        self.assertEqual(w.display_level, 1)
+        level1 = w.pixmap_item.pixmap().cacheKey()
+        w.scale_slider.setValue(30)
+        self.assertEqual(w.pixmap_item.pixmap().cacheKey(), level1)
+        self.assertIs(w.mipmaps, pyramid)
+        #===element pokrywa cały obraz w współrzędnych sceny===#
+        rect = w.pixmap_item.sceneBoundingRect()
+        self.assertAlmostEqual(rect.width(), 600)
+        self.assertAlmostEqual(rect.height(), 400)
+        self.assertEqual(w.overlay_item.sceneBoundingRect(), rect)
+        overlay = w.overlay_item.qimage
+        self.assertGreater(overlay.pixelColor(10, 10).alpha(), 0)
+        self.assertEqual(overlay.pixelColor(100, 100).alpha(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+from helpers import neighbor_inpaint
+
+
+class NeighborInpaintTests(unittest.TestCase):
+    def test_first_ring_is_floor_mean_of_known_neighbours(self):
+        img = np.zeros((5, 5, 3), np.uint8)
+        img[:, :, 0] = np.arange(25).reshape(5, 5) * 10
+        mask = np.zeros((5, 5), np.uint8)
+        mask[1:4, 1:4] = 255
+        out = np.array(neighbor_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        #===narożnik dziury: sąsiedzi (0, 1) i (1, 0)===#
+        self.assertEqual(out[1, 1, 0], (10 + 50) // 2)
+        #===środek dziury: średnia czterech pikseli pierwszego pierścienia===#
+        ring = out[[1, 2, 2, 3], [2, 1, 3, 2], 0].astype(int)
+        self.assertEqual(out[2, 2, 0], ring.sum() // 4)
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+
+    def test_fills_borders_and_deep_holes(self):
+        img = np.full((300, 200, 3), (40, 120, 200), np.uint8)
+        mask = np.zeros((300, 200), np.uint8)
+        mask[0:250, 0:150] = 255
+        mask[290:300, 190:200] = 255
+        mask_img = Image.fromarray(mask)
+        out = np.array(neighbor_inpaint(Image.fromarray(img.copy()), mask_img))
+        np.testing.assert_array_equal(out, img)
+        np.testing.assert_array_equal(np.array(mask_img), mask)
+
+    def test_fill_follows_nearest_side(self):
+        img = np.zeros((40, 40, 3), np.uint8)
+        img[:, :20] = (200, 0, 0)
+        img[:, 20:] = (0, 0, 200)
+        mask = np.zeros((40, 40), np.uint8)
+        mask[10:30, 10:30] = 255
+        out = np.array(neighbor_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        self.assertTrue((out[15:25, 11, 0] > out[15:25, 11, 2]).all())
+        self.assertTrue((out[15:25, 28, 2] > out[15:25, 28, 0]).all())
+
+    def test_grayscale_and_empty_mask(self):
+        img = Image.fromarray(np.full((20, 20), 77, np.uint8))
+        mask = np.zeros((20, 20), np.uint8)
+        self.assertIs(neighbor_inpaint(img, Image.fromarray(mask)), img)
+        mask[5:9, 0:4] = 255
+        out = np.array(neighbor_inpaint(img, Image.fromarray(mask)))
+        self.assertTrue((out == 77).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
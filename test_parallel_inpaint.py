@@ -0,0 +1,87 @@
+import threading
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import parallel_inpaint
+from test_criminisi import make_test_image
+
+
+class ParallelInpaintTests(unittest.TestCase):
+    def test_component_rois_merge_overlapping(self):
+        target = np.zeros((100, 100), np.uint8)
+        target[10:15, 10:15] = 1
+        target[20:25, 20:25] = 1
+        target[80:85, 80:85] = 1
+        rois = sorted(parallel_inpaint.component_rois(target, 5))
+        self.assertEqual(rois, [(5, 30, 5, 30), (75, 90, 75, 90)])
+
+    def test_pool_matches_serial_and_keeps_known_pixels(self):
+        img = make_test_image(80, 120)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[10:20, 10:20] = 255
+        mask[50:65, 90:105] = 255
+        serial = np.array(parallel_inpaint.parallel_criminisi_inpaint(
+            Image.fromarray(img), Image.fromarray(mask), workers=1, margin=20))
+        pooled = np.array(parallel_inpaint.parallel_criminisi_inpaint(
+            Image.fromarray(img), Image.fromarray(mask), workers=2, margin=20))
+        np.testing.assert_array_equal(serial, pooled)
+        np.testing.assert_array_equal(pooled[mask == 0], img[mask == 0])
+
+    def test_progress_reported_inside_single_roi(self):
+        img = make_test_image(80, 120)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:50, 30:80] = 255
+        mask[60:70, 5:15] = 255
+        calls = []
+        parallel_inpaint.parallel_criminisi_inpaint(
+            Image.fromarray(img), Image.fromarray(mask), workers=1, margin=20,
+            progress=lambda remaining, total: calls.append((remaining, total)))
+        total = int(np.count_nonzero(mask))
+        self.assertGreater(len(calls), 3)
+        self.assertTrue(all(t == total for _, t in calls))
+        remaining = [r for r, _ in calls]
+        self.assertEqual(remaining, sorted(remaining, reverse=True))
+        self.assertLess(remaining[0], total)
+        self.assertEqual(remaining[-1], 0)
+
+    def test_cancel_stops_running_worker_processes(self):
+        from criminisi import InpaintCancelled
+        img = make_test_image(300, 600)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[50:250, 50:250] = 255
+        mask[50:250, 350:550] = 255
+        source = Image.fromarray(img)
+        calls = []
+        cancel = threading.Event()
+        cancel.set()
+        #===flaga ustawiona przed pierwszym sprawdzeniem - ROI przerywają się po pierwszej iteracji===#
+        with self.assertRaises(InpaintCancelled):
+            parallel_inpaint.parallel_criminisi_inpaint(
+                source, Image.fromarray(mask), workers=2, margin=20, cancel=cancel,
+                progress=lambda remaining, total: calls.append(remaining))
+        self.assertEqual(calls, [])
+        np.testing.assert_array_equal(np.array(source), img)
+
+    def test_worker_processes_persist_between_calls(self):
+        img = make_test_image(80, 160)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:30, 20:30] = 255
+        mask[20:30, 130:140] = 255
+        pids = []
+        for _ in range(2):
+            parallel_inpaint.parallel_criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                        workers=2, margin=10)
+            pids.append(set(parallel_inpaint.roi_executor(2)._processes))
+        self.assertEqual(pids[0], pids[1])
+        parallel_inpaint.shutdown_roi_executor()
+        self.assertIsNone(parallel_inpaint._executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
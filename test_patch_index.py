@@ -0,0 +1,52 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from patch_index import PatchIndex
+from test_criminisi import make_test_image
+
+
+class PatchIndexTests(unittest.TestCase):
+    def test_finds_exact_duplicate_from_partial_patch(self):
+        rng = np.random.default_rng(2)
+        work = rng.integers(0, 255, (40, 50, 3)).astype(np.float32)
+        work[30:37, 35:42] = work[5:12, 8:15]
+        target = np.zeros((40, 50), np.uint8)
+        target[33:37, 38:42] = 1
+        valid = criminisi.valid_centre_map(target, 3)
+        index = PatchIndex(work, valid, 3, stride=1)
+        templ, known = criminisi.extract_template(work, target, 33, 38, 3)
+        self.assertEqual(index.search(work, valid, templ, known), (8, 11))
+
+    def test_add_sources_indexes_filled_region(self):
+        work = make_test_image(40, 50).astype(np.float32)
+        target = np.zeros((40, 50), np.uint8)
+        target[10:30, 10:30] = 1
+        valid = criminisi.valid_centre_map(target, 2)
+        index = PatchIndex(work, valid, 2, stride=1)
+        before = len(index)
+        target[10:30, 10:30] = 0
+        criminisi.valid_centre_map(target, 2, (10, 30, 10, 30), valid)
+        index.add_sources(work, valid, (10, 30, 10, 30))
+        self.assertEqual(len(index), int(valid.sum()))
+        self.assertGreater(len(index), before)
+
+    def test_criminisi_index_search_fills_mask(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask), search='index'))
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+        known_colors = {tuple(c) for c in img[mask == 0]}
+        for c in out[mask > 0]:
+            self.assertIn(tuple(c), known_colors)
+
+
+if __name__ == '__main__':
+    unittest.main()
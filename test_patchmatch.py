@@ -0,0 +1,50 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from patchmatch import PatchMatchSearch, masked_ssd, patchmatch_inpaint
+from test_criminisi import make_test_image
+
+
+class PatchMatchTests(unittest.TestCase):
+    def test_masked_ssd_matches_direct_sum(self):
+        work = make_test_image(20, 20).astype(np.float32)
+        templ = work[2:7, 3:8].copy()
+        known = np.ones((5, 5), np.float32)
+        known[2:, 2:] = 0
+        cands = np.array([[4, 5], [10, 10], [15, 12]])
+        ssd = masked_ssd(work, templ, known, cands)
+        for i, (y, x) in enumerate(cands):
+            diff = (work[y - 2:y + 3, x - 2:x + 3] - templ) * known[:, :, None]
+            self.assertAlmostEqual(ssd[i], np.sum(diff ** 2), places=1)
+        self.assertEqual(ssd[0], 0)
+
+    def test_propagation_recovers_coherent_offset(self):
+        work = make_test_image(40, 50).astype(np.float32)
+        target = np.zeros((40, 50), np.uint8)
+        valid = criminisi.valid_centre_map(target, 2)
+        matcher = PatchMatchSearch((40, 50), 2, random_samples=0, seed=0)
+        #===sąsiad (20, 20) dopasowany do (10, 30) - środek (20, 21) powinien dostać (10, 31)===#
+        matcher.assign(20, 20, (10, 30))
+        templ, known = criminisi.extract_template(work, target, 10, 31, 2)
+        self.assertEqual(matcher.search(work, valid, templ, known, 20, 21), (10, 31))
+
+    def test_patchmatch_inpaint_fills_from_known_pixels(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        out = np.array(patchmatch_inpaint(Image.fromarray(img), Image.fromarray(mask), seed=1))
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+        known_colors = {tuple(c) for c in img[mask == 0]}
+        for c in out[mask > 0]:
+            self.assertIn(tuple(c), known_colors)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import sys
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+import pyramid
+from test_criminisi import make_test_image
+
+
+class PyramidTests(unittest.TestCase):
+    def test_downsample_marks_any_masked_block(self):
+        img = np.arange(5 * 5 * 3, dtype=np.float32).reshape(5, 5, 3)
+        target = np.zeros((5, 5), np.uint8)
+        target[1, 1] = 1
+        small, small_target = pyramid.downsample(img, target)
+        self.assertEqual(small.shape, (3, 3, 3))
+        self.assertEqual(small_target.sum(), 1)
+        self.assertEqual(small_target[0, 0], 1)
+        np.testing.assert_allclose(small[1, 1], img[2:4, 2:4].mean(axis=(0, 1)))
+
+    def test_upsample_sources(self):
+        sources = np.full((4, 4, 2), -1, np.int32)
+        sources[1, 1] = (3, 2)
+        pts = np.array([[2, 3], [3, 2], [0, 0]])
+        up = pyramid.upsample_sources(sources, pts)
+        np.testing.assert_array_equal(up, [[6, 5], [7, 4], [-1, -1]])
+
+    def test_pyramid_fills_whole_hole_from_known_pixels(self):
+        img = make_test_image(120, 150)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[40:90, 50:110] = 255
+        out = np.array(pyramid.pyramid_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                               coarse_size=40, seed=0))
+        np.testing.assert_array_equal(out[mask == 0], img[mask == 0])
+        known_colors = {tuple(c) for c in img[mask == 0]}
+        for c in out[mask > 0]:
+            self.assertIn(tuple(c), known_colors)
+
+    def test_large_hole_switches_to_pyramid(self):
+        img = make_test_image(60, 80)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[10:50, 10:70] = 255
+        out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                   max_iterations=5))
+        expected = np.array(pyramid.pyramid_inpaint(Image.fromarray(img), Image.fromarray(mask)))
+        np.testing.assert_array_equal(out, expected)
+        sources = np.full(img.shape[:2] + (2,), -1, np.int32)
+        criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                    max_iterations=None, pyramid=False, sources=sources)
+        #===bez limitu iteracji każdy piksel dziury ma źródło===#
+        self.assertTrue((sources[mask > 0] >= 0).all())
+
+    def test_auto_pyramid_keeps_caller_options(self):
+        img = make_test_image(120, 150)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[30:90, 30:120] = 255
+        calls = []
+        original = pyramid.criminisi_inpaint
+
+        def recording(*args, **kwargs):
+            calls.append(kwargs)
+            return original(*args, **kwargs)
+        pyramid.criminisi_inpaint = recording
+        try:
+            sources = np.full(img.shape[:2] + (2,), -1, np.int32)
+            out = np.array(criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                                       max_iterations=5, patch_size=5, batch=4,
+                                                       sources=sources))
+        finally:
+            pyramid.criminisi_inpaint = original
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]['patch_size'], 5)
+        self.assertEqual(calls[0]['batch'], 4)
+        #===mapa źródeł pełnej rozdzielczości opisuje wynik===#
+        hole = np.argwhere(mask > 0)
+        src = sources[hole[:, 0], hole[:, 1]]
+        ok = src[:, 0] >= 0
+        self.assertGreater(ok.mean(), 0.9)
+        np.testing.assert_array_equal(out[hole[ok, 0], hole[ok, 1]], img[src[ok, 0], src[ok, 1]])
+        self.assertTrue((mask[src[ok, 0], src[ok, 1]] == 0).all())
+
+    def test_exclude_region_applies_on_every_level(self):
+        img = make_test_image(120, 150)
+        img[:, 100:] = (255, 0, 255)
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[40:90, 70:115] = 255
+        logo = np.zeros_like(mask)
+        logo[:, 100:] = 255
+        out = np.array(pyramid.pyramid_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                               coarse_size=40, seed=0, exclude_region=logo))
+        self.assertFalse((out[mask > 0] == (255, 0, 255)).all(axis=1).any())
+
+if __name__ == '__main__':
+    unittest.main()
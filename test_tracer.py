@@ -0,0 +1,59 @@
+import unittest
+import sys
+import json
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+sys.path.append(str(ROOT))
+
+import criminisi
+from tracer import StageTracer, stage
+from test_criminisi import make_test_image
+
+
+class StageTracerTests(unittest.TestCase):
+    def test_stages_and_iterations_are_summarised(self):
+        tracer = StageTracer()
+        for _ in range(3):
+            with tracer.stage('search'):
+                pass
+        tracer.iteration(2, 100, 50)
+        tracer.iteration(1, 40, 20)
+        summary = tracer.summary()
+        self.assertEqual(summary['stages']['search']['count'], 3)
+        self.assertEqual(summary['iterations'], 2)
+        self.assertEqual(summary['patches'], 3)
+        self.assertEqual(summary['candidates'], 140)
+        self.assertEqual(summary['filled_per_iteration'], [50, 20])
+
+    def test_without_tracer_stage_is_noop(self):
+        with stage(None, 'search'):
+            value = 1
+        self.assertEqual(value, 1)
+
+    def test_criminisi_trace(self):
+        img = make_test_image()
+        mask = np.zeros(img.shape[:2], np.uint8)
+        mask[20:35, 30:45] = 255
+        tracer = StageTracer()
+        criminisi.criminisi_inpaint(Image.fromarray(img), Image.fromarray(mask),
+                                    max_iterations=None, tracer=tracer)
+        summary = tracer.summary()
+        self.assertEqual(summary['pixels_filled'], int(np.count_nonzero(mask)))
+        self.assertGreater(summary['candidates'], summary['iterations'])
+        for name in ('front', 'priorities', 'search', 'copy', 'gradients'):
+            self.assertIn(name, summary['stages'])
+        self.assertNotIn('fast_fill', summary['stages'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'trace.json'
+            tracer.save(path)
+            events = json.loads(path.read_text())['traceEvents']
+        self.assertTrue(any(e['ph'] == 'X' and e['name'] == 'search' for e in events))
+        self.assertEqual(sum(e['ph'] == 'C' for e in events), summary['iterations'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+#===POMIAR CZASU ETAPÓW WYPEŁNIANIA (Chrome trace / podsumowanie)===#
+
+
+class StageTracer:
+    """Zbiera czasy etapów i liczniki iteracji jednego lub kilku wypełnień.
+
+    with tracer.stage('search'): ... mierzy etap (perf_counter) i dopisuje
+    zdarzenie "X" do śladu; iteration() zapisuje liczniki iteracji (liczba
+    patchy, ocenionych kandydatów, wypełnionych pikseli). Wynik:
+    summary() - słownik z sumami per etap, chrome_trace() / save() - format
+    chrome://tracing i Perfetto.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.stages = {}
+        self.iterations = []
+
+    def _ts(self, t):
+        return (t - self.start) * 1e6
+
+    @contextmanager
+    def stage(self, name, **args):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter()
+            self.add(name, t0, t1, **args)
+
+    def add(self, name, t0, t1, **args):
+        """Dopisuje etap zmierzony poza stage() (czasy z time.perf_counter)."""
+        stats = self.stages.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += t1 - t0
+        stats['max'] = max(stats['max'], t1 - t0)
+        event = {'name': name, 'ph': 'X', 'ts': self._ts(t0), 'dur': (t1 - t0) * 1e6,
+                 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def iteration(self, patches, candidates, filled):
+        """Liczniki jednej iteracji: skopiowane patche, oceniani kandydaci, wypełnione piksele."""
+        self.iterations.append((patches, candidates, filled))
+        self.events.append({'name': 'iteration', 'ph': 'C', 'ts': self._ts(time.perf_counter()),
+                            'pid': self.pid, 'tid': threading.get_ident(),
+                            'args': {'patches': patches, 'candidates': candidates, 'filled': filled}})
+
+    def summary(self):
+        stages = {}
+        for name, stats in self.stages.items():
+            stages[name] = dict(stats, mean=stats['total'] / stats['count'])
+        return {
+            'total': time.perf_counter() - self.start,
+            'stages': stages,
+            'iterations': len(self.iterations),
+            'patches': sum(it[0] for it in self.iterations),
+            'candidates': sum(it[1] for it in self.iterations),
+            'pixels_filled': sum(it[2] for it in self.iterations),
+            'filled_per_iteration': [it[2] for it in self.iterations],
+        }
+
+    def chrome_trace(self):
+        return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        """Zapisuje ślad w formacie Chrome trace JSON."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+_NO_STAGE = nullcontext()
+
+
+def stage(tracer, name, **args):
+    """tracer.stage(name) albo pusty kontekst, gdy tracer jest None."""
+    return _NO_STAGE if tracer is None else tracer.stage(name, **args)
@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QPixmap, QPen, QColor, QBrush, QKeySequence, QImage, QPainter, QCursor
 from PyQt5.QtCore import Qt
 import helpers
+from mask_layer import MaskLayerItem
 
 class RoundedButton(QPushButton):
     def __init__(self, text, parent=None):
@@ -63,6 +64,8 @@ def setup_ui(self):
     self.tool_combo = QComboBox()
     self.tool_combo.addItem("Lasso", 0)
     self.tool_combo.addItem("Pędzel", 1)
+    self.tool_combo.addItem("Źródło", 2)
+    self.tool_combo.addItem("Wyklucz", 3)
     self.tool_combo.setCurrentIndex(1)
     self.tool_combo.setStyleSheet("""
         QComboBox {
@@ -107,6 +110,7 @@ def setup_ui(self):
     self.fill_combo.addItem("Criminisi", 3)
     self.fill_combo.addItem("Telea", 4)
     self.fill_combo.addItem("Auto", 5) 
+    self.fill_combo.addItem("PatchMatch", 6)
     self.fill_combo.setCurrentIndex(0)
     self.fill_combo.setStyleSheet("""
         QComboBox {
@@ -143,6 +147,7 @@ def setup_ui(self):
     actions = [
         ("Otwórz", self.open_image),
         ("Usuń i wypełnij", self.erase_selection),
+        ("Anuluj", self.cancel_inpaint),
         ("Zapisz", self.save_image),
         ("Reset", self.reset_selection),
         ("Cofnij", self.undo),
@@ -208,6 +213,12 @@ def setup_ui(self):
     self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
     self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
     self.setCentralWidget(self.view)
+    self.view.setRenderHint(QPainter.SmoothPixmapTransform)
     self.pixmap_item = QGraphicsPixmapItem()
+    self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
     self.scene.addItem(self.pixmap_item)
+    #===NAKŁADKA MASEK NAD OBRAZEM (bufor dzielony z QImage, odświeżany prostokątami zmian)===#
+    self.overlay_item = MaskLayerItem(list(helpers.OVERLAY_COLORS.items()))
+    self.overlay_item.setZValue(1)
+    self.scene.addItem(self.overlay_item)
     self.view.viewport().installEventFilter(self)